@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import time
+
+import click
+import numpy as np
+
+from src.data.loader import TIPOS_TRANSACAO
+from src.features import FeaturePipeline
+from src.models.compiled_predictor import CompiledTreePredictor, compilar_booster
+from src.models.predict_model import load_model
+
+BATCH_SIZES = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+def gerar_features(n, seed=42):
+    """
+    Gera um lote sintético já no schema de saída do FeaturePipeline.
+    """
+    rng = np.random.default_rng(seed)
+    amount = np.round(rng.lognormal(10, 1.5, n), 2).astype(np.float32)
+    old_orig = np.round(rng.lognormal(10, 2, n), 2).astype(np.float32)
+    old_dest = np.round(rng.lognormal(11, 2, n), 2).astype(np.float32)
+    return FeaturePipeline().transform({
+        'step': np.sort(rng.integers(1, 744, n)).astype(np.int16),
+        'type': rng.choice(TIPOS_TRANSACAO, n),
+        'amount': amount,
+        'nameOrig': np.char.add('C', rng.integers(1e8, 2e9, n).astype(str)),
+        'oldbalanceOrg': old_orig,
+        'newbalanceOrig': np.maximum(old_orig - amount, 0),
+        'nameDest': np.char.add('C', rng.integers(1e8, 1e8 + max(n // 10, 1), n).astype(str)),
+        'oldbalanceDest': old_dest,
+        'newbalanceDest': old_dest + amount,
+    })
+
+
+def cronometrar(fn, X, min_time=0.5):
+    """
+    Executa fn(X) repetidamente por pelo menos min_time segundos e retorna o tempo médio.
+    """
+    fn(X)
+    runs, start = 0, time.perf_counter()
+    while True:
+        fn(X)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / runs
+
+
+@click.command()
+@click.option('--model', 'model_file', default = None, type = click.Path(exists=True), help = 'Bundle ou arquivo .joblib do modelo')
+@click.option('--compiled', 'compiled_file', default = None, type = click.Path(exists=True), help = 'Modelo compilado (.npz); padrão compila o modelo carregado em memória')
+@click.option('--max-batch', default = 1000000, type = int, help = 'Maior tamanho de lote medido')
+def main(model_file, compiled_file, max_batch):
+    """ Benchmarks the compiled tree predictor against XGBClassifier.predict_proba. """
+    model = load_model(model_file)
+    if compiled_file:
+        compiled = CompiledTreePredictor.load(compiled_file)
+    else:
+        compiled = CompiledTreePredictor(compilar_booster(model.get_booster()))
+
+    print(f"{'lote':>9} | {'wrapper (ms)':>12} | {'compilado (ms)':>14} | {'speedup':>7} | {'máx |Δp|':>9}")
+    for n in [b for b in BATCH_SIZES if b <= max_batch]:
+        X = gerar_features(n)
+        diff = np.abs(model.predict_proba(X)[:, 1] - compiled.predict_proba(X)[:, 1]).max()
+        t_wrapper = cronometrar(model.predict_proba, X)
+        t_compiled = cronometrar(compiled.predict_proba, X)
+        print(f'{n:>9} | {t_wrapper * 1000:>12.3f} | {t_compiled * 1000:>14.3f} | '
+              f'{t_wrapper / t_compiled:>6.2f}x | {diff:>9.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import time
+
+import click
+import numpy as np
+import pandas as pd
+
+from src.data.loader import TIPO_DTYPE, TIPOS_TRANSACAO
+from src.features import FeaturePipeline, carregar_features, matriz_features, salvar_features
+
+
+def gerar_features(n, seed=42):
+    """
+    Gera um dataset de features sintético com os mesmos dtypes do FeaturePipeline.
+    """
+    rng = np.random.default_rng(seed)
+    amount = np.round(rng.lognormal(10, 1.5, n), 2).astype(np.float32)
+    old_orig = np.round(rng.lognormal(10, 2, n), 2).astype(np.float32)
+    old_dest = np.round(rng.lognormal(11, 2, n), 2).astype(np.float32)
+    return FeaturePipeline(target='isFraud').transform({
+        'step': np.sort(rng.integers(1, 744, n)).astype(np.int16),
+        'type': rng.choice(TIPOS_TRANSACAO, n),
+        'amount': amount,
+        'nameOrig': np.char.add('C', rng.integers(1e8, 2e9, n).astype(str)),
+        'oldbalanceOrg': old_orig,
+        'newbalanceOrig': np.maximum(old_orig - amount, 0),
+        'nameDest': np.char.add('C', rng.integers(1e8, 1e8 + max(n // 10, 1), n).astype(str)),
+        'oldbalanceDest': old_dest,
+        'newbalanceDest': old_dest + amount,
+        'isFraud': (rng.random(n) < 0.0013).astype(np.int8),
+    })
+
+
+def _matriz(df):
+    # Mesmo formato consumido pelo treino: float32 column-major
+    return matriz_features(df, FeaturePipeline.output_columns, order='F')
+
+
+def _cronometrar(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+@click.command()
+@click.option('--rows', default = 1000000, type = int, help = 'Linhas do dataset sintético')
+@click.option('--input', 'input_path', default = None, type = click.Path(exists=True), help = 'Arquivo Arrow de features existente (substitui o sintético)')
+@click.option('--repeats', default = 3, type = int, help = 'Repetições de cada leitura (vale a menor)')
+def main(rows, input_path, repeats):
+    """ Benchmarks the CSV feature hand-off against Parquet and memory-mapped Arrow IPC. """
+    df = carregar_features(input_path).copy() if input_path else gerar_features(rows)
+    columns = list(df.columns)
+    expected = _matriz(df)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = {fmt: os.path.join(tmp_dir, f'features.{fmt}') for fmt in ('csv', 'parquet', 'arrow')}
+        writers = {
+            'csv': lambda: df.to_csv(paths['csv'], index=False),
+            'parquet': lambda: df.to_parquet(paths['parquet'], engine='pyarrow', index=False),
+            'arrow': lambda: salvar_features(df, paths['arrow']),
+        }
+        readers = {
+            # O CSV não guarda o dicionário de categorias: 'type' precisa ser informado na leitura
+            'csv': lambda: pd.read_csv(paths['csv'], usecols=columns, dtype={'type': TIPO_DTYPE}),
+            'parquet': lambda: pd.read_parquet(paths['parquet'], columns=columns),
+            'arrow': lambda: carregar_features(paths['arrow'], columns=columns),
+        }
+
+        print(f'{len(df)} linhas, colunas {columns}\n')
+        print(f"{'formato':>8} | {'tamanho (MB)':>12} | {'escrita (s)':>11} | {'leitura (s)':>11} | "
+              f"{'leitura+matriz (s)':>18} | {'dtypes preservados':>18} | {'máx |Δ| float32':>15}")
+        for fmt in ('csv', 'parquet', 'arrow'):
+            write_time, _ = _cronometrar(writers[fmt], 1)
+            read_time, loaded = _cronometrar(readers[fmt], repeats)
+            matrix_time, matrix = _cronometrar(lambda: _matriz(readers[fmt]()), repeats)
+            same_dtypes = all(loaded[c].dtype == df[c].dtype for c in columns)
+            # Diferença em relação aos valores float32 originais após a ida e volta
+            diff = float(np.max(np.abs(matrix.astype(np.float64) - expected.astype(np.float64))))
+            print(f'{fmt:>8} | {os.path.getsize(paths[fmt]) / 2**20:>12.1f} | {write_time:>11.3f} | '
+                  f'{read_time:>11.4f} | {matrix_time:>18.4f} | {str(same_dtypes):>18} | {diff:>15.3g}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import re
+import subprocess
+import sys
+import time
+
+import click
+
+_LINHA_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| *(\S+)')
+
+
+def medir_importacao(module):
+    """
+    Importa `module` em um processo novo com `python -X importtime` e retorna
+    o tempo total do processo (s), o tempo cumulativo do módulo (s) e a lista
+    (cumulativo_us, nome) dos pacotes raiz importados (ex.: pandas, pyarrow).
+    """
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, check=True
+    )
+    wall = time.perf_counter() - start
+
+    module_time = 0.0
+    packages = {}
+    for line in proc.stderr.splitlines():
+        match = _LINHA_RE.match(line)
+        if not match:
+            continue
+        cumulative, name = int(match.group(2)), match.group(3)
+        if name == module:
+            module_time = cumulative / 1e6
+        elif '.' not in name and name != module.split('.')[0]:
+            packages[name] = max(packages.get(name, 0), cumulative)
+    return wall, module_time, sorted(((t, n) for n, t in packages.items()), reverse=True)
+
+
+@click.command()
+@click.argument('modules', nargs=-1)
+@click.option('--top', default = 5, type = int, help = 'Número de imports mais lentos exibidos')
+def main(modules, top):
+    """ Measures the cold import time of the pipeline modules. """
+    modules = modules or ('src.models.predict_model', 'src.models.train_model')
+    for module in modules:
+        wall, module_time, packages = medir_importacao(module)
+        print(f'{module}: import {module_time:.3f}s | processo completo {wall:.3f}s')
+        for cumulative, name in packages[:top]:
+            print(f'    {cumulative / 1e6:8.3f}s  {name}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import time
+
+import click
+import numpy as np
+
+
+def gerar_transacoes(n, seed=42):
+    """
+    Gera transações sintéticas no formato do PaySim para o teste de carga.
+    """
+    rng = np.random.default_rng(seed)
+    transactions = []
+    for _ in range(n):
+        amount = round(float(rng.lognormal(10, 1.5)), 2)
+        old_orig = round(float(rng.lognormal(10, 2)), 2)
+        old_dest = round(float(rng.lognormal(11, 2)), 2)
+        transactions.append({
+            'step': int(rng.integers(1, 744)),
+            'type': str(rng.choice(['CASH_IN', 'CASH_OUT', 'DEBIT', 'PAYMENT', 'TRANSFER'])),
+            'amount': amount,
+            'nameOrig': f'C{rng.integers(1e8, 2e9)}',
+            'oldbalanceOrg': old_orig,
+            'newbalanceOrig': round(max(old_orig - amount, 0.0), 2),
+            'nameDest': f'C{rng.integers(1e8, 1e8 + n)}',
+            'oldbalanceDest': old_dest,
+            'newbalanceDest': round(old_dest + amount, 2),
+        })
+    return transactions
+
+
+async def _cliente(host, port, payloads, latencies, deadline):
+    """
+    Conexão keep-alive que envia requisições POST /score em sequência até o prazo.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    i = 0
+    try:
+        while time.perf_counter() < deadline:
+            body = payloads[i % len(payloads)]
+            i += 1
+            request = (
+                f'POST /score HTTP/1.1\r\nHost: {host}\r\n'
+                f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n'
+            ).encode('latin-1') + body
+
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+
+            length = 0
+            status = await reader.readline()
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            await reader.readexactly(length)
+            if b' 200 ' not in status:
+                raise RuntimeError(f'Resposta inesperada do servidor: {status!r}')
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def executar_carga(host, port, concurrency, duration, n_payloads=1000):
+    payloads = [json.dumps(t).encode() for t in gerar_transacoes(n_payloads)]
+    latencies = []
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*[
+        _cliente(host, port, payloads[i::concurrency] or payloads, latencies, deadline)
+        for i in range(concurrency)
+    ])
+    return np.array(latencies), time.perf_counter() - start
+
+
+@click.command()
+@click.option('--host', default = '127.0.0.1', help = 'Endereço do servidor de scoring')
+@click.option('--port', default = 8000, type = int, help = 'Porta do servidor de scoring')
+@click.option('--concurrency', default = 16, type = int, help = 'Conexões simultâneas')
+@click.option('--duration', default = 10.0, type = float, help = 'Duração do teste em segundos')
+def main(host, port, concurrency, duration):
+    """ Load-tests a local scoring server and reports latency percentiles and QPS. """
+    latencies, elapsed = asyncio.run(executar_carga(host, port, concurrency, duration))
+    if latencies.size == 0:
+        print('Nenhuma requisição concluída.')
+        return
+    ms = latencies * 1000
+    print(f'{latencies.size} requisições em {elapsed:.2f}s ({latencies.size / elapsed:,.0f} QPS, '
+          f'{concurrency} conexões)')
+    print(f'Latência p50: {np.percentile(ms, 50):.2f} ms | p90: {np.percentile(ms, 90):.2f} ms '
+          f'| p99: {np.percentile(ms, 99):.2f} ms | máx: {ms.max():.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
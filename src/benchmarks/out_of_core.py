@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+import lightgbm as lgb
+import numpy as np
+
+from src.data.loader import iterar_transacoes
+from src.features import FeaturePipeline, coluna_float32
+from src.utils import ArrayAccumulator
+
+project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+MODOS = ('sample', 'full_in_memory', 'xgb_quantile', 'xgb_external', 'lightgbm')
+
+
+class ColumnSequence(lgb.Sequence):
+    """
+    Sequência de acesso aleatório sobre colunas float32 em memmap: o LightGBM lê
+    amostras para definir os bins e depois percorre as linhas em lotes de `batch_size`.
+    """
+
+    def __init__(self, columns, batch_size):
+        self.columns = columns
+        self.batch_size = batch_size
+
+    def __getitem__(self, idx):
+        # Índice inteiro retorna uma linha 1-D em float64 (amostragem dos bins); fatias, uma matriz
+        if isinstance(idx, (int, np.integer)):
+            return np.array([column[idx] for column in self.columns], dtype=np.float64)
+        return np.column_stack([column[idx] for column in self.columns])
+
+    def __len__(self):
+        return len(self.columns[0])
+
+
+def treinar_lightgbm_out_of_core(path, spill_dir, chunksize=500000, max_bin=255, n_jobs=None):
+    """
+    Equivalente out-of-core para o LightGBM, usado só nesta comparação (o modelo
+    final do train e o bundle são do XGBoost): os chunks são gravados coluna a
+    coluna em memmaps no spill_dir e o Dataset é construído a partir de uma
+    lightgbm.Sequence, lendo um lote por vez. Usa os mesmos parâmetros do
+    LGBMClassifier(class_weight='balanced') da validação cruzada.
+    """
+    pipeline = FeaturePipeline(target='isFraud')
+    feature_names = list(pipeline.output_columns)
+    columns = {
+        name: ArrayAccumulator(np.float32, chunksize, os.path.join(spill_dir, f'{name}.bin'))
+        for name in feature_names
+    }
+    labels = ArrayAccumulator(np.int8, chunksize, os.path.join(spill_dir, 'isFraud.bin'))
+    chunks = iterar_transacoes(path, columns=[*pipeline.input_columns, 'isFraud'], chunksize=chunksize)
+    for features in pipeline.transform_batch(chunks):
+        for name in feature_names:
+            columns[name].extend(coluna_float32(features[name]))
+        labels.extend(features['isFraud'])
+
+    y = labels.to_numpy()
+    n_positives = int(y.sum())
+    sequence = ColumnSequence([columns[name].to_numpy() for name in feature_names], batch_size=chunksize)
+    # class_weight='balanced' equivale a pesos n / (2 * n_classe)
+    weights = np.where(y == 1, len(y) / (2 * max(n_positives, 1)),
+                       len(y) / (2 * max(len(y) - n_positives, 1))).astype(np.float32)
+    dataset = lgb.Dataset(sequence, label=y, weight=weights, feature_name=feature_names,
+                          categorical_feature=list(pipeline.categorical_columns),
+                          params={'max_bin': max_bin, 'verbose': -1})
+    params = {'objective': 'binary', 'seed': 42, 'max_bin': max_bin, 'verbose': -1}
+    if n_jobs:
+        params['num_threads'] = n_jobs
+    booster = lgb.train(params, dataset, num_boost_round=100)
+    return booster, {'n_samples': len(y), 'n_positives': n_positives}
+
+
+def _executar_modo(mode, sample_path, full_path, chunksize):
+    """
+    Treina o modelo final em um dos modos e retorna (linhas, segundos, pico de RSS em MB).
+    Roda em um processo novo para que o pico de RSS seja só deste modo.
+    """
+    from src.models.train_model import build_best_model
+    from src.utils import peak_rss_mb
+
+    start = time.perf_counter()
+    if mode in ('sample', 'full_in_memory'):
+        # Caminho original: tudo em memória e XGBClassifier.fit
+        pipeline = FeaturePipeline(target='isFraud')
+        if mode == 'sample':
+            from src.features.feature_store import carregar_features
+            df = carregar_features(sample_path, columns=[*pipeline.output_columns, 'isFraud'])
+        else:
+            from src.data.loader import carregar_transacoes
+            df = pipeline.transform(carregar_transacoes(full_path, columns=[*pipeline.input_columns, 'isFraud']))
+        X, y = df[list(pipeline.output_columns)], df['isFraud']
+        model = build_best_model((y == 0).sum() / (y == 1).sum())
+        model.fit(X, y)
+        n_rows = len(y)
+    elif mode in ('xgb_quantile', 'xgb_external'):
+        from src.models.out_of_core import treinar_xgboost_out_of_core
+        with tempfile.TemporaryDirectory() as cache_dir:
+            _, info = treinar_xgboost_out_of_core(full_path, chunksize=chunksize, cache_dir=cache_dir,
+                                                  external_memory=mode == 'xgb_external')
+        n_rows = info['n_samples']
+    else:
+        with tempfile.TemporaryDirectory() as spill_dir:
+            _, info = treinar_lightgbm_out_of_core(full_path, spill_dir, chunksize=chunksize)
+        n_rows = info['n_samples']
+    return int(n_rows), time.perf_counter() - start, peak_rss_mb()
+
+
+@click.command()
+@click.option('--modes', default = ','.join(MODOS), help = f'Modos separados por vírgula: {", ".join(MODOS)}')
+@click.option('--chunk-size', default = 500000, type = int, help = 'Linhas por lote nos modos out-of-core')
+def main(modes, chunk_size):
+    """ Compares wall time and peak RSS of sampled vs out-of-core final-model training. """
+    from src.data.loader import caminho_dados_brutos
+
+    sample_path = os.path.join(project_dir, 'data', 'processed', 'fraud_features.arrow')
+    full_path = caminho_dados_brutos(project_dir)
+    print(f'Amostra: {sample_path}\nDataset completo: {full_path}\n')
+    print(f"{'modo':>15} | {'linhas':>10} | {'tempo (s)':>9} | {'pico RSS (MB)':>13}")
+
+    context = multiprocessing.get_context('spawn')
+    for mode in modes.split(','):
+        mode = mode.strip()
+        if mode not in MODOS:
+            raise click.BadParameter(f'Modo desconhecido: {mode}')
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            n_rows, elapsed, rss = pool.submit(_executar_modo, mode, sample_path, full_path, chunk_size).result()
+        print(f'{mode:>15} | {n_rows:>10} | {elapsed:>9.2f} | {rss:>13.1f}')
+
+
+if __name__ == '__main__':
+    main()
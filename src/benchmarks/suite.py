@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import click
+import numpy as np
+
+project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+resultados_dir = os.path.join(project_dir, 'reports', 'benchmarks')
+# Sentido de cada métrica comparada: 1 = maior é melhor, -1 = menor é melhor
+METRICAS = {'rows_per_sec': 1, 'peak_rss_mb': -1, 'p95_ms': -1}
+
+
+def _percentis(latencies):
+    latencies = np.asarray(latencies) * 1000
+    return {f'p{q}_ms': float(np.percentile(latencies, q)) for q in (50, 95, 99)}
+
+
+def _resultado(rows, seconds, **extra):
+    from src.utils import peak_rss_mb
+
+    return {'rows': int(rows), 'seconds': seconds, 'rows_per_sec': rows / seconds if seconds > 0 else 0.0,
+            'peak_rss_mb': peak_rss_mb(), **extra}
+
+
+def _gerar_dados(paths, params):
+    from src.benchmarks.synthetic import gerar_transacoes_paysim
+
+    gerar_transacoes_paysim(params['rows'], params['seed']).to_csv(paths['raw'], index=False)
+
+
+def _nomes_modelos():
+    from src.models.train_model import build_models
+
+    return list(build_models(1.0))
+
+
+def _etapa_amostra(paths, params):
+    """
+    make_dataset: amostragem estratificada em streaming do CSV bruto para parquet.
+    """
+    from src.data.make_dataset import gerar_amostra
+
+    start = time.perf_counter()
+    gerar_amostra(paths['raw'], paths['sample'], params['sample_rows'], 'isFraud', True,
+                  params['chunk_size'], params['seed'])
+    return {'sample': _resultado(params['rows'], time.perf_counter() - start)}
+
+
+def _etapa_features(paths, params):
+    """
+    build_features: FeaturePipeline no fluxo completo, seleção das linhas da amostra e gravação do Arrow.
+    """
+    import pyarrow.parquet as pq
+    from src.features.build_features import construir_features
+
+    start = time.perf_counter()
+    construir_features(paths['sample'], paths['features'], paths['accounts'], raw_path=paths['raw'])
+    return {'features': _resultado(pq.read_metadata(paths['sample']).num_rows, time.perf_counter() - start)}
+
+
+def _etapa_fold(paths, params, name):
+    """
+    train_model: um fold da validação cruzada (fit no restante, predict no fold 0) para um modelo.
+    """
+    from src.features import FeaturePipeline
+    from src.models.cv_engine import atribuir_folds, carregar_matriz_treino
+    from src.models.scoring import prever_com_limiar
+    from src.models.train_model import build_models
+
+    X, y = carregar_matriz_treino(paths['features'], list(FeaturePipeline.output_columns), 'isFraud',
+                                  cache_dir=os.path.dirname(paths['features']))
+    model = build_models((y == 0).sum() / max((y == 1).sum(), 1))[name]
+    folds = atribuir_folds(y, n_splits=5)
+    train_idx, test_idx = np.flatnonzero(folds != 0), np.flatnonzero(folds == 0)
+    X_tr, X_te = np.asfortranarray(X[train_idx]), np.asfortranarray(X[test_idx])
+
+    start = time.perf_counter()
+    model.fit(X_tr, y[train_idx])
+    fit_time = time.perf_counter() - start
+    start = time.perf_counter()
+    prever_com_limiar(model, X_te)
+    predict_time = time.perf_counter() - start
+    return {f'cv_fold/{name}': _resultado(len(y), fit_time + predict_time,
+                                          fit_s=fit_time, predict_s=predict_time)}
+
+
+def _etapa_pontuacao(paths, params):
+    """
+    predict_model: leitura em chunks do CSV bruto, FeaturePipeline e inferência por
+    chunk com o modelo final treinado nas features da amostra.
+    A latência de cada chunk cobre transformação e inferência.
+    """
+    from src.data.loader import iterar_transacoes
+    from src.features import FeaturePipeline, carregar_features
+    from src.models.predict_model import score_chunk
+    from src.models.train_model import build_best_model
+
+    pipeline = FeaturePipeline(target='isFraud')
+    df = carregar_features(paths['features'], columns=[*pipeline.output_columns, 'isFraud'])
+    X, y = df[list(pipeline.output_columns)], df['isFraud']
+    model = build_best_model((y == 0).sum() / max((y == 1).sum(), 1))
+    model.fit(X, y)
+
+    latencies, rows = [], 0
+    start = time.perf_counter()
+    for chunk in iterar_transacoes(paths['raw'], columns=[*pipeline.input_columns, 'isFraud'],
+                                   chunksize=params['score_chunk_size']):
+        chunk_start = time.perf_counter()
+        score_chunk(model, pipeline.transform(chunk))
+        latencies.append(time.perf_counter() - chunk_start)
+        rows += len(chunk)
+    return {'scoring': _resultado(rows, time.perf_counter() - start, chunks=len(latencies),
+                                  **_percentis(latencies))}
+
+
+def _executar(pool_context, fn, *args):
+    # Cada etapa roda em um processo novo para que o pico de RSS seja só dela. O pico de
+    # RSS do processo filho parte do tamanho do pai, então o pai não importa as bibliotecas
+    # de modelos nem gera os dados
+    with ProcessPoolExecutor(max_workers=1, mp_context=pool_context) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def executar_suite(rows, seed=42, sample_frac=0.5, chunk_size=500000, score_chunk_size=50000, models=None):
+    """
+    Gera o dataset sintético em uma pasta temporária e mede amostragem,
+    features, um fold da validação cruzada por modelo e a pontuação em chunks.
+    Retorna {etapa: métricas}.
+    """
+    params = {'rows': rows, 'seed': seed, 'sample_rows': max(int(rows * sample_frac), 1),
+              'chunk_size': chunk_size, 'score_chunk_size': score_chunk_size}
+    context = multiprocessing.get_context('spawn')
+    models = models or _executar(context, _nomes_modelos)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='bench_') as tmp_dir:
+        paths = {name: os.path.join(tmp_dir, file) for name, file in (
+            ('raw', 'Fraud.csv'), ('sample', 'Fraud_sample.parquet'),
+            ('features', 'fraud_features.arrow'), ('accounts', 'account_ids.arrow'),
+        )}
+        print(f'Gerando {rows} transações sintéticas...')
+        _executar(context, _gerar_dados, paths, params)
+
+        stages = [(_etapa_amostra,), (_etapa_features,), *((_etapa_fold, name) for name in models),
+                  (_etapa_pontuacao,)]
+        for fn, *extra in stages:
+            result = _executar(context, fn, paths, params, *extra)
+            for stage, metrics in result.items():
+                print(f'{stage:>28} | {metrics["seconds"]:>8.2f}s | {metrics["rows_per_sec"]:>12,.0f} linhas/s '
+                      f'| pico RSS {metrics["peak_rss_mb"]:>8.1f} MB')
+            results.update(result)
+    return results
+
+
+def metadados(params):
+    from importlib.metadata import version
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'libraries': {lib: version(lib) for lib in ('numpy', 'pandas', 'pyarrow', 'scikit-learn', 'xgboost', 'lightgbm')},
+        'params': params,
+    }
+
+
+def comparar(baseline, current, tolerance):
+    """
+    Compara as métricas de cada etapa com as da baseline. Retorna linhas
+    (etapa, métrica, baseline, atual, variação, regressão) e se houve regressão.
+    Variações piores que `tolerance` (fração) contam como regressão.
+    """
+    rows, regression = [], False
+    for stage, metrics in current.items():
+        base = baseline.get(stage)
+        if base is None:
+            continue
+        for metric, direction in METRICAS.items():
+            if metric not in metrics or not base.get(metric):
+                continue
+            change = (metrics[metric] - base[metric]) / base[metric]
+            worse = -direction * change > tolerance
+            regression |= worse
+            rows.append((stage, metric, base[metric], metrics[metric], change, worse))
+    return rows, regression
+
+
+@click.command()
+@click.option('--rows', default = 200000, type = int, help = 'Transações sintéticas geradas')
+@click.option('--seed', default = 42, type = int, help = 'Semente do gerador')
+@click.option('--sample-frac', default = 0.5, type = float, help = 'Fração das linhas mantida pela amostragem')
+@click.option('--score-chunk-size', default = 50000, type = int, help = 'Linhas por chunk na pontuação')
+@click.option('--models', default = None, help = 'Modelos da validação cruzada, separados por vírgula (padrão: todos)')
+@click.option('--output', default = os.path.join(resultados_dir, 'latest.json'), type = click.Path(), help = 'Arquivo JSON de resultados')
+@click.option('--baseline', default = None, type = click.Path(), help = 'JSON de uma execução anterior para comparar')
+@click.option('--tolerance', default = 0.15, type = float, help = 'Piora relativa tolerada antes de acusar regressão')
+@click.option('--compare-only', is_flag = True, help = 'Só compara --output com --baseline, sem rodar a suíte')
+def main(rows, seed, sample_frac, score_chunk_size, models, output, baseline, tolerance, compare_only):
+    """ Benchmarks sampling, featurization, one CV fold per model and chunked scoring on synthetic PaySim data. """
+    if compare_only:
+        with open(output, encoding='utf-8') as f:
+            report = json.load(f)
+    else:
+        models = [m.strip() for m in models.split(',')] if models else None
+        results = executar_suite(rows, seed, sample_frac, score_chunk_size=score_chunk_size, models=models)
+        report = {'meta': metadados({'rows': rows, 'seed': seed, 'sample_frac': sample_frac,
+                                     'score_chunk_size': score_chunk_size}),
+                  'results': results}
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f'\nResultados gravados em {output}')
+
+    if baseline is None or not os.path.exists(baseline):
+        if baseline is not None:
+            print(f'Baseline {baseline} não encontrada: nada a comparar.')
+        return
+
+    with open(baseline, encoding='utf-8') as f:
+        base = json.load(f)
+    if base['meta']['params'] != report['meta']['params']:
+        print(f"Aviso: parâmetros diferentes da baseline ({base['meta']['params']})")
+    rows_cmp, regression = comparar(base['results'], report['results'], tolerance)
+    print(f"\n{'etapa':>28} | {'métrica':>12} | {'baseline':>12} | {'atual':>12} | {'variação':>9} |")
+    for stage, metric, old, new, change, worse in rows_cmp:
+        print(f'{stage:>28} | {metric:>12} | {old:>12.2f} | {new:>12.2f} | {change:>+9.1%} | '
+              f'{"REGRESSÃO" if worse else "ok"}')
+    if regression:
+        sys.exit(f'Regressão acima de {tolerance:.0%} em relação a {baseline}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import click
+import numpy as np
+import pandas as pd
+
+from src.data.loader import CSV_DTYPES, TIPO_DTYPE, TIPOS_COM_FRAUDE, TIPOS_TRANSACAO
+
+# Proporção de cada tipo no PaySim original (mesma ordem de TIPOS_TRANSACAO)
+PROPORCAO_TIPOS = [0.22, 0.352, 0.0065, 0.338, 0.0835]
+# Taxa de fraude do PaySim original (8 213 de 6 362 620 transações)
+TAXA_FRAUDE = 0.00129
+STEPS = 743
+
+
+def gerar_transacoes_paysim(n, seed=42, fraud_rate=TAXA_FRAUDE):
+    """
+    Gera `n` transações sintéticas no formato do CSV do PaySim (mesmas colunas
+    e dtypes de CSV_DTYPES), ordenadas por step, sem o download do Kaggle.
+
+    Reproduz o que importa para as etapas do pipeline: proporção dos tipos,
+    fraude apenas em TRANSFER/CASH_OUT, contas de origem e destino que se
+    repetem (as features por conta têm estado), comerciantes ('M') como
+    destino dos PAYMENT e fraudes que esvaziam a conta de origem.
+    """
+    rng = np.random.default_rng(seed)
+    step = np.sort(rng.integers(1, STEPS + 1, n)).astype(np.int16)
+    type_codes = rng.choice(len(TIPOS_TRANSACAO), n, p=PROPORCAO_TIPOS).astype(np.int8)
+    types = np.asarray(TIPOS_TRANSACAO)[type_codes]
+
+    fraud_types = np.isin(types, TIPOS_COM_FRAUDE)
+    fraud_prob = fraud_rate / max(fraud_types.mean(), 1e-12)
+    is_fraud = fraud_types & (rng.random(n) < fraud_prob)
+
+    amount = np.round(rng.lognormal(10.5, 1.3, n), 2)
+    old_orig = np.round(np.where(rng.random(n) < 0.3, 0, rng.lognormal(10, 2, n)), 2)
+    # Na fraude o valor é o saldo inteiro da origem
+    old_orig = np.where(is_fraud, np.maximum(old_orig, amount), old_orig)
+    amount = np.where(is_fraud, old_orig, amount)
+    cash_in = types == 'CASH_IN'
+    new_orig = np.where(cash_in, old_orig + amount, np.maximum(old_orig - amount, 0))
+
+    merchant = types == 'PAYMENT'
+    old_dest = np.round(np.where(merchant | (rng.random(n) < 0.4), 0, rng.lognormal(11, 2, n)), 2)
+    new_dest = np.where(cash_in, np.maximum(old_dest - amount, 0), old_dest + amount)
+    # Comerciantes e parte dos destinos de fraude não têm saldo registrado
+    zero_dest = merchant | (is_fraud & (rng.random(n) < 0.5))
+    old_dest = np.where(zero_dest, 0, old_dest)
+    new_dest = np.where(zero_dest, 0, new_dest)
+
+    n_customers = max(n // 2, 1)
+    orig_ids = rng.integers(0, n_customers, n)
+    dest_ids = rng.integers(0, max(n // 10, 1), n)
+    name_orig = np.char.add('C', (1_000_000_000 + orig_ids).astype(str))
+    name_dest = np.where(
+        merchant,
+        np.char.add('M', (1_000_000_000 + dest_ids).astype(str)),
+        np.char.add('C', (1_000_000_000 + dest_ids).astype(str)),
+    )
+
+    df = pd.DataFrame({
+        'step': step,
+        'type': pd.Categorical(types, dtype=TIPO_DTYPE),
+        'amount': amount,
+        'nameOrig': name_orig,
+        'oldbalanceOrg': old_orig,
+        'newbalanceOrig': new_orig,
+        'nameDest': name_dest,
+        'oldbalanceDest': old_dest,
+        'newbalanceDest': new_dest,
+        'isFraud': is_fraud,
+        'isFlaggedFraud': is_fraud & (types == 'TRANSFER') & (amount > 200000),
+    })
+    return df.astype(CSV_DTYPES)
+
+
+@click.command()
+@click.argument('output_filepath', type=click.Path())
+@click.option('--rows', default = 1000000, type = int, help = 'Número de transações')
+@click.option('--seed', default = 42, type = int, help = 'Semente do gerador')
+def main(output_filepath, rows, seed):
+    """ Writes a synthetic PaySim-shaped transactions CSV. """
+    df = gerar_transacoes_paysim(rows, seed)
+    df.to_csv(output_filepath, index=False)
+    print(f'{len(df)} transações ({int(df["isFraud"].sum())} fraudes) gravadas em {output_filepath}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,3 @@
+from .loader import carregar_transacoes, iterar_transacoes, caminho_dados_brutos, TIPOS_TRANSACAO
+
+__all__ = ['carregar_transacoes', 'iterar_transacoes', 'caminho_dados_brutos', 'TIPOS_TRANSACAO']
@@ -0,0 +1,177 @@
+import os
+import re
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# Categorias fixas da coluna 'type' (mesma ordem em todas as etapas)
+TIPOS_TRANSACAO = ['CASH_IN', 'CASH_OUT', 'DEBIT', 'PAYMENT', 'TRANSFER']
+TIPO_DTYPE = pd.CategoricalDtype(TIPOS_TRANSACAO)
+# Tipos em que há fraude no PaySim; pré-filtro padrão quando o manifesto do modelo não traz a lista
+TIPOS_COM_FRAUDE = ['CASH_OUT', 'TRANSFER']
+
+# Schema compacto das transações brutas
+SCHEMA_TRANSACOES = pa.schema([
+    ('step', pa.int16()),
+    ('type', pa.dictionary(pa.int8(), pa.string())),
+    ('amount', pa.float32()),
+    ('nameOrig', pa.string()),
+    ('oldbalanceOrg', pa.float32()),
+    ('newbalanceOrig', pa.float32()),
+    ('nameDest', pa.string()),
+    ('oldbalanceDest', pa.float32()),
+    ('newbalanceDest', pa.float32()),
+    ('isFraud', pa.int8()),
+    ('isFlaggedFraud', pa.int8()),
+])
+
+# Dtypes equivalentes para a leitura direta do CSV
+CSV_DTYPES = {
+    'step': 'int16',
+    'type': TIPO_DTYPE,
+    'amount': 'float32',
+    'nameOrig': 'str',
+    'oldbalanceOrg': 'float32',
+    'newbalanceOrig': 'float32',
+    'nameDest': 'str',
+    'oldbalanceDest': 'float32',
+    'newbalanceDest': 'float32',
+    'isFraud': 'int8',
+    'isFlaggedFraud': 'int8',
+}
+
+# Posição da transação no dataset bruto, gravada na amostra: as features por conta são
+# calculadas no fluxo completo e alinhadas às linhas amostradas por ela
+COLUNA_LINHA = 'rowId'
+
+# Coluna de partição do dataset parquet (um diretório por dia de 24 steps)
+PARTICAO = 'day'
+_PARTICAO_RE = re.compile(rf'{PARTICAO}=(\d+)')
+
+
+def caminho_dados_brutos(project_dir):
+    """
+    Retorna o dataset parquet particionado se ele já foi gerado pela ingestão,
+    ou o CSV original caso contrário.
+    """
+    dataset_dir = os.path.join(project_dir, 'data', 'interim', 'Fraud_dataset')
+    if os.path.isdir(dataset_dir):
+        return dataset_dir
+    return os.path.join(project_dir, 'data', 'raw', 'Fraud.csv')
+
+
+def para_tabela_arrow(df):
+    """
+    Converte um DataFrame de transações para o schema compacto,
+    com dicionário fixo para 'type'.
+    """
+    arrays = []
+    for field in SCHEMA_TRANSACOES:
+        if field.name == 'type':
+            codes = pd.Categorical(df['type'], categories=TIPOS_TRANSACAO).codes
+            arrays.append(pa.DictionaryArray.from_arrays(
+                pa.array(codes, type=pa.int8(), mask=codes < 0),
+                pa.array(TIPOS_TRANSACAO)
+            ))
+        else:
+            arrays.append(pa.array(df[field.name], type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=SCHEMA_TRANSACOES)
+
+
+def _abrir_dataset(path):
+    """
+    Abre o dataset particionado com os arquivos ordenados por dia,
+    preservando a ordem original das transações.
+    """
+    files = []
+    for root, _, names in os.walk(path):
+        files.extend(os.path.join(root, n) for n in names if n.endswith('.parquet'))
+
+    def ordem(file_path):
+        match = _PARTICAO_RE.search(file_path)
+        return (int(match.group(1)) if match else -1, file_path)
+
+    return ds.dataset(
+        sorted(files, key=ordem),
+        format='parquet',
+        partitioning=ds.partitioning(pa.schema([(PARTICAO, pa.int16())]), flavor='hive'),
+        partition_base_dir=path,
+    )
+
+
+def _filtro_steps(steps):
+    if steps is None:
+        return None
+    inicio, fim = steps
+    return ((ds.field('step') >= inicio) & (ds.field('step') <= fim)
+            & (ds.field(PARTICAO) >= inicio // 24) & (ds.field(PARTICAO) <= fim // 24))
+
+
+def _para_pandas(table):
+    df = table.to_pandas()
+    if 'type' in df.columns:
+        df['type'] = df['type'].astype(TIPO_DTYPE)
+    return df
+
+
+def carregar_transacoes(path, columns=None, steps=None):
+    """
+    Carrega as transações do dataset parquet particionado ou do CSV bruto,
+    lendo apenas as colunas pedidas e já com os dtypes compactos.
+    steps é um intervalo fechado (inicio, fim) opcional sobre a coluna 'step'.
+    """
+    columns = list(columns) if columns is not None else SCHEMA_TRANSACOES.names
+
+    if os.path.isdir(path):
+        table = _abrir_dataset(path).to_table(columns=columns, filter=_filtro_steps(steps))
+        return _para_pandas(table)
+
+    df = pd.read_csv(path, usecols=columns, dtype={c: CSV_DTYPES[c] for c in columns})
+    if steps is not None:
+        df = df[df['step'].between(*steps)].reset_index(drop=True)
+    return df[columns]
+
+
+def iterar_transacoes(path, columns=None, chunksize=500000, steps=None):
+    """
+    Itera sobre as transações em chunks de até `chunksize` linhas.
+    O índice de cada chunk continua a numeração do anterior, como em pd.read_csv.
+    """
+    columns = list(columns) if columns is not None else SCHEMA_TRANSACOES.names
+
+    if not os.path.isdir(path):
+        reader = pd.read_csv(path, usecols=columns, chunksize=chunksize,
+                             dtype={c: CSV_DTYPES[c] for c in columns})
+        for chunk in reader:
+            if steps is not None:
+                chunk = chunk[chunk['step'].between(*steps)]
+            yield chunk[columns]
+        return
+
+    offset = 0
+    scanner = _abrir_dataset(path).scanner(
+        columns=columns, filter=_filtro_steps(steps), batch_size=chunksize
+    )
+    pending = []
+    pending_rows = 0
+    for batch in scanner.to_batches():
+        if batch.num_rows == 0:
+            continue
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        if pending_rows >= chunksize:
+            table = pa.Table.from_batches(pending)
+            for start in range(0, table.num_rows - chunksize + 1, chunksize):
+                chunk = _para_pandas(table.slice(start, chunksize))
+                chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+                offset += len(chunk)
+                yield chunk
+            rest = table.num_rows % chunksize
+            pending = table.slice(table.num_rows - rest).to_batches() if rest else []
+            pending_rows = rest
+
+    if pending_rows:
+        chunk = _para_pandas(pa.Table.from_batches(pending))
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        yield chunk
@@ -1,9 +1,138 @@
 # -*- coding: utf-8 -*-
 import click
 import logging
+import time
 from pathlib import Path
 from dotenv import find_dotenv, load_dotenv
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
+
+from src.data.loader import (
+    COLUNA_LINHA, SCHEMA_TRANSACOES, carregar_transacoes, iterar_transacoes, para_tabela_arrow
+)
+from src.utils import etapa, peak_rss_mb, rastrear
+from src.utils.stage_cache import StageCache, executar_com_cache
+
+
+def contar_estratos(input_filepath, strata, chunksize):
+    """
+    Conta as linhas de cada estrato lendo apenas as colunas de estratificação.
+    Retorna uma Series indexada pelos estratos e o total de linhas.
+    """
+    counts = None
+    for chunk in iterar_transacoes(input_filepath, columns=strata, chunksize=chunksize):
+        chunk_counts = chunk.value_counts(subset=strata, sort=False)
+        counts = chunk_counts if counts is None else counts.add(chunk_counts, fill_value=0)
+    counts = counts.astype('int64')
+    return counts, int(counts.sum())
+
+
+def amostragem_estratificada_streaming(input_filepath, nrows, target, chunksize, seed):
+    """
+    Amostragem estratificada por [target, 'type'] em memória constante.
+    Retorna None se nrows não for menor que o total de linhas.
+    Cada linha recebe uma chave aleatória e, por estrato, são mantidas apenas as
+    `round(frac * n_estrato)` menores chaves (reservoir sampling com cotas exatas).
+    A memória fica limitada ao tamanho da amostra mais um chunk.
+    A amostra traz COLUNA_LINHA com a posição de cada linha no dado bruto.
+    """
+    strata = [target, 'type']
+    with etapa('make_dataset.count_strata') as span:
+        counts, total = contar_estratos(input_filepath, strata, chunksize)
+        span.rows = total
+    if nrows >= total:
+        return None, total
+
+    frac = nrows / total
+    quotas = {key: round(frac * n) for key, n in counts.items()}
+
+    rng = np.random.default_rng(seed)
+    reservoirs = {}
+
+    with etapa('make_dataset.sample', rows=total):
+        for chunk in iterar_transacoes(input_filepath, chunksize=chunksize):
+            chunk['_key'] = rng.random(len(chunk))
+            for key, group in chunk.groupby(strata, sort=False, observed=True):
+                quota = quotas.get(key, 0)
+                if quota == 0:
+                    continue
+                if key in reservoirs:
+                    group = pd.concat([reservoirs[key], group])
+                if len(group) > quota:
+                    keep = np.argpartition(group['_key'].to_numpy(), quota - 1)[:quota]
+                    group = group.iloc[keep]
+                reservoirs[key] = group
+
+    if not reservoirs:
+        return SCHEMA_TRANSACOES.empty_table().to_pandas().assign(**{COLUNA_LINHA: np.int64(0)}), total
+
+    # Mantém a mesma disposição do groupby: estratos ordenados e ordem original dentro de cada um.
+    # O índice dos chunks é a posição no dado bruto e fica gravado em COLUNA_LINHA
+    df = pd.concat([reservoirs[key] for key in sorted(reservoirs)])
+    df = df.drop(columns='_key').sort_index()
+    df[COLUNA_LINHA] = df.index.to_numpy(dtype=np.int64)
+    df = df.sort_values(strata, kind='stable').reset_index(drop=True)
+    return df, total
+
+
+def copiar_em_streaming(input_filepath, output_filepath, chunksize):
+    """
+    Converte os dados brutos inteiros para parquet chunk a chunk, sem carregá-los na memória.
+    """
+    total = 0
+    with etapa('make_dataset.copy') as span, pq.ParquetWriter(output_filepath, SCHEMA_TRANSACOES) as writer:
+        for chunk in iterar_transacoes(input_filepath, chunksize=chunksize):
+            writer.write_table(para_tabela_arrow(chunk))
+            total += len(chunk)
+        span.rows = total
+    return total
+
+
+def gerar_amostra(input_filepath, output_filepath, nrows, target, stream, chunksize, seed):
+    """
+    Gera a amostra estratificada (ou a cópia completa) em output_filepath e
+    registra o tempo, a vazão e o pico de memória.
+    """
+    logger = logging.getLogger(__name__)
+    start = time.perf_counter()
+
+    if stream:
+        df = None
+        if nrows is not None:
+            df, total_rows = amostragem_estratificada_streaming(
+                input_filepath, nrows, target, chunksize, seed
+            )
+
+        if df is None:
+            total_rows = copiar_em_streaming(input_filepath, output_filepath, chunksize)
+            df = pd.read_parquet(output_filepath, columns=[target])
+        else:
+            with etapa('make_dataset.write', rows=len(df)):
+                df.to_parquet(output_filepath, engine='pyarrow', index = False)
+    else:
+        with etapa('make_dataset.read') as span:
+            df = carregar_transacoes(input_filepath)
+            total_rows = span.rows = len(df)
+
+        if nrows is not None and nrows < len(df):
+            frac = nrows/len(df)
+            start_col = [target, 'type']
+            with etapa('make_dataset.sample', rows=total_rows):
+                # GroupBy.sample mantém as colunas de estratificação e o índice original
+                # (no pandas 3 o apply deixa de repassar as colunas de agrupamento)
+                df = df.groupby(start_col, observed=True).sample(frac = frac, random_state = seed)
+                df[COLUNA_LINHA] = df.index.to_numpy(dtype=np.int64)
+            
+        # Salvar arquivo em parquet
+        with etapa('make_dataset.write', rows=len(df)):
+            df.to_parquet(output_filepath, engine='pyarrow', index = False)
+
+    elapsed = time.perf_counter() - start
+    logger.info(f'Amostra salva em {output_filepath} com shape {df.shape} e proporção:')
+    logger.info(df[target].value_counts(normalize=True))
+    logger.info(f'{total_rows} linhas lidas em {elapsed:.2f}s '
+                f'({total_rows / elapsed:,.0f} linhas/s), pico de RSS: {peak_rss_mb():.1f} MB')
 
 
 @click.command()
@@ -11,25 +140,33 @@ import pandas as pd
 @click.argument('output_filepath', type=click.Path())
 @click.option('--nrows', default = None, type = int , help = 'Número de Linhas')
 @click.option('--target', default = 'isFraud', help = 'Coluna Alvo Principal para Estratificação')
-def main(input_filepath, output_filepath, nrows, target):
+@click.option('--stream/--no-stream', default = False, help = 'Lê o CSV em chunks com memória limitada')
+@click.option('--chunksize', default = 500000, type = int, help = 'Linhas por chunk no modo streaming')
+@click.option('--seed', default = 42, type = int, help = 'Semente da amostragem')
+def main(input_filepath, output_filepath, nrows, target, stream, chunksize, seed):
     """ Runs data processing scripts to turn raw data from (../raw) into
         cleaned data ready to be analyzed (saved in ../processed).
     """
     
     logger = logging.getLogger(__name__)
     logger.info('making final data set from raw data')
-    
-    df = pd.read_csv(input_filepath)
-    
-    if nrows is not None and nrows < len(df):
-        frac = nrows/len(df)
-        start_col = [target, 'type']
-        df = df.groupby(start_col, group_keys=False).apply(lambda x:x.sample(frac = frac, random_state = 42))
-        
-    # Salvar arquivo em parquet
-    df.to_parquet(output_filepath, engine='pyarrow', index = False)
-    logger.info(f'Amostra salva em {output_filepath} com shape {df.shape} e proporção:')
-    logger.info(df[target].value_counts(normalize=True))
+
+    # A amostra só é refeita quando o dado bruto, os parâmetros ou o código mudam
+    # (o chunksize não altera o resultado do modo streaming)
+    cache = StageCache()
+    inputs = {
+        'raw': cache.impressao_digital(input_filepath),
+        'nrows': nrows, 'target': target, 'stream': stream, 'seed': seed,
+        'code': cache.versao_codigo('src.data.make_dataset', 'src.data.loader'),
+    }
+    with rastrear('make_dataset'):
+        hit = executar_com_cache(
+            'sample', inputs, {'sample': output_filepath},
+            lambda: gerar_amostra(input_filepath, output_filepath, nrows, target, stream, chunksize, seed),
+            cache
+        )
+    if hit:
+        logger.info(f'Entradas inalteradas: amostra restaurada do cache de estágios em {output_filepath}')
 
 if __name__ == '__main__':
     log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -1 +1,12 @@
-from .build_features import criando_novas_features, removendo_features_redundantes_e_ineficientes
\ No newline at end of file
+from .account_encoder import AccountEncoder
+from .build_features import FeaturePipeline
+from .entity_features import EntityFeatures, EntityStateStore
+from .feature_store import (
+    carregar_features, carregar_tabela_features, coluna_float32, features_path, matriz_features, salvar_features
+)
+
+__all__ = [
+    'AccountEncoder', 'FeaturePipeline', 'EntityFeatures', 'EntityStateStore',
+    'carregar_features', 'carregar_tabela_features', 'coluna_float32', 'features_path', 'matriz_features',
+    'salvar_features',
+]
@@ -0,0 +1,128 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+accounts_path = os.path.join(project_dir, 'data', 'processed', 'account_ids.arrow')
+
+
+class AccountEncoder:
+    """
+    Dicionário de contas (nameOrig/nameDest) para IDs densos int32, atribuídos
+    na ordem em que as contas aparecem. Contas novas recebem o próximo ID livre,
+    tanto no lote quanto na pontuação em streaming, e cada ID guarda se a conta
+    é de um comerciante (prefixo 'M') ou de um cliente ('C').
+
+    A codificação fatoriza o lote e consulta o dicionário apenas uma vez por
+    conta distinta; depois disso agregações, joins e groupbys por conta rodam
+    sobre arrays de inteiros.
+
+    O dicionário gerado junto com as features é gravado por salvar() e segue no
+    bundle do modelo; predict, serve e o retreino incremental partem dele com
+    carregar(), então uma conta tem o mesmo ID no treino e na pontuação. Os
+    `fixos` IDs carregados nunca mudam; compactar() só descarta contas novas
+    que saíram da janela, para que o dicionário não cresça sem limite em fluxos
+    longos (serve, predict do dataset completo).
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._names = []
+        # Flags por ID em um buffer cuja capacidade dobra quando enche (inserção O(1) amortizada)
+        self._merchant = np.zeros(1024, dtype=np.int8)
+        # IDs [0, fixos) vieram do dicionário persistido e são estáveis entre execuções
+        self.fixos = 0
+
+    def __len__(self):
+        return len(self._names)
+
+    def codificar(self, names, add=True):
+        """
+        Retorna os IDs int32 de `names`. Com add=False, contas desconhecidas
+        recebem -1 em vez de um novo ID.
+        """
+        codes, uniques = pd.factorize(np.asarray(names, dtype=object))
+        uniques = uniques.tolist()
+        ids = self._ids
+        # Posição extra para o código -1 do factorize (nomes ausentes)
+        mapped = np.array([ids.get(name, -1) for name in uniques] + [-1], dtype=np.int32)
+
+        new = np.flatnonzero(mapped[:-1] < 0)
+        if add and len(new):
+            first = len(self._names)
+            new_ids = np.arange(first, first + len(new), dtype=np.int32)
+            new_names = [uniques[i] for i in new.tolist()]
+            ids.update(zip(new_names, new_ids.tolist()))
+            self._names.extend(new_names)
+            mapped[new] = new_ids
+
+            capacity = len(self._merchant)
+            while capacity < len(self._names):
+                capacity *= 2
+            if capacity > len(self._merchant):
+                self._merchant = np.concatenate([self._merchant, np.zeros(capacity - len(self._merchant), np.int8)])
+            self._merchant[first:len(self._names)] = np.fromiter(
+                (str(name).startswith('M') for name in new_names), dtype=np.int8, count=len(new_names)
+            )
+        return mapped[codes]
+
+    def comerciante(self, ids):
+        """
+        Flag int8 de comerciante para cada ID (0 para IDs -1).
+        """
+        ids = np.asarray(ids)
+        return np.where(ids >= 0, self._merchant[ids], 0).astype(np.int8)
+
+    def nomes(self, ids):
+        names = self._names
+        return np.array([names[i] for i in np.asarray(ids).tolist()], dtype=object)
+
+    def compactar(self, ids):
+        """
+        Mantém os IDs fixos e, das contas novas, só as de `ids` (por exemplo, as
+        ativas no EntityStateStore), renumeradas logo após os fixos na ordem dada.
+        Retorna um array antigo ID -> novo ID (-1 para contas removidas).
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        ids = np.concatenate([np.arange(self.fixos, dtype=np.int64), ids[ids >= self.fixos]])
+        remap = np.full(len(self._names), -1, dtype=np.int32)
+        remap[ids] = np.arange(len(ids), dtype=np.int32)
+        names = self._names
+        self._names = [names[i] for i in ids.tolist()]
+        self._ids = dict(zip(self._names, range(len(self._names))))
+        merchant = self._merchant[ids]
+        self._merchant = np.zeros(max(1024, 2 * len(ids)), dtype=np.int8)
+        self._merchant[:len(ids)] = merchant
+        return remap
+
+    def salvar(self, path=accounts_path):
+        """
+        Grava o dicionário como Arrow IPC (o ID é a posição da linha), com
+        gravação atômica como em salvar_features.
+        """
+        table = pa.table({
+            'name': pa.array(self._names, type=pa.string()),
+            'merchant': pa.array(self._merchant[:len(self._names)]),
+        })
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        feather.write_feather(table, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def carregar(cls, path=accounts_path):
+        """
+        Lê um dicionário gravado por salvar(); todos os seus IDs ficam fixos.
+        """
+        table = feather.read_table(path)
+        encoder = cls()
+        encoder._names = table.column('name').to_pylist()
+        encoder._ids = {name: i for i, name in enumerate(encoder._names)}
+        merchant = table.column('merchant').to_numpy()
+        encoder._merchant = np.zeros(max(1024, 2 * len(merchant)), dtype=np.int8)
+        encoder._merchant[:len(merchant)] = merchant
+        encoder.fixos = len(encoder._names)
+        return encoder
@@ -1,34 +1,235 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import os
 
-def removendo_features_redundantes_e_ineficientes(df):
-    print('Removendo colunas desnecessárias...')
-    df = df.drop(['newbalanceOrig', 'newbalanceDest', 
-                  'isFlaggedFraud', 'nameOrig', 'nameDest', 'type'], axis=1)
-    return df
+from src.data.loader import COLUNA_LINHA, TIPO_DTYPE, caminho_dados_brutos, iterar_transacoes
+from src.features.account_encoder import AccountEncoder, accounts_path
+from src.features.entity_features import EntityFeatures
+from src.features.feature_store import salvar_features
+from src.utils import etapa, rastrear
+
+# Tamanho a partir do qual o dicionário de contas é compactado para as contas ativas na janela
+MAX_CONTAS = 1_000_000
+
+
+class FeaturePipeline:
+    """
+    Pipeline de engenharia de features com schema de entrada e saída declarado.
+    Seleciona apenas as colunas de entrada antes de qualquer processamento e monta
+    a saída a partir de arrays NumPy: colunas de entrada são repassadas sem cópia
+    e cada feature derivada custa uma única alocação.
+    Aceita DataFrames do pandas, tabelas/record batches do Arrow ou dicionários de arrays.
+
+    As features por conta (EntityFeatures) dependem das transações anteriores:
+    cada instância mantém um EntityStateStore que continua de uma chamada de
+    transform() para a seguinte. Pontuar um dataset inteiro, chunk a chunk ou
+    uma transação por vez (em ordem de step) gera as mesmas features; reset()
+    recomeça o estado.
+
+    As contas são convertidas em IDs int32 pelo AccountEncoder antes de chegar
+    ao estado; contas novas recebem IDs durante o streaming. Com um `encoder`
+    carregado do bundle os IDs são os mesmos do treino. Quando as contas novas
+    passam de `max_accounts` (e do dobro das contas ativas), o dicionário é
+    compactado para as que ainda estão na janela, então a memória acompanha o
+    estado; max_accounts=None desliga a compactação.
+    """
+
+    input_columns = ('step', 'type', 'amount', 'nameOrig', 'oldbalanceOrg', 'newbalanceOrig',
+                     'nameDest', 'oldbalanceDest', 'newbalanceDest')
+    output_columns = ('step', 'type', 'amount', 'oldbalanceOrg', 'oldbalanceDest', 'hour', 'destIsMerchant',
+                      *EntityFeatures.output_columns)
+    # 'type' segue como categórico com a lista fixa TIPOS_TRANSACAO (códigos int8, sem one-hot)
+    categorical_columns = ('type',)
+    # Incrementar sempre que as features derivadas mudarem; gravado no manifesto do modelo
+    version = 4
+
+    def __init__(self, target=None, state=None, encoder=None, max_accounts=MAX_CONTAS):
+        # Coluna alvo opcional, repassada ao final da saída quando presente na entrada
+        self.target = target
+        self.encoder = encoder if encoder is not None else AccountEncoder()
+        self.max_accounts = max_accounts
+        self.entity_features = EntityFeatures(state)
+
+    @classmethod
+    def feature_types(cls):
+        """
+        Tipos das colunas de saída no formato do XGBoost ('c' categórica, 'q' numérica).
+        """
+        return ['c' if name in cls.categorical_columns else 'q' for name in cls.output_columns]
+
+    @classmethod
+    def categorical_indices(cls):
+        return [cls.output_columns.index(name) for name in cls.categorical_columns]
+
+    def reset(self):
+        # Os IDs das contas são mantidos; só os agregados da janela recomeçam
+        self.entity_features.state.reset()
+
+    @staticmethod
+    def _coluna(data, name):
+        column = data[name]
+        if hasattr(column, 'to_numpy'):
+            try:
+                return column.to_numpy()
+            except TypeError:
+                # Colunas do Arrow só aceitam to_numpy() sem cópia quando não há nulos
+                return column.to_numpy(zero_copy_only=False)
+        return column
+
+    @staticmethod
+    def _tipo(data):
+        # Categórico do pandas, dicionário do Arrow ou strings: sempre recodificado para TIPO_DTYPE
+        column = data['type']
+        if isinstance(column, (pa.ChunkedArray, pa.Array)):
+            column = column.to_pandas()
+        return pd.Categorical(column, dtype=TIPO_DTYPE)
+
+    def _colunas_presentes(self, data):
+        names = data.column_names if hasattr(data, 'column_names') else list(data.keys())
+        missing = [c for c in self.input_columns if c not in names]
+        if missing:
+            raise KeyError(f"Colunas de entrada ausentes: {missing}")
+        return names
+
+    def transform(self, data):
+        """
+        Aplica o pipeline e retorna um DataFrame com as colunas de `output_columns`
+        (mais a coluna alvo, se configurada e presente).
+        """
+        names = self._colunas_presentes(data)
+        columns = {name: self._coluna(data, name) for name in self.input_columns if name != 'type'}
+        columns['type'] = self._tipo(data)
+
+        # Contas como IDs inteiros: o estado por conta e os groupbys não tocam em strings
+        columns['nameOrigId'] = self.encoder.codificar(columns.pop('nameOrig'))
+        columns['nameDestId'] = self.encoder.codificar(columns.pop('nameDest'))
+
+        # Features derivadas
+        columns['hour'] = columns['step'] % 24
+        columns['destIsMerchant'] = self.encoder.comerciante(columns['nameDestId'])
+        columns.update(self.entity_features.transform(
+            {**columns, 'nameOrig': columns['nameOrigId'], 'nameDest': columns['nameDestId']}
+        ))
+
+        # Contas que saíram da janela não precisam mais de ID
+        state = self.entity_features.state
+        novas = len(self.encoder) - self.encoder.fixos
+        if self.max_accounts is not None and novas > max(self.max_accounts, 2 * len(state)):
+            state.renumerar(self.encoder.compactar(state.contas()))
+
+        output = {name: columns[name] for name in self.output_columns}
+        if self.target is not None and self.target in names:
+            output[self.target] = self._coluna(data, self.target)
+
+        index = data.index if isinstance(data, pd.DataFrame) else None
+        return pd.DataFrame(output, index=index, copy=False)
+
+    def transform_batch(self, batches):
+        """
+        Aplica o pipeline a cada item de um iterador de chunks.
+        """
+        for batch in batches:
+            yield self.transform(batch)
+
+
+def _features_do_fluxo_completo(pipeline, raw_path, rows, chunksize):
+    """
+    Passa o dado bruto inteiro, em ordem, pelo pipeline e guarda só as linhas
+    cujas posições estão em `rows`, na ordem de `rows`. O estado por conta vê
+    todas as transações, como no predict e no serve, e não só as amostradas.
+    """
+    order = np.argsort(rows, kind='stable')
+    sorted_rows = rows[order]
+    parts = []
+    chunks = iterar_transacoes(raw_path, columns=[*pipeline.input_columns, pipeline.target], chunksize=chunksize)
+    for chunk in chunks:
+        features = pipeline.transform(chunk)
+        first = int(chunk.index[0])
+        lo, hi = np.searchsorted(sorted_rows, [first, first + len(chunk)])
+        parts.append(features.iloc[sorted_rows[lo:hi] - first])
+    df = pd.concat(parts, ignore_index=True)
+    if len(df) != len(rows):
+        raise ValueError(f"A amostra tem {len(rows)} linhas, mas só {len(df)} posições existem em {raw_path}; "
+                         f"refaça a amostra a partir deste dado bruto.")
+    # Volta para a ordem da amostra
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(len(order))
+    return df.iloc[inverse].reset_index(drop=True)
+
+
+def construir_features(file_path, output_path, accounts_output_path=accounts_path, raw_path=None,
+                       chunksize=500000):
+    """
+    Gera as features das linhas da amostra. Quando a amostra traz COLUNA_LINHA
+    (gerada por subamostragem), as features por conta são calculadas no fluxo
+    completo de `raw_path` e alinhadas às linhas amostradas; sem ela a amostra é
+    o próprio dado bruto inteiro e é transformada diretamente.
+    O dicionário de contas do fluxo inteiro (sem compactação) é gravado em
+    `accounts_output_path` e vai para o bundle do modelo no treino.
+    """
+    pipeline = FeaturePipeline(target='isFraud', max_accounts=None)
+    sampled = COLUNA_LINHA in pq.read_schema(file_path).names
+    with etapa('build_features.read') as span:
+        columns = [COLUNA_LINHA, pipeline.target] if sampled else [*pipeline.input_columns, pipeline.target]
+        df = pd.read_parquet(file_path, columns=columns)
+        span.rows = len(df)
 
-def criando_novas_features(df):
     print('Criando novas features...')
-    df['hour'] = df['step'] % 24
-    return df
+    if sampled:
+        if raw_path is None:
+            raise ValueError("A amostra foi subamostrada: informe o dado bruto (raw_path) para calcular "
+                             "as features por conta no fluxo completo.")
+        with etapa('build_features.transform') as span:
+            features = _features_do_fluxo_completo(pipeline, raw_path, df[COLUNA_LINHA].to_numpy(), chunksize)
+            span.rows = len(features)
+        # O rótulo de cada linha tem de bater com o do dado bruto na mesma posição
+        if not np.array_equal(features[pipeline.target].to_numpy(), df[pipeline.target].to_numpy()):
+            raise ValueError(f"A amostra {file_path} não corresponde ao dado bruto {raw_path}; refaça a amostra.")
+        df = features
+    else:
+        with etapa('build_features.transform', rows=len(df)):
+            df = pipeline.transform(df)
+
+    # Arrow IPC tipado: train_model e os scorers mapeiam o arquivo sem parsear texto
+    with etapa('build_features.save', rows=len(df)) as span:
+        salvar_features(df, output_path)
+        pipeline.encoder.salvar(accounts_output_path)
+        span.contar('accounts', len(pipeline.encoder))
+
 
 def main():
+    from src.utils.stage_cache import StageCache, executar_com_cache
+
     print('Iniciando a engenharia de features...')
     data_dir = os.path.join('data', 'interim')
     file_path = os.path.join(data_dir, 'Fraud_sample.parquet')
+    processed_dir = os.path.join('data', 'processed')
+    output_path = os.path.join(processed_dir, 'fraud_features.arrow')
+    accounts_output_path = os.path.join(processed_dir, 'account_ids.arrow')
 
-    try:
-        df = pd.read_parquet(file_path)
-    except FileNotFoundError:
+    if not os.path.exists(file_path):
         print(f"Erro: Arquivo {file_path} não encontrado.")
         return
 
-    df = criando_novas_features(df)
-    df = removendo_features_redundantes_e_ineficientes(df)
+    # As features por conta são calculadas no fluxo completo do dado bruto e alinhadas à amostra
+    raw_path = caminho_dados_brutos('.')
 
-    processed_dir = os.path.join('data', 'processed')
-    os.makedirs(processed_dir, exist_ok=True)
-    df.to_csv(os.path.join(processed_dir, 'fraud_features.csv'), index=False)
+    # As features só são recalculadas quando a amostra, o dado bruto ou o código do pipeline mudam
+    cache = StageCache()
+    inputs = {
+        'sample': cache.impressao_digital(file_path),
+        'raw': cache.impressao_digital(raw_path) if os.path.exists(raw_path) else None,
+        'code': cache.versao_codigo('src.features.build_features', 'src.features.entity_features',
+                                    'src.features.account_encoder'),
+        'pipeline_version': FeaturePipeline.version,
+    }
+    outputs = {'features': output_path, 'accounts': accounts_output_path}
+    with rastrear('build_features'):
+        if executar_com_cache('features', inputs, outputs,
+                              lambda: construir_features(file_path, output_path, accounts_output_path, raw_path), cache):
+            print('Amostra e código inalterados: features restauradas do cache de estágios.')
     print(f"Dataset processado salvo em {processed_dir}")
 
 if __name__ == '__main__':
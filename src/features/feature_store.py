@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+features_path = os.path.join(project_dir, 'data', 'processed', 'fraud_features.arrow')
+
+
+def salvar_features(df, path=features_path):
+    """
+    Grava o dataset de features como arquivo Arrow IPC (Feather v2) sem compressão,
+    preservando os dtypes (int16/float32/int8) e em um único record batch, para que
+    a leitura possa mapear o arquivo em memória sem cópias nem conversão de texto.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False).combine_chunks()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    feather.write_feather(table, tmp_path, compression='uncompressed', chunksize=max(table.num_rows, 1))
+    os.replace(tmp_path, path)
+
+
+def carregar_tabela_features(path=features_path, columns=None):
+    """
+    Abre o arquivo de features como tabela Arrow mapeada em memória (zero-copy):
+    os buffers das colunas apontam para as páginas do arquivo.
+    """
+    return feather.read_table(path, columns=list(columns) if columns is not None else None, memory_map=True)
+
+
+def carregar_features(path=features_path, columns=None):
+    """
+    Retorna um DataFrame cujas colunas são views NumPy dos buffers mapeados do arquivo,
+    sem cópia (as colunas são somente leitura).
+    """
+    table = carregar_tabela_features(path, columns)
+    return pd.DataFrame({name: _coluna(table.column(name)) for name in table.column_names}, copy=False)
+
+
+def _coluna(column):
+    # Arquivos gravados por salvar_features têm um único chunk; outros são concatenados (com cópia)
+    if pa.types.is_dictionary(column.type):
+        # Categóricas: os códigos vêm direto dos índices do dicionário
+        chunk = column.combine_chunks() if column.num_chunks != 1 else column.chunk(0)
+        codes = chunk.indices.fill_null(-1) if chunk.null_count else chunk.indices
+        return pd.Categorical.from_codes(
+            codes.to_numpy(), dtype=pd.CategoricalDtype(chunk.dictionary.to_pylist())
+        )
+    if column.num_chunks == 1:
+        return column.chunk(0).to_numpy(zero_copy_only=True)
+    return column.to_numpy()
+
+
+def coluna_float32(column):
+    """
+    Converte uma coluna de features (pandas, NumPy ou Arrow) para float32.
+    Colunas categóricas viram os códigos das categorias, com NaN para valores
+    ausentes ou desconhecidos, que é o formato esperado pelo suporte nativo a
+    categorias do XGBoost e do LightGBM.
+    """
+    if isinstance(column, (pa.ChunkedArray, pa.Array)):
+        if pa.types.is_dictionary(column.type):
+            column = column.to_pandas()
+        else:
+            return np.asarray(column.to_numpy(), dtype=np.float32)
+    if isinstance(getattr(column, 'dtype', None), pd.CategoricalDtype):
+        codes = np.asarray(column.cat.codes if hasattr(column, 'cat') else column.codes, dtype=np.float32)
+        codes[codes < 0] = np.nan
+        return codes
+    return np.asarray(column, dtype=np.float32)
+
+
+def matriz_features(df, columns, order='C'):
+    """
+    Monta a matriz float32 de `columns` coluna a coluna (categorias como códigos).
+    """
+    X = np.empty((len(df), len(columns)), dtype=np.float32, order=order)
+    for j, name in enumerate(columns):
+        X[:, j] = coluna_float32(df[name])
+    return X
@@ -0,0 +1,185 @@
+import json
+
+import numpy as np
+
+from src.features.feature_store import matriz_features
+
+# Objetivos suportados e a transformação da margem em probabilidade
+_OBJETIVOS = ('binary:logistic', 'reg:logistic')
+
+
+def _base_margin(learner):
+    """
+    Converte o base_score (em probabilidade) salvo no JSON do XGBoost para margem.
+    Versões recentes gravam o valor como lista ('[5E-1]').
+    """
+    base_score = learner['learner_model_param']['base_score'].strip('[]')
+    p = float(base_score.split(',')[0])
+    return float(np.log(p / (1 - p)))
+
+
+def _mascaras_categoricas(tree, n_nodes):
+    """
+    Máscara de bits por nó com as categorias do split (0 em nós numéricos e folhas).
+    """
+    mask = np.zeros(n_nodes, dtype=np.uint64)
+    segments, sizes, categories = tree['categories_segments'], tree['categories_sizes'], tree['categories']
+    for node, start, size in zip(tree['categories_nodes'], segments, sizes):
+        cats = categories[start:start + size]
+        if cats and max(cats) >= 64:
+            raise ValueError("Splits com mais de 64 categorias não são suportados pelo preditor compilado.")
+        mask[node] = sum(1 << int(c) for c in cats)
+    return mask
+
+
+def compilar_booster(booster):
+    """
+    Achata as árvores de um Booster do XGBoost em arrays NumPy compactos.
+    Todas as árvores são concatenadas; os filhos usam índices globais, o filho
+    direito é sempre left + 1 e folhas têm left == -1 com o valor em `value`.
+    Splits categóricos (enable_categorical) guardam em `category_mask` o
+    conjunto de categorias que vai para a direita, como bits de um uint64.
+    """
+    model = json.loads(booster.save_raw(raw_format='json'))
+    learner = model['learner']
+    objective = learner['objective']['name']
+    if objective not in _OBJETIVOS:
+        raise ValueError(f"Objetivo não suportado pelo preditor compilado: {objective}")
+
+    trees = learner['gradient_booster']['model']['trees']
+
+    feature, threshold, left, default_left, value, roots, category_mask = [], [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for tree in trees:
+        lc = np.asarray(tree['left_children'], dtype=np.int32)
+        is_leaf = lc == -1
+        # O XGBoost aloca os filhos de cada split lado a lado (right == left + 1)
+        if np.any(~is_leaf & (np.asarray(tree['right_children']) != lc + 1)):
+            raise ValueError("Layout de nós inesperado: filhos esquerdo e direito não são adjacentes.")
+        cond = np.asarray(tree['split_conditions'], dtype=np.float32)
+
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, tree['split_indices']).astype(np.int32))
+        threshold.append(np.where(is_leaf, 0, cond).astype(np.float32))
+        value.append(np.where(is_leaf, cond, 0).astype(np.float32))
+        left.append(np.where(is_leaf, -1, lc + offset).astype(np.int32))
+        default_left.append(np.asarray(tree['default_left'], dtype=bool))
+        category_mask.append(_mascaras_categoricas(tree, len(lc)))
+
+        # Profundidade da árvore a partir dos pais
+        parents = np.asarray(tree['parents'], dtype=np.int64)
+        depth = np.zeros(len(lc), dtype=np.int32)
+        for node in range(1, len(lc)):
+            depth[node] = depth[parents[node]] + 1
+        max_depth = max(max_depth, int(depth.max()))
+        offset += len(lc)
+
+    return {
+        'feature': np.concatenate(feature),
+        'threshold': np.concatenate(threshold),
+        'left': np.concatenate(left),
+        'default_left': np.concatenate(default_left),
+        'value': np.concatenate(value),
+        'roots': np.asarray(roots, dtype=np.int32),
+        'category_mask': np.concatenate(category_mask),
+        'base_margin': np.float64(_base_margin(learner)),
+        'max_depth': np.int32(max_depth),
+        'feature_names': np.asarray(booster.feature_names or [], dtype=str),
+    }
+
+
+def salvar_modelo_compilado(model, path):
+    """
+    Compila o booster de um XGBClassifier (ou Booster) e salva os arrays em .npz.
+    """
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    np.savez(path, **compilar_booster(booster))
+
+
+class CompiledTreePredictor:
+    """
+    Preditor NumPy para o ensemble XGBoost achatado por `compilar_booster`.
+    Avalia todas as árvores sobre o lote com travessia vetorizada nível a nível:
+    a cada nível, todas as (linha, árvore) descem um nó ao mesmo tempo.
+
+    Folhas viram laços: left = nó - 1 e limiar NaN (a comparação é sempre falsa),
+    então `próximo = left + 1 - vai_para_esquerda` mantém a linha parada na folha
+    sem máscaras extras. Nós categóricos também têm limiar NaN e decidem pela
+    máscara de categorias; o passo extra só roda se o modelo tiver esses nós.
+    """
+
+    classes_ = np.array([0, 1])
+
+    def __init__(self, arrays, block_size=2048):
+        leaf = arrays['left'] < 0
+        nodes = np.arange(len(leaf), dtype=np.int32)
+        self.feature = arrays['feature']
+        self.threshold = np.where(leaf, np.float32(np.nan), arrays['threshold'])
+        self.left = np.where(leaf, nodes - 1, arrays['left']).astype(np.int32)
+        self.default_left = arrays['default_left'] & ~leaf
+        # Modelos compilados antes do suporte a categorias não têm a máscara
+        self.category_mask = arrays.get('category_mask', np.zeros(len(leaf), dtype=np.uint64))
+        self.is_categorical = self.category_mask != 0
+        self.has_categorical = bool(self.is_categorical.any())
+        self.threshold[self.is_categorical] = np.nan
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.base_margin = float(arrays['base_margin'])
+        self.max_depth = int(arrays['max_depth'])
+        self.feature_names = [str(f) for f in arrays['feature_names']]
+        # Blocos pequenos mantêm a matriz (linhas x árvores) de nós no cache
+        self.block_size = block_size
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        with np.load(path) as data:
+            return cls({k: data[k] for k in data.files}, **kwargs)
+
+    def _matriz(self, X):
+        if hasattr(X, 'columns'):
+            # Colunas categóricas do DataFrame viram os códigos usados nos splits
+            return matriz_features(X, self.feature_names or list(X.columns))
+        return np.ascontiguousarray(X, dtype=np.float32)
+
+    def _margem_bloco(self, X):
+        n, n_features = X.shape
+        flat = X.ravel()
+        rows = (np.arange(n, dtype=np.int32) * n_features)[:, None]
+        has_nan = np.isnan(flat).any()
+        node = np.broadcast_to(self.roots, (n, len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            x = flat.take(rows + self.feature.take(node))
+            go_left = x < self.threshold.take(node)
+            if self.has_categorical:
+                go_left |= self._esquerda_categorica(x, node)
+            if has_nan:
+                go_left |= np.isnan(x) & self.default_left.take(node)
+            node = self.left.take(node) + 1
+            node -= go_left
+        return self.value.take(node).sum(axis=1, dtype=np.float64) + self.base_margin
+
+    def _esquerda_categorica(self, x, node):
+        # Categorias presentes na máscara vão para a direita; NaN segue default_left
+        categorical = self.is_categorical.take(node) & ~np.isnan(x)
+        codes = np.where(categorical, x, 0).astype(np.uint64)
+        in_set = (self.category_mask.take(node) >> codes) & np.uint64(1)
+        return categorical & (in_set == 0)
+
+    def predict_margin(self, X):
+        X = self._matriz(X)
+        return np.concatenate([
+            self._margem_bloco(X[start:start + self.block_size])
+            for start in range(0, max(len(X), 1), self.block_size)
+        ])[:len(X)]
+
+    def predict_proba(self, X):
+        """
+        Retorna um array (n, 2) como XGBClassifier.predict_proba.
+        """
+        p1 = 1.0 / (1.0 + np.exp(-self.predict_margin(X)))
+        p1 = p1.astype(np.float32)
+        return np.column_stack([1 - p1, p1])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(np.int64)
@@ -0,0 +1,229 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import warnings
+
+import numpy as np
+from joblib import Parallel, delayed, parallel_config
+from sklearn.base import clone
+from sklearn.metrics import precision_score, recall_score, f1_score
+from sklearn.model_selection import StratifiedKFold
+from threadpoolctl import threadpool_limits
+warnings.filterwarnings("ignore")
+
+from src.models.scoring import prever_com_limiar
+from src.utils import ArrayAccumulator, peak_rss_mb
+
+
+def _salvar_memmap(folder, name, array):
+    path = os.path.join(folder, f'{name}.npy')
+    np.save(path, array)
+    return path
+
+
+def _caminho_memmap(folder, name, array):
+    """
+    Reaproveita o arquivo .npy de origem quando o array já é um memmap completo
+    (como os retornados por carregar_matriz_treino); caso contrário grava uma cópia.
+    """
+    filename = getattr(array, 'filename', None)
+    if (isinstance(array, np.memmap) and filename and os.path.exists(filename)
+            and np.load(filename, mmap_mode='r').shape == array.shape):
+        return filename
+    return _salvar_memmap(folder, name, array)
+
+
+def carregar_matriz_treino(features_path, feature_columns, target, cache_dir):
+    """
+    Carrega a matriz de treino uma única vez como float32 column-major e o alvo
+    como int8, persistidos em .npy no cache_dir e abertos como memmap.
+    As colunas são lidas do arquivo Arrow de features mapeado em memória e
+    copiadas uma a uma direto para o .npy, sem materializar um DataFrame
+    (colunas categóricas entram como códigos).
+    Os arquivos são refeitos quando a impressão digital do conteúdo das features
+    (ou as colunas) difere da gravada ao lado deles; datas de modificação não
+    bastam, já que o cache de estágios pode restaurar features antigas.
+    """
+    from src.features.feature_store import carregar_tabela_features, coluna_float32
+    from src.utils.stage_cache import StageCache
+
+    base = os.path.splitext(os.path.basename(features_path))[0]
+    X_path = os.path.join(cache_dir, f'{base}_X.npy')
+    y_path = os.path.join(cache_dir, f'{base}_y.npy')
+    meta_path = os.path.join(cache_dir, f'{base}_matrix.json')
+
+    meta = {
+        'features': StageCache().impressao_digital(features_path),
+        'columns': list(feature_columns),
+        'target': target,
+    }
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            stale = json.load(f) != meta
+    except (FileNotFoundError, json.JSONDecodeError):
+        stale = True
+    stale = stale or not os.path.exists(X_path) or not os.path.exists(y_path)
+
+    if stale:
+        table = carregar_tabela_features(features_path, [*feature_columns, target])
+        X = np.lib.format.open_memmap(X_path, mode='w+', dtype=np.float32,
+                                      shape=(table.num_rows, len(feature_columns)), fortran_order=True)
+        for j, name in enumerate(feature_columns):
+            X[:, j] = coluna_float32(table.column(name))
+        X.flush()
+        np.save(y_path, table.column(target).to_numpy().astype(np.int8, copy=False))
+        del X, table
+        # A impressão digital é gravada por último: uma escrita interrompida refaz os .npy
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    return np.load(X_path, mmap_mode='r'), np.load(y_path, mmap_mode='r')
+
+
+def _linhas(X, idx):
+    """
+    Seleciona linhas de uma matriz column-major coluna a coluna, mantendo o mesmo
+    layout que o pandas entrega aos estimadores (resultados idênticos ao X.iloc).
+    """
+    out = np.empty((len(idx), X.shape[1]), dtype=X.dtype, order='F')
+    for j in range(X.shape[1]):
+        np.take(X[:, j], idx, out=out[:, j])
+    return out
+
+
+def _metricas_fold(y_te, y_pred):
+    return {
+        'precision_macro': precision_score(y_te, y_pred, average='macro', zero_division=0),
+        'recall_macro': recall_score(y_te, y_pred, average='macro', zero_division=0),
+        'f1_macro': f1_score(y_te, y_pred, average='macro', zero_division=0),
+        'precision_weighted': precision_score(y_te, y_pred, average='weighted'),
+        'recall_weighted': recall_score(y_te, y_pred, average='weighted'),
+        'f1_weighted': f1_score(y_te, y_pred, average='weighted'),
+    }
+
+
+def _importancias(model):
+    if hasattr(model, 'feature_importances_'):
+        return model.feature_importances_
+    if hasattr(model, 'coef_'):
+        return np.abs(model.coef_)[0]
+    return None
+
+
+def _executar_job(model, fold, paths, threads_per_job, threshold):
+    """
+    Treina e avalia um modelo em um fold. X, y e a atribuição de folds são abertos
+    como memmap, de modo que nenhum dado de treino é serializado por job.
+    """
+    X = np.load(paths['X'], mmap_mode='r')
+    y = np.load(paths['y'], mmap_mode='r')
+    folds = np.load(paths['folds'], mmap_mode='r')
+
+    train_idx = np.flatnonzero(folds != fold)
+    test_idx = np.flatnonzero(folds == fold)
+    X_tr, X_te = _linhas(X, train_idx), _linhas(X, test_idx)
+    y_tr, y_te = y[train_idx], y[test_idx]
+
+    with threadpool_limits(limits=threads_per_job):
+        start, cpu = time.perf_counter(), time.process_time()
+        model.fit(X_tr, y_tr)
+        fit_time, fit_cpu_time = time.perf_counter() - start, time.process_time() - cpu
+
+        start, cpu = time.perf_counter(), time.process_time()
+        y_pred, y_proba = prever_com_limiar(model, X_te, threshold)
+        predict_time, predict_cpu_time = time.perf_counter() - start, time.process_time() - cpu
+
+    return {
+        'y_true': y_te,
+        'y_pred': y_pred,
+        'y_proba': y_proba,
+        'importances': _importancias(model),
+        'metrics': _metricas_fold(y_te, y_pred),
+        'fit_time': fit_time,
+        'fit_cpu_time': fit_cpu_time,
+        'predict_time': predict_time,
+        'predict_cpu_time': predict_cpu_time,
+        'n_train': len(train_idx),
+        'n_test': len(test_idx),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def atribuir_folds(y, n_splits=5, random_state=42):
+    """
+    Retorna um array com o índice do fold de teste de cada linha,
+    seguindo o mesmo StratifiedKFold usado na validação cruzada original.
+    """
+    skf = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    folds = np.empty(len(y), dtype=np.int8)
+    for fold, (_, test_idx) in enumerate(skf.split(np.zeros(len(y)), y)):
+        folds[test_idx] = fold
+    return folds
+
+
+def executar_validacao_cruzada(models, X, y, n_splits=5, n_workers=1,
+                               threads_per_job=None, random_state=42, temp_folder=None,
+                               threshold=None):
+    """
+    Executa a validação cruzada de todos os modelos distribuindo os jobs
+    (modelo, fold) em um pool de processos.
+
+    X e y são abertos como memmap pelos workers: se já forem memmaps de arquivos .npy
+    (ver carregar_matriz_treino) os próprios arquivos são usados, senão são gravados
+    uma única vez em uma pasta temporária.
+    threads_per_job limita as threads de BLAS/OpenMP (XGBoost, LightGBM) de cada job;
+    o padrão divide os núcleos entre os workers para evitar oversubscription.
+    Cada fold executa a inferência uma única vez; threshold=None reproduz predict().
+
+    Retorna um dicionário {nome: resultado}, onde resultado contém y_true, y_pred e
+    y_proba concatenados na ordem dos folds, as importâncias do último fold (como o
+    modelo ajustado por último no loop serial), as métricas de cada fold e, por fold,
+    os tempos de parede e de CPU do fit/predict, as linhas de treino e teste e o pico
+    de RSS do processo que executou o job.
+    """
+    if threads_per_job is None and n_workers > 1:
+        threads_per_job = max(1, (os.cpu_count() or 1) // n_workers)
+
+    folder = tempfile.mkdtemp(prefix='cv_engine_', dir=temp_folder)
+    try:
+        paths = {
+            'X': _caminho_memmap(folder, 'X', X if isinstance(X, np.memmap)
+                                 else np.asfortranarray(X, dtype=np.float32)),
+            'y': _caminho_memmap(folder, 'y', y if isinstance(y, np.memmap) else np.asarray(y)),
+            'folds': _salvar_memmap(folder, 'folds', atribuir_folds(y, n_splits, random_state)),
+        }
+        jobs = [(name, fold) for name in models for fold in range(n_splits)]
+
+        with parallel_config(backend='loky', inner_max_num_threads=threads_per_job):
+            outputs = Parallel(n_jobs=n_workers)(
+                delayed(_executar_job)(clone(models[name]), fold, paths, threads_per_job, threshold)
+                for name, fold in jobs
+            )
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    results = {}
+    for name in models:
+        folds = [out for (job_name, _), out in zip(jobs, outputs) if job_name == name]
+        y_true = ArrayAccumulator(np.int8, len(y))
+        y_pred = ArrayAccumulator(np.int8, len(y))
+        # float64 como o predict_proba do loop serial: AUC/AP (e seus empates) não mudam
+        y_proba = ArrayAccumulator(np.float64, len(y))
+        for f in folds:
+            y_true.extend(f['y_true'])
+            y_pred.extend(f['y_pred'])
+            if f['y_proba'] is not None:
+                y_proba.extend(f['y_proba'])
+        results[name] = {
+            'y_true': y_true.to_numpy(),
+            'y_pred': y_pred.to_numpy(),
+            'y_proba': y_proba.to_numpy(),
+            'importances': folds[-1]['importances'],
+            'metrics': [f['metrics'] for f in folds],
+            'timings': [{k: f[k] for k in ('fit_time', 'fit_cpu_time', 'predict_time', 'predict_cpu_time',
+                                           'n_train', 'n_test', 'peak_rss_mb')}
+                        for f in folds],
+        }
+    return results
@@ -0,0 +1,323 @@
+import hashlib
+import json
+import math
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import warnings
+
+import click
+import numpy as np
+from joblib import Parallel, delayed, parallel_config
+from sklearn.metrics import average_precision_score
+from threadpoolctl import threadpool_limits
+warnings.filterwarnings("ignore")
+
+from src.models.cv_engine import _caminho_memmap, _linhas, _salvar_memmap, atribuir_folds
+
+project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+search_db_path = os.path.join(project_dir, 'models', 'hyperparameter_search.sqlite')
+
+# Espaços de busca: (tipo, mínimo, máximo); 'log' amostra uniformemente em escala logarítmica
+ESPACOS_BUSCA = {
+    'XGBoost': {
+        'learning_rate': ('log', 0.01, 0.3),
+        'max_depth': ('int', 3, 10),
+        'min_child_weight': ('log', 0.5, 20.0),
+        'subsample': ('float', 0.5, 1.0),
+        'colsample_bytree': ('float', 0.5, 1.0),
+        'reg_lambda': ('log', 1e-3, 10.0),
+    },
+    'LightGBM': {
+        'learning_rate': ('log', 0.01, 0.3),
+        'num_leaves': ('int', 15, 255),
+        'min_child_samples': ('int', 5, 100),
+        'subsample': ('float', 0.5, 1.0),
+        'colsample_bytree': ('float', 0.5, 1.0),
+        'reg_lambda': ('log', 1e-3, 10.0),
+    },
+}
+MAX_ROUNDS = 1000
+EARLY_STOPPING_ROUNDS = 50
+# Fração das linhas reservada à busca; a validação cruzada do train compara os modelos no restante
+FRACAO_BUSCA = 0.2
+
+
+def separar_linhas_busca(y, fraction=FRACAO_BUSCA, random_state=42):
+    """
+    Divide as linhas, de forma estratificada, entre a busca (cerca de `fraction`,
+    arredondada para 1/k) e a comparação da validação cruzada do train (o restante).
+    Os hiperparâmetros são escolhidos sem ver as linhas em que os modelos ajustados
+    são comparados aos demais, então a comparação não favorece os candidatos ajustados.
+    Retorna (índices da busca, índices da comparação).
+    """
+    n_splits = max(2, int(round(1 / fraction)))
+    # Semente diferente da dos folds da validação cruzada e dos folds internos da busca
+    folds = atribuir_folds(y, n_splits, random_state + 1)
+    return np.flatnonzero(folds == 0), np.flatnonzero(folds != 0)
+
+
+def amostrar_configuracoes(space, n_configs, random_state=42):
+    """
+    Sorteia n_configs configurações do espaço de busca. A mesma semente gera as
+    mesmas configurações, o que permite retomar uma busca interrompida.
+    """
+    rng = np.random.default_rng(random_state)
+    configs = []
+    for _ in range(n_configs):
+        config = {}
+        for name, (kind, low, high) in space.items():
+            if kind == 'int':
+                config[name] = int(rng.integers(low, high + 1))
+            elif kind == 'log':
+                config[name] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+            else:
+                config[name] = float(rng.uniform(low, high))
+        configs.append(config)
+    return configs
+
+
+def construir_estimador(name, params, scale_pos_weight, n_estimators=100, early_stopping=False, n_jobs=None):
+    """
+    Instancia o candidato `name` (XGBoost ou LightGBM) com os hiperparâmetros dados,
+    mantendo os mesmos ajustes de desbalanceamento, semente e colunas categóricas do train_model.
+    """
+    from src.features import FeaturePipeline
+
+    if name == 'XGBoost':
+        from xgboost import XGBClassifier
+        return XGBClassifier(
+            scale_pos_weight=scale_pos_weight, eval_metric='aucpr' if early_stopping else 'logloss',
+            early_stopping_rounds=EARLY_STOPPING_ROUNDS if early_stopping else None,
+            n_estimators=n_estimators, random_state=42, n_jobs=n_jobs,
+            enable_categorical=True, feature_types=FeaturePipeline.feature_types(), **params
+        )
+    if name == 'LightGBM':
+        from lightgbm import LGBMClassifier
+        # subsample só tem efeito no LightGBM com subsample_freq > 0
+        return LGBMClassifier(
+            class_weight='balanced', n_estimators=n_estimators, subsample_freq=1,
+            metric='average_precision' if early_stopping else None,
+            random_state=42, n_jobs=n_jobs, verbose=-1,
+            categorical_column=FeaturePipeline.categorical_indices(), **params
+        )
+    raise ValueError(f"Modelo sem espaço de busca: {name}")
+
+
+def _indices_trial(folds, y, fold, n_splits, fraction, rung, random_state):
+    """
+    Divide as linhas para um trial: teste = fold, validação (early stopping) = fold
+    seguinte e treino = demais folds, subamostrado de forma estratificada por
+    `fraction`. A subamostra depende só do rung e do fold, então todas as
+    configurações de um rung veem as mesmas linhas.
+    """
+    valid_fold = (fold + 1) % n_splits
+    test_idx = np.flatnonzero(folds == fold)
+    valid_idx = np.flatnonzero(folds == valid_fold)
+    train_idx = np.flatnonzero((folds != fold) & (folds != valid_fold))
+
+    if fraction < 1:
+        rng = np.random.default_rng([random_state, rung, fold])
+        y_train = y[train_idx]
+        train_idx = np.sort(np.concatenate([
+            rng.choice(idx, max(1, int(round(len(idx) * fraction))), replace=False)
+            for idx in (train_idx[y_train == 0], train_idx[y_train == 1])
+        ]))
+    return test_idx, valid_idx, train_idx
+
+
+def _executar_trial(name, config, fold, fraction, rung, paths, n_splits, scale_pos_weight,
+                    threads_per_job, random_state):
+    """
+    Treina uma configuração em um fold com early stopping por PR-AUC na validação
+    e retorna a PR-AUC (average precision) no fold de teste.
+    """
+    X = np.load(paths['X'], mmap_mode='r')
+    y = np.load(paths['y'], mmap_mode='r')
+    folds = np.load(paths['folds'], mmap_mode='r')
+    test_idx, valid_idx, train_idx = _indices_trial(folds, y, fold, n_splits, fraction, rung, random_state)
+    X_tr, y_tr = _linhas(X, train_idx), y[train_idx]
+    X_va, y_va = _linhas(X, valid_idx), y[valid_idx]
+    X_te, y_te = _linhas(X, test_idx), y[test_idx]
+
+    model = construir_estimador(name, config, scale_pos_weight, n_estimators=MAX_ROUNDS,
+                                early_stopping=True, n_jobs=threads_per_job)
+    with threadpool_limits(limits=threads_per_job):
+        start = time.perf_counter()
+        if name == 'LightGBM':
+            from lightgbm import early_stopping
+            model.fit(X_tr, y_tr, eval_set=[(X_va, y_va)],
+                      callbacks=[early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)])
+            best_iteration = model.best_iteration_
+        else:
+            model.fit(X_tr, y_tr, eval_set=[(X_va, y_va)], verbose=False)
+            best_iteration = model.best_iteration + 1
+        fit_time = time.perf_counter() - start
+        score = average_precision_score(y_te, model.predict_proba(X_te)[:, 1])
+
+    return {'score': float(score), 'best_iteration': int(best_iteration), 'fit_time': fit_time}
+
+
+class TrialStore:
+    """
+    Checkpoint dos trials em SQLite. Cada (busca, modelo, configuração, rung, fold)
+    é gravado assim que termina; ao retomar, trials já gravados não são refeitos.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS trials (
+                search_id TEXT, model TEXT, config_id INTEGER, rung INTEGER, fold INTEGER,
+                params TEXT, fraction REAL, score REAL, best_iteration INTEGER, fit_time REAL,
+                PRIMARY KEY (search_id, model, config_id, rung, fold)
+            )
+        """)
+        self._conn.commit()
+
+    def carregar(self, search_id, model):
+        rows = self._conn.execute(
+            "SELECT config_id, rung, fold, score, best_iteration, fit_time FROM trials "
+            "WHERE search_id = ? AND model = ?", (search_id, model)
+        )
+        return {(c, r, f): {'score': s, 'best_iteration': b, 'fit_time': t} for c, r, f, s, b, t in rows}
+
+    def salvar(self, search_id, model, config_id, rung, fold, params, fraction, result):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO trials VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (search_id, model, config_id, rung, fold, json.dumps(params), fraction,
+             result['score'], result['best_iteration'], result['fit_time'])
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def _id_busca(name, configs, fractions, n_eval_folds, n_splits, random_state, X, y):
+    """
+    Identifica a busca pelo seu espaço/orçamento e pelo hash completo dos dados:
+    buscas com a mesma definição sobre os mesmos dados compartilham checkpoints.
+    """
+    from src.models.model_bundle import hash_dados
+
+    digest = hashlib.sha256(json.dumps(
+        [name, configs, fractions, n_eval_folds, n_splits, random_state]
+    ).encode())
+    digest.update(hash_dados(X, y).encode())
+    return digest.hexdigest()[:16]
+
+
+def executar_busca(name, X, y, n_configs=27, eta=3, min_fraction=1 / 9, n_eval_folds=3,
+                   n_splits=5, n_workers=1, threads_per_job=None, db_path=search_db_path,
+                   random_state=42, temp_folder=None):
+    """
+    Successive halving para o candidato `name`. O orçamento de cada rung é a fração
+    das linhas de treino (de min_fraction até 1, multiplicando por eta) e o número
+    de folds avaliados: um fold nos rungs intermediários e n_eval_folds no último.
+    A cada rung, só as melhores 1/eta configurações (por PR-AUC média) seguem.
+    Os trials de um rung rodam em paralelo em n_workers processos.
+
+    X e y devem ser só as linhas da busca (separar_linhas_busca), para que a
+    comparação entre modelos do train seja feita em linhas que a busca não viu.
+
+    Retorna um dicionário com os hiperparâmetros escolhidos, o n_estimators
+    (média das melhores iterações do último rung), a PR-AUC e o histórico por rung.
+    """
+    n_rungs = max(1, int(round(math.log(1 / min_fraction, eta))) + 1)
+    fractions = [min(1.0, eta ** (r - n_rungs + 1)) for r in range(n_rungs)]
+    configs = amostrar_configuracoes(ESPACOS_BUSCA[name], n_configs, random_state)
+    search_id = _id_busca(name, configs, fractions, n_eval_folds, n_splits, random_state, X, y)
+    scale_pos_weight = float((np.asarray(y) == 0).sum() / max((np.asarray(y) == 1).sum(), 1))
+
+    if threads_per_job is None and n_workers > 1:
+        threads_per_job = max(1, (os.cpu_count() or 1) // n_workers)
+
+    store = TrialStore(db_path)
+    done = store.carregar(search_id, name)
+    folder = tempfile.mkdtemp(prefix='hp_search_', dir=temp_folder)
+    try:
+        paths = {
+            'X': _caminho_memmap(folder, 'X', X if isinstance(X, np.memmap)
+                                 else np.asfortranarray(X, dtype=np.float32)),
+            'y': _caminho_memmap(folder, 'y', y if isinstance(y, np.memmap) else np.asarray(y)),
+            'folds': _salvar_memmap(folder, 'folds', atribuir_folds(y, n_splits, random_state)),
+        }
+        alive = list(range(n_configs))
+        history = []
+        for rung, fraction in enumerate(fractions):
+            last = rung == n_rungs - 1
+            eval_folds = range(n_eval_folds if last else 1)
+            jobs = [(c, f) for c in alive for f in eval_folds if (c, rung, f) not in done]
+            print(f"[{name}] rung {rung}: {len(alive)} configuração(ões), {fraction:.0%} das linhas de treino, "
+                  f"{len(eval_folds)} fold(s) ({len(jobs)} trial(s) a executar)")
+
+            with parallel_config(backend='loky', inner_max_num_threads=threads_per_job):
+                outputs = Parallel(n_jobs=n_workers, return_as='generator')(
+                    delayed(_executar_trial)(name, configs[c], f, fraction, rung, paths, n_splits,
+                                             scale_pos_weight, threads_per_job, random_state)
+                    for c, f in jobs
+                )
+                for (c, f), result in zip(jobs, outputs):
+                    store.salvar(search_id, name, c, rung, f, configs[c], fraction, result)
+                    done[(c, rung, f)] = result
+
+            scores = {c: float(np.mean([done[(c, rung, f)]['score'] for f in eval_folds])) for c in alive}
+            history.append({'rung': rung, 'fraction': fraction, 'scores': scores})
+            if not last:
+                keep = max(1, math.ceil(len(alive) / eta))
+                alive = sorted(alive, key=lambda c: scores[c], reverse=True)[:keep]
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+        store.close()
+
+    final_scores = history[-1]['scores']
+    best = max(final_scores, key=final_scores.get)
+    best_iterations = [done[(best, n_rungs - 1, f)]['best_iteration'] for f in range(n_eval_folds)]
+    return {
+        'model': name,
+        'search_id': search_id,
+        'params': configs[best],
+        'n_estimators': int(np.mean(best_iterations)),
+        'pr_auc': final_scores[best],
+        'n_trials': len(done),
+        'fit_seconds': sum(r['fit_time'] for r in done.values()),
+        'history': history,
+    }
+
+
+@click.command()
+@click.option('--models', 'model_names', default = 'XGBoost,LightGBM', help = 'Candidatos separados por vírgula')
+@click.option('--configs', default = 27, type = int, help = 'Configurações sorteadas no primeiro rung')
+@click.option('--eta', default = 3, type = int, help = 'Fator de redução do successive halving')
+@click.option('--min-fraction', default = 1 / 9, type = float, help = 'Fração das linhas de treino no primeiro rung')
+@click.option('--eval-folds', default = 3, type = int, help = 'Folds avaliados no último rung')
+@click.option('--workers', default = 1, type = int, help = 'Trials executados em paralelo')
+@click.option('--db', 'db_path', default = search_db_path, help = 'Arquivo SQLite de checkpoint dos trials')
+@click.option('--search-fraction', default = FRACAO_BUSCA, type = float, help = 'Fração das linhas reservada à busca (a mesma do TRAIN_SEARCH_FRACTION)')
+def main(model_names, configs, eta, min_fraction, eval_folds, workers, db_path, search_fraction):
+    """ Runs a resumable successive-halving search over the XGBoost/LightGBM candidates. """
+    from src.features import FeaturePipeline
+    from src.models.cv_engine import carregar_matriz_treino
+
+    data_path = os.path.join(project_dir, 'data', 'processed', 'fraud_features.arrow')
+    X, y = carregar_matriz_treino(data_path, list(FeaturePipeline.output_columns), 'isFraud',
+                                  cache_dir=os.path.dirname(data_path))
+    # Mesmas linhas de busca do train, então os checkpoints são compartilhados
+    search_idx, _ = separar_linhas_busca(y, search_fraction)
+    X, y = X[search_idx], y[search_idx]
+    for name in model_names.split(','):
+        start = time.perf_counter()
+        result = executar_busca(name.strip(), X, y, n_configs=configs, eta=eta, min_fraction=min_fraction,
+                                n_eval_folds=eval_folds, n_workers=workers, db_path=db_path)
+        print(f"[{result['model']}] PR-AUC {result['pr_auc']:.4f} com n_estimators={result['n_estimators']} "
+              f"e {result['params']} ({result['n_trials']} trials, {result['fit_seconds']:.1f}s de fit, "
+              f"{time.perf_counter() - start:.1f}s de parede)")
+
+
+if __name__ == '__main__':
+    main()
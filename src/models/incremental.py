@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+
+import click
+import numpy as np
+
+from src.data.loader import caminho_dados_brutos, carregar_transacoes
+from src.features import FeaturePipeline, matriz_features
+from src.features.entity_features import JANELA_STEPS
+from src.utils import etapa, rastrear
+
+project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+# Maior step representável na coluna 'step' (int16): limite aberto do intervalo de leitura
+ULTIMO_STEP = int(np.iinfo(np.int16).max)
+# Ajustes das árvores acrescentadas: com poucos positivos e scale_pos_weight alto os hessianos
+# são minúsculos e, sem limite, cada folha nova desloca a margem em dezenas de unidades
+PARAMS_CONTINUACAO = {'max_delta_step': 1, 'learning_rate': 0.05}
+
+
+def carregar_novos_steps(path, watermark, target='isFraud', encoder=None):
+    """
+    Carrega as transações com step > watermark já transformadas pelo FeaturePipeline.
+    As `JANELA_STEPS` horas anteriores ao watermark também são lidas, só para
+    aquecer o estado das features por conta, e descartadas depois da transformação;
+    assim as features das linhas novas são as mesmas que o lote completo geraria.
+    Com o `encoder` do bundle as contas mantêm os IDs do treino, e as contas novas
+    são acrescentadas a ele (sem compactação) para irem ao bundle atualizado.
+    """
+    pipeline = FeaturePipeline(target=target, encoder=encoder, max_accounts=None)
+    df = carregar_transacoes(path, columns=[*pipeline.input_columns, target],
+                             steps=(max(watermark + 1 - JANELA_STEPS, 0), ULTIMO_STEP))
+    features = pipeline.transform(df)
+    return features[features['step'].to_numpy() > watermark].reset_index(drop=True)
+
+
+def _pr_auc(y, proba):
+    from sklearn.metrics import average_precision_score
+
+    return float(average_precision_score(y, proba)) if y.any() else None
+
+
+def continuar_xgboost(model, X, y, X_valid=None, y_valid=None, rounds=50, early_stopping_rounds=10,
+                      scale_pos_weight=None, params=None, learning_rate=None):
+    """
+    Continua o boosting de um XGBClassifier já treinado (xgb_model=) com `rounds`
+    árvores novas ajustadas só em X/y, com max_delta_step e taxa de aprendizado
+    reduzida (PARAMS_CONTINUACAO) para que poucas árvores não desfaçam o modelo.
+    Com um conjunto de validação, para quando a PR-AUC não melhora por
+    `early_stopping_rounds` rodadas e mantém só as árvores até a melhor rodada.
+    Retorna um XGBClassifier novo e quantas árvores foram acrescentadas.
+    """
+    import xgboost as xgb
+    from src.models.out_of_core import XGB_PARAMS
+
+    feature_names = list(FeaturePipeline.output_columns)
+    feature_types = FeaturePipeline.feature_types()
+    booster = model.get_booster()
+    train_params = {**XGB_PARAMS, **(params or {}), **PARAMS_CONTINUACAO, 'eval_metric': 'aucpr'}
+    if learning_rate is not None:
+        train_params['learning_rate'] = learning_rate
+    if scale_pos_weight is not None:
+        train_params['scale_pos_weight'] = scale_pos_weight
+
+    def matriz(X_, y_):
+        return xgb.DMatrix(X_, label=y_, feature_names=feature_names, feature_types=feature_types,
+                           enable_categorical=True)
+
+    dtrain = matriz(X, y)
+    evals, early = [], None
+    # Sem positivos na validação a PR-AUC não é definida: as rodadas são todas usadas
+    if X_valid is not None and len(y_valid) and y_valid.any():
+        evals, early = [(matriz(X_valid, y_valid), 'valid')], early_stopping_rounds
+    n_before = booster.num_boosted_rounds()
+    updated = xgb.train(train_params, dtrain, num_boost_round=rounds, xgb_model=booster,
+                        evals=evals, early_stopping_rounds=early, verbose_eval=False)
+    if early is not None:
+        updated = updated[:updated.best_iteration + 1]
+
+    new_model = xgb.XGBClassifier(enable_categorical=True)
+    new_model.load_model(updated.save_raw(raw_format='ubj'))
+    return new_model, updated.num_boosted_rounds() - n_before
+
+
+def retreinar_incremental(model_path, data_path, since_step=None, valid_steps=24, early_stopping_steps=24,
+                          rounds=50, early_stopping_rounds=10, learning_rate=None, tolerance=0.01, force=False):
+    """
+    Retreino incremental do modelo final a partir do watermark (último step
+    treinado, gravado no manifesto do bundle):
+      1. lê as transações com step > watermark;
+      2. separa os últimos `valid_steps` steps como janela de validação recente e
+         os `early_stopping_steps` anteriores a ela como janela de early stopping;
+      3. continua o boosting só nos steps anteriores às duas janelas;
+      4. compara a PR-AUC do modelo atual e do atualizado na janela de validação,
+         que o boosting não viu, e só aceita o novo modelo se ele não piorar mais
+         que `tolerance` (ou com force=True).
+    O watermark avança até o último step treinado; as duas janelas entram no
+    treino das próximas execuções. Retorna (modelo, manifesto) ou None quando
+    não há steps novos suficientes ou o modelo foi rejeitado.
+    """
+    from src.models.model_bundle import carregar_bundle, hash_dados, salvar_bundle
+    from src.models.train_model import tipos_com_fraude
+
+    bundle = carregar_bundle(model_path)
+    metadata = dict(bundle.manifest.get('metadata') or {})
+    watermark = since_step if since_step is not None else metadata.get('last_step')
+    if watermark is None:
+        raise click.UsageError('O manifesto do modelo não tem watermark (last_step); informe --since-step.')
+
+    with etapa('retrain.load') as span:
+        encoder = bundle.encoder()
+        features = carregar_novos_steps(data_path, watermark, encoder=encoder)
+        span.rows = len(features)
+    if features.empty:
+        print(f'Nenhuma transação depois do step {watermark}: nada a retreinar.')
+        return None
+
+    step = features['step'].to_numpy()
+    last = int(step.max())
+    valid_start = last - valid_steps + 1
+    es_start = valid_start - early_stopping_steps
+    train_mask = step < es_start
+    es_mask = (step >= es_start) & (step < valid_start)
+    valid_mask = step >= valid_start
+    if not train_mask.any():
+        print(f'Steps novos ({watermark + 1}-{last}) cabem nas janelas de early stopping e validação '
+              f'({early_stopping_steps} + {valid_steps} steps): nada a retreinar.')
+        return None
+
+    columns = list(FeaturePipeline.output_columns)
+    X = matriz_features(features, columns)
+    y = features['isFraud'].to_numpy(dtype=np.int8)
+    X_train, y_train = X[train_mask], y[train_mask]
+    X_es, y_es = X[es_mask], y[es_mask]
+    X_valid, y_valid = X[valid_mask], y[valid_mask]
+    new_watermark = int(step[train_mask].max())
+    print(f'Watermark {watermark}: {len(y_train)} linhas novas para treino (steps {watermark + 1}-{new_watermark}), '
+          f'{len(y_es)} no early stopping (steps {es_start}-{valid_start - 1}) e '
+          f'{len(y_valid)} na validação (steps {valid_start}-{last})')
+
+    tuned = metadata.get('hyperparameter_search')
+    with etapa('retrain.fit', rows=len(y_train)):
+        start = time.perf_counter()
+        new_model, added = continuar_xgboost(
+            bundle.model, X_train, y_train, X_es, y_es, rounds=rounds,
+            early_stopping_rounds=early_stopping_rounds, learning_rate=learning_rate,
+            scale_pos_weight=metadata.get('scale_pos_weight'), params=tuned['params'] if tuned else None
+        )
+        fit_time = time.perf_counter() - start
+    print(f'{added} árvores acrescentadas em {fit_time:.2f}s')
+
+    with etapa('retrain.validate', rows=len(y_valid)):
+        before = _pr_auc(y_valid, bundle.model.predict_proba(X_valid)[:, 1]) if len(y_valid) else None
+        after = _pr_auc(y_valid, new_model.predict_proba(X_valid)[:, 1]) if len(y_valid) else None
+    if before is None or after is None:
+        print('Janela de validação sem fraudes: PR-AUC indefinida, modelo aceito sem comparação.')
+    else:
+        print(f'PR-AUC na janela de validação: atual {before:.4f} | atualizado {after:.4f}')
+        if after < before - tolerance and not force:
+            print(f'Modelo atualizado rejeitado (piora acima de {tolerance}); o bundle não foi alterado.')
+            return None
+
+    history = list(metadata.get('incremental_history', []))
+    history.append({
+        'from_step': int(watermark) + 1, 'to_step': new_watermark, 'n_samples': int(len(y_train)),
+        'n_positives': int(y_train.sum()), 'trees_added': int(added), 'fit_time': fit_time,
+        'early_stopping_steps': [es_start, valid_start - 1], 'valid_steps': [valid_start, last],
+        'valid_pr_auc_before': before, 'valid_pr_auc_after': after,
+        'previous_data_hash': bundle.manifest.get('data_hash'),
+    })
+    fraud_types = sorted(set(metadata.get('fraud_types') or []) | set(tipos_com_fraude(X_train, y_train)))
+    with etapa('retrain.save'):
+        manifest = salvar_bundle(
+            new_model, model_path, threshold=bundle.threshold, data_hash=hash_dados(X_train, y_train), encoder=encoder,
+            metadata={
+                **metadata,
+                'training_mode': 'incremental',
+                'last_step': new_watermark,
+                'fraud_types': fraud_types,
+                'feature_importances': dict(zip(columns, map(float, new_model.feature_importances_))),
+                'incremental_history': history,
+            }
+        )
+    return new_model, manifest
+
+
+@click.command()
+@click.option('--model', 'model_path', default = None, type = click.Path(exists=True), help = 'Bundle do modelo (padrão: models/xgboost_fraud_model)')
+@click.option('--data', 'data_path', default = None, type = click.Path(exists=True), help = 'Dataset bruto (padrão: parquet da ingestão ou CSV)')
+@click.option('--since-step', default = None, type = int, help = 'Watermark explícito; padrão usa o last_step do manifesto')
+@click.option('--valid-steps', default = 24, type = int, help = 'Steps mais recentes usados como janela de validação')
+@click.option('--early-stopping-steps', default = 24, type = int, help = 'Steps anteriores à validação usados no early stopping')
+@click.option('--rounds', default = 50, type = int, help = 'Máximo de árvores acrescentadas')
+@click.option('--early-stopping', default = 10, type = int, help = 'Rodadas sem melhora da PR-AUC antes de parar')
+@click.option('--learning-rate', default = None, type = float, help = f"Taxa de aprendizado das árvores acrescentadas (padrão {PARAMS_CONTINUACAO['learning_rate']})")
+@click.option('--tolerance', default = 0.01, type = float, help = 'Piora de PR-AUC tolerada na validação')
+@click.option('--force', is_flag = True, help = 'Salva o modelo mesmo que piore na validação')
+def main(model_path, data_path, since_step, valid_steps, early_stopping_steps, rounds, early_stopping,
+         learning_rate, tolerance, force):
+    """ Continues boosting the saved model on transaction steps newer than its watermark. """
+    import joblib
+    from src.models.model_bundle import bundle_path
+    from src.models.train_model import model_path as joblib_path
+
+    model_path = model_path or bundle_path
+    data_path = data_path or caminho_dados_brutos(project_dir)
+    with rastrear('retrain'):
+        result = retreinar_incremental(model_path, data_path, since_step, valid_steps, early_stopping_steps,
+                                       rounds, early_stopping, learning_rate, tolerance, force)
+    if result is not None:
+        model, manifest = result
+        if model_path == bundle_path:
+            # Mantém o .joblib legado em sincronia com o bundle padrão
+            joblib.dump(model, joblib_path)
+        print(f"Bundle atualizado em {model_path} (watermark {manifest['metadata']['last_step']}).")
+
+
+if __name__ == '__main__':
+    main()
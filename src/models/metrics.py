@@ -0,0 +1,138 @@
+import numpy as np
+
+
+class StreamingMetrics:
+    """
+    Métricas de classificação binária calculadas chunk a chunk, sem guardar
+    os rótulos e probabilidades de todas as linhas.
+
+    A matriz de confusão é atualizada a cada chunk a partir de y_pred. As curvas
+    ROC e Precision-Recall são derivadas de contagens de positivos/negativos por
+    score:
+      - modo 'hist' (padrão): histograma com n_bins faixas fixas em [0, 1].
+        Memória O(n_bins); scores dentro da mesma faixa são tratados como empates,
+        o que mantém AUC-ROC e AP dentro de ~1e-3 das do sklearn com 10 000 faixas.
+      - modo 'exact': contagens por valor distinto de score. Reproduz roc_curve,
+        precision_recall_curve, auc e average_precision_score do sklearn com
+        tolerância de 1e-9 (aritmética de ponto flutuante), com memória
+        O(scores distintos).
+    """
+
+    def __init__(self, mode='hist', n_bins=10000):
+        if mode not in ('hist', 'exact'):
+            raise ValueError(f"Modo inválido: {mode}. Use 'hist' ou 'exact'.")
+        self.mode = mode
+        self.n_bins = n_bins
+        self.conf_matrix = np.zeros((2, 2), dtype=np.int64)
+
+        if mode == 'hist':
+            self._pos = np.zeros(n_bins, dtype=np.int64)
+            self._neg = np.zeros(n_bins, dtype=np.int64)
+        else:
+            self._scores = np.array([], dtype=np.float64)
+            self._pos = np.array([], dtype=np.int64)
+            self._neg = np.array([], dtype=np.int64)
+
+    def update(self, y_true, y_pred, y_proba=None):
+        """
+        Atualiza as contagens com um chunk de rótulos, previsões e probabilidades.
+        """
+        y_true = np.asarray(y_true).astype(bool, copy=False)
+        y_pred = np.asarray(y_pred).astype(bool, copy=False)
+        self.conf_matrix += np.bincount(
+            2 * y_true + y_pred, minlength=4
+        ).reshape(2, 2)
+
+        if y_proba is None:
+            return
+        y_proba = np.asarray(y_proba)
+
+        if self.mode == 'hist':
+            bins = np.clip((y_proba * self.n_bins).astype(np.int64), 0, self.n_bins - 1)
+            self._pos += np.bincount(bins[y_true], minlength=self.n_bins)
+            self._neg += np.bincount(bins[~y_true], minlength=self.n_bins)
+            return
+
+        # Funde as contagens do chunk com as acumuladas, mantendo os scores ordenados
+        scores, inverse = np.unique(
+            np.concatenate([self._scores, y_proba.astype(np.float64)]), return_inverse=True
+        )
+        n_old = len(self._scores)
+        pos = np.bincount(inverse[:n_old], weights=self._pos, minlength=len(scores))
+        neg = np.bincount(inverse[:n_old], weights=self._neg, minlength=len(scores))
+        pos += np.bincount(inverse[n_old:][y_true], minlength=len(scores))
+        neg += np.bincount(inverse[n_old:][~y_true], minlength=len(scores))
+        self._scores = scores
+        self._pos = pos.astype(np.int64)
+        self._neg = neg.astype(np.int64)
+
+    def _curva_binaria(self):
+        """
+        Equivalente ao _binary_clf_curve do sklearn: fps, tps e thresholds em
+        ordem decrescente de score, apenas para scores observados.
+        """
+        if self.mode == 'hist':
+            thresholds = np.arange(self.n_bins, dtype=np.float64) / self.n_bins
+        else:
+            thresholds = self._scores
+        observed = (self._pos + self._neg) > 0
+        pos = self._pos[observed][::-1]
+        neg = self._neg[observed][::-1]
+        return np.cumsum(neg), np.cumsum(pos), thresholds[observed][::-1]
+
+    @property
+    def n_samples(self):
+        return int(self.conf_matrix.sum())
+
+    def precision_recall_f1(self, average='macro'):
+        """
+        Precision, recall e F1 (macro ou weighted) calculados da matriz de confusão,
+        com zero_division=0 como nas chamadas originais do sklearn.
+        """
+        cm = self.conf_matrix.astype(np.float64)
+        tp = np.diag(cm)
+        predicted = cm.sum(axis=0)
+        support = cm.sum(axis=1)
+        precision = np.divide(tp, predicted, out=np.zeros(2), where=predicted > 0)
+        recall = np.divide(tp, support, out=np.zeros(2), where=support > 0)
+        denom = precision + recall
+        f1 = np.divide(2 * precision * recall, denom, out=np.zeros(2), where=denom > 0)
+
+        if average == 'macro':
+            weights = np.full(2, 0.5)
+        elif average == 'weighted':
+            weights = support / support.sum()
+        else:
+            raise ValueError(f"average inválido: {average}")
+        return float(precision @ weights), float(recall @ weights), float(f1 @ weights)
+
+    def roc_curve(self):
+        """
+        Retorna fpr, tpr e thresholds como sklearn.metrics.roc_curve.
+        """
+        fps, tps, thresholds = self._curva_binaria()
+        if len(fps) > 2:
+            optimal = np.where(np.r_[True, np.logical_or(np.diff(fps, 2), np.diff(tps, 2)), True])[0]
+            fps, tps, thresholds = fps[optimal], tps[optimal], thresholds[optimal]
+        fps = np.r_[0, fps]
+        tps = np.r_[0, tps]
+        thresholds = np.r_[np.inf, thresholds]
+        return fps / fps[-1], tps / tps[-1], thresholds
+
+    def roc_auc(self):
+        fpr, tpr, _ = self.roc_curve()
+        return float(np.trapezoid(tpr, fpr))
+
+    def precision_recall_curve(self):
+        """
+        Retorna precision, recall e thresholds como sklearn.metrics.precision_recall_curve.
+        """
+        fps, tps, thresholds = self._curva_binaria()
+        ps = tps + fps
+        precision = np.divide(tps, ps, out=np.zeros(len(tps)), where=ps != 0)
+        recall = tps / tps[-1] if tps[-1] > 0 else np.ones(len(tps))
+        return np.r_[precision[::-1], 1], np.r_[recall[::-1], 0], thresholds[::-1]
+
+    def average_precision(self):
+        precision, recall, _ = self.precision_recall_curve()
+        return float(-np.sum(np.diff(recall) * precision[:-1]))
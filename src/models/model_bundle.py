@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import click
+import numpy as np
+
+from src.data.loader import TIPOS_TRANSACAO
+from src.features import FeaturePipeline
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+BOOSTER_NAME = 'model.ubj'
+COMPILED_NAME = 'compiled.npz'
+ACCOUNTS_NAME = 'accounts.arrow'
+
+project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+bundle_path = os.path.join(project_dir, 'models', 'xgboost_fraud_model')
+
+
+def _sha256_arquivo(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_dados(X, y):
+    """
+    Hash SHA-256 da matriz de treino e do alvo (shape, dtype e conteúdo).
+    Percorre X coluna a coluna, sem copiar matrizes em ordem Fortran (memmap do treino).
+    """
+    X = np.asarray(X)
+    y = np.asarray(y)
+    digest = hashlib.sha256()
+    digest.update(f'{X.shape}|{X.dtype.str}|{y.shape}|{y.dtype.str}'.encode())
+    for j in range(X.shape[1]):
+        digest.update(np.ascontiguousarray(X[:, j]).data)
+    digest.update(np.ascontiguousarray(y).data)
+    return digest.hexdigest()
+
+
+def salvar_bundle(model, path=bundle_path, threshold=None, data_hash=None, metadata=None, compiled=True,
+                  encoder=None):
+    """
+    Salva o modelo como bundle versionado em um diretório:
+      - model.ubj: booster nativo do XGBoost (sem pickle);
+      - compiled.npz: árvores achatadas para o CompiledTreePredictor (opcional);
+      - accounts.arrow: dicionário de contas do AccountEncoder do treino (opcional),
+        para que a pontuação atribua às contas os mesmos IDs;
+      - manifest.json: schema de features, versão do FeaturePipeline, limiar,
+        hash dos dados de treino, checksums dos arquivos e metadados pré-calculados.
+    O manifesto é gravado por último, então um bundle incompleto nunca é carregado.
+    """
+    import xgboost
+
+    os.makedirs(path, exist_ok=True)
+    booster = model.get_booster()
+    feature_names = list(booster.feature_names or FeaturePipeline.output_columns)
+
+    files = {}
+    model.save_model(os.path.join(path, BOOSTER_NAME))
+    files[BOOSTER_NAME] = _sha256_arquivo(os.path.join(path, BOOSTER_NAME))
+    if compiled:
+        from src.models.compiled_predictor import salvar_modelo_compilado
+        salvar_modelo_compilado(booster, os.path.join(path, COMPILED_NAME))
+        files[COMPILED_NAME] = _sha256_arquivo(os.path.join(path, COMPILED_NAME))
+    if encoder is not None:
+        encoder.salvar(os.path.join(path, ACCOUNTS_NAME))
+        files[ACCOUNTS_NAME] = _sha256_arquivo(os.path.join(path, ACCOUNTS_NAME))
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'model_class': type(model).__name__,
+        'xgboost_version': xgboost.__version__,
+        'features': {
+            'names': feature_names,
+            'dtype': 'float32',
+            'types': list(booster.feature_types or FeaturePipeline.feature_types()),
+            'categories': {'type': list(TIPOS_TRANSACAO)},
+            'pipeline_version': FeaturePipeline.version,
+        },
+        'classes': [int(c) for c in model.classes_],
+        'threshold': threshold,
+        'data_hash': data_hash,
+        'files': files,
+        'metadata': metadata or {},
+    }
+    tmp_path = os.path.join(path, MANIFEST_NAME + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(path, MANIFEST_NAME))
+    return manifest
+
+
+class ModelBundle:
+    """
+    Modelo carregado de um bundle: o XGBClassifier, o manifesto e o hash do manifesto.
+    Instâncias em cache são compartilhadas entre chamadores do mesmo processo.
+    """
+
+    def __init__(self, path, model, manifest, manifest_hash):
+        self.path = path
+        self.model = model
+        self.manifest = manifest
+        self.manifest_hash = manifest_hash
+
+    @property
+    def threshold(self):
+        return self.manifest['threshold']
+
+    @property
+    def feature_names(self):
+        return self.manifest['features']['names']
+
+    def encoder(self):
+        """
+        Novo AccountEncoder com o dicionário de contas do bundle, ou None se o
+        bundle não tem um. Cada chamada lê o arquivo: o encoder ganha contas
+        durante a pontuação e não pode ser compartilhado pelo cache.
+        """
+        if ACCOUNTS_NAME not in self.manifest['files']:
+            return None
+        from src.features import AccountEncoder
+        return AccountEncoder.carregar(os.path.join(self.path, ACCOUNTS_NAME))
+
+    def compiled_predictor(self, **kwargs):
+        """
+        Retorna o CompiledTreePredictor do bundle, ou None se não foi exportado.
+        """
+        if COMPILED_NAME not in self.manifest['files']:
+            return None
+        from src.models.compiled_predictor import CompiledTreePredictor
+        return CompiledTreePredictor.load(os.path.join(self.path, COMPILED_NAME), **kwargs)
+
+
+def _ler_manifesto(path):
+    manifest_path = os.path.join(path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"Manifesto do modelo não encontrado: {manifest_path}")
+    with open(manifest_path, 'rb') as f:
+        raw = f.read()
+    return json.loads(raw), hashlib.sha256(raw).hexdigest()
+
+
+def validar_manifesto(manifest, pipeline=None):
+    """
+    Confere o manifesto contra o formato suportado e as colunas/versão do FeaturePipeline.
+    """
+    pipeline = pipeline or FeaturePipeline()
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Versão de bundle não suportada: {manifest.get('format_version')}")
+
+    features = manifest['features']
+    if list(features['names']) != list(pipeline.output_columns):
+        raise ValueError(
+            f"Features do modelo {features['names']} não correspondem às colunas do "
+            f"FeaturePipeline {list(pipeline.output_columns)}."
+        )
+    if features['pipeline_version'] != pipeline.version:
+        raise ValueError(
+            f"Modelo treinado com o FeaturePipeline v{features['pipeline_version']}, "
+            f"mas a versão atual é v{pipeline.version}."
+        )
+
+
+class _CacheLRU:
+    """
+    Cache LRU de bundles carregados, indexado pelo hash do manifesto.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, key, carregar):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+            # O carregamento ocorre sob o lock: chamadas concorrentes não carregam o mesmo modelo duas vezes
+            value = carregar()
+            self._items[key] = value
+            if len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+            return value
+
+    def limpar(self):
+        with self._lock:
+            self._items.clear()
+
+
+_cache = _CacheLRU(maxsize=int(os.environ.get('MODEL_CACHE_SIZE', 4)))
+
+
+def _carregar_sem_cache(path, manifest, manifest_hash):
+    from xgboost import XGBClassifier
+
+    booster_path = os.path.join(path, BOOSTER_NAME)
+    for name, checksum in manifest['files'].items():
+        if _sha256_arquivo(os.path.join(path, name)) != checksum:
+            raise ValueError(f"Checksum divergente para {name} no bundle {path}.")
+
+    model = XGBClassifier()
+    model.load_model(booster_path)
+    return ModelBundle(path, model, manifest, manifest_hash)
+
+
+def carregar_bundle(path=bundle_path, pipeline=None):
+    """
+    Carrega um bundle de modelo. Cada chamada lê e valida apenas o manifesto; o
+    booster é carregado uma vez por hash de manifesto e reaproveitado do cache.
+    """
+    manifest, manifest_hash = _ler_manifesto(path)
+    validar_manifesto(manifest, pipeline)
+    return _cache.obter(manifest_hash, lambda: _carregar_sem_cache(path, manifest, manifest_hash))
+
+
+def limpar_cache():
+    _cache.limpar()
+
+
+@click.command()
+@click.argument('model_file', type=click.Path(exists=True))
+@click.argument('output_dir', type=click.Path(), default=bundle_path)
+@click.option('--threshold', default = None, type = float, help = 'Limiar de decisão gravado no manifesto')
+@click.option('--accounts', 'accounts_file', default = None, type = click.Path(exists=True), help = 'Dicionário de contas do treino (account_ids.arrow)')
+def main(model_file, output_dir, threshold, accounts_file):
+    """ Converts a pickled (joblib) XGBClassifier into a versioned model bundle. """
+    import joblib
+    from src.features import AccountEncoder
+
+    model = joblib.load(model_file)
+    encoder = AccountEncoder.carregar(accounts_file) if accounts_file else None
+    manifest = salvar_bundle(model, output_dir, threshold=threshold,
+                             metadata={'source': os.path.basename(model_file)}, encoder=encoder)
+    print(f"Bundle salvo em {output_dir} ({len(manifest['files'])} arquivo(s)).")
+
+
+if __name__ == '__main__':
+    main()
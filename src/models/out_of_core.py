@@ -0,0 +1,133 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import xgboost as xgb
+
+from src.data.loader import iterar_transacoes
+from src.features import FeaturePipeline, matriz_features
+
+# Mesmos hiperparâmetros do build_best_model (padrões do XGBClassifier)
+XGB_PARAMS = {
+    'objective': 'binary:logistic',
+    'eval_metric': 'logloss',
+    'tree_method': 'hist',
+    'seed': 42,
+}
+XGB_ROUNDS = 100
+
+
+class TransactionBatchIter(xgb.DataIter):
+    """
+    Iterador de dados do XGBoost sobre o dataset completo (parquet ou CSV):
+    cada chamada a next() lê um chunk com iterar_transacoes, aplica o
+    FeaturePipeline e entrega a matriz float32 ao XGBoost. Apenas um chunk
+    fica em memória por vez.
+
+    Na primeira passada completa também conta linhas/positivos, guarda o último
+    step e calcula o hash dos dados, usados no scale_pos_weight e no manifesto
+    do modelo (o último step é o watermark do retreino incremental).
+    """
+
+    def __init__(self, path, target='isFraud', chunksize=500000, cache_prefix=None):
+        self.path = path
+        self.target = target
+        self.chunksize = chunksize
+        self.pipeline = FeaturePipeline(target=target)
+        self.feature_names = list(self.pipeline.output_columns)
+        self.n_rows = 0
+        self.n_positives = 0
+        self.last_step = None
+        self._digest = hashlib.sha256()
+        self._first_pass = True
+        self._exhausted = False
+        self._chunks = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    @property
+    def data_hash(self):
+        return None if self._first_pass else self._digest.hexdigest()
+
+    def _abrir(self):
+        columns = [*self.pipeline.input_columns, self.target]
+        return iterar_transacoes(self.path, columns=columns, chunksize=self.chunksize)
+
+    def next(self, input_data):
+        if self._chunks is None:
+            self._chunks = self._abrir()
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._exhausted = True
+            return False
+
+        features = self.pipeline.transform(chunk)
+        X = matriz_features(features, self.feature_names)
+        y = features[self.target].to_numpy(dtype=np.int8)
+        if self._first_pass:
+            self.n_rows += len(y)
+            self.n_positives += int(y.sum())
+            chunk_last = int(features['step'].max())
+            self.last_step = chunk_last if self.last_step is None else max(self.last_step, chunk_last)
+            self._digest.update(X.data)
+            self._digest.update(y.data)
+        input_data(data=X, label=y, feature_names=self.feature_names,
+                   feature_types=FeaturePipeline.feature_types())
+        return True
+
+    def reset(self):
+        if self._exhausted:
+            # Passada completa: contagens e hash ficam congelados
+            self._first_pass = False
+        self._exhausted = False
+        self._chunks = None
+        # Cada passada relê o dataset desde o início, então o estado por conta recomeça
+        self.pipeline.reset()
+
+
+def _descricao_dados(it):
+    return {
+        'n_samples': it.n_rows,
+        'n_positives': it.n_positives,
+        'scale_pos_weight': (it.n_rows - it.n_positives) / max(it.n_positives, 1),
+        'data_hash': it.data_hash,
+        'last_step': it.last_step,
+    }
+
+
+def treinar_xgboost_out_of_core(path, chunksize=500000, max_bin=256, external_memory=False,
+                                cache_dir=None, n_jobs=None, tuned=None):
+    """
+    Treina o modelo final em todas as linhas de `path` sem carregar o dataset.
+    Por padrão constrói um QuantileDMatrix a partir do iterador (só os histogramas
+    quantizados, ~1 byte por valor, ficam em memória); com external_memory=True
+    as páginas quantizadas também vão para disco em cache_dir.
+
+    `tuned` (resultado de executar_busca) substitui os hiperparâmetros padrão.
+    Retorna um XGBClassifier (compatível com predict/bundle) e um dicionário com
+    número de linhas, positivos, scale_pos_weight e hash dos dados.
+    """
+    with tempfile.TemporaryDirectory(dir=cache_dir) as tmp_dir:
+        cache_prefix = os.path.join(tmp_dir, 'xgb_cache') if external_memory else None
+        it = TransactionBatchIter(path, chunksize=chunksize, cache_prefix=cache_prefix)
+        if not external_memory:
+            dtrain = xgb.QuantileDMatrix(it, max_bin=max_bin, nthread=n_jobs, enable_categorical=True)
+        elif hasattr(xgb, 'ExtMemQuantileDMatrix'):
+            dtrain = xgb.ExtMemQuantileDMatrix(it, max_bin=max_bin, nthread=n_jobs, enable_categorical=True)
+        else:
+            # xgboost < 3.0: memória externa via DMatrix com cache_prefix
+            dtrain = xgb.DMatrix(it, nthread=n_jobs, enable_categorical=True)
+
+        info = _descricao_dados(it)
+        params = {**XGB_PARAMS, 'max_bin': max_bin, 'scale_pos_weight': info['scale_pos_weight']}
+        if tuned is not None:
+            params.update(tuned['params'])
+        if n_jobs:
+            params['nthread'] = n_jobs
+        rounds = tuned['n_estimators'] if tuned is not None else XGB_ROUNDS
+        booster = xgb.train(params, dtrain, num_boost_round=rounds)
+        del dtrain
+
+    model = xgb.XGBClassifier(enable_categorical=True)
+    model.load_model(booster.save_raw(raw_format='ubj'))
+    return model, info
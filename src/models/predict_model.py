@@ -1,122 +1,182 @@
 import os
-import joblib
-import pandas as pd
+import time
+from functools import partial
+import click
 import numpy as np
-from sklearn.metrics import (
-    precision_score, 
-    recall_score, 
-    f1_score, 
-    confusion_matrix,
-    roc_curve,
-    auc,
-    precision_recall_curve,
-    average_precision_score
-)
-from src.features import (
-    criando_novas_features, 
-    removendo_features_redundantes_e_ineficientes
-)
-# Importa as funções de visualização do seu módulo
-from src.visualization.visualize import (
-    plot_multiple_confusion_matrices, 
-    plot_multiple_feature_importances, 
-    plot_roc_comparison, 
-    plot_precision_recall_comparison
-)
+from src.data.loader import caminho_dados_brutos, iterar_transacoes
+from src.features import FeaturePipeline
+from src.models.metrics import StreamingMetrics
+from src.models.scoring import pontuar_em_pipeline, prever_com_prefiltro
+from src.utils import ArrayAccumulator, etapa, iterar_com_etapa, rastrear
 
 project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
 model_path = os.path.join(project_dir, 'models', 'xgboost_fraud_model.joblib')
-raw_data_path = os.path.join(project_dir, 'data', 'raw', 'Fraud.csv') 
 reports_dir = os.path.join(project_dir, 'reports', 'figures')
+results_path = os.path.join(project_dir, 'reports', 'predict_results.json')
 
-# Cria o diretório de relatórios se não existir
-if not os.path.exists(reports_dir):
-    os.makedirs(reports_dir)
+def resolve_model_path(path=None):
+    """
+    Sem caminho explícito, usa o bundle versionado gravado pelo train. Não há
+    fallback para um .joblib: um modelo antigo com outro schema de features
+    só falharia mais adiante, na inferência.
+    """
+    from src.models.model_bundle import bundle_path
+
+    if path is None:
+        if not os.path.isdir(bundle_path):
+            raise FileNotFoundError(
+                f"Bundle do modelo não encontrado em {bundle_path}. Rode 'make train' "
+                f"(ou 'python src/models/train_model.py') ou informe --model."
+            )
+        path = bundle_path
+    return path
+
+def load_model(path=None):
+    """
+    Carrega o modelo treinado, de um bundle (diretório com manifest.json) ou de um .joblib.
+    Um .joblib é conferido contra o número de colunas do FeaturePipeline (o bundle
+    já é validado no carregamento). xgboost/sklearn só são importados neste momento.
+    """
+    path = resolve_model_path(path)
+    try:
+        print("Carregando o modelo...")
+        if os.path.isdir(path):
+            from src.models.model_bundle import carregar_bundle
+            model = carregar_bundle(path).model
+        else:
+            import joblib
+            model = joblib.load(path)
+            n_features = getattr(model, 'n_features_in_', None)
+            if n_features is not None and n_features != len(FeaturePipeline.output_columns):
+                raise ValueError(
+                    f"O modelo em {path} espera {n_features} features, mas o FeaturePipeline gera "
+                    f"{len(FeaturePipeline.output_columns)}; retreine com 'make train'."
+                )
+        print("Modelo carregado com sucesso.")
+    except FileNotFoundError as e:
+        raise FileNotFoundError(
+            f"Erro: Arquivo do modelo não encontrado. Verifique se 'train_model.py' foi executado "
+            f"e salvou o modelo em {os.path.dirname(path)}."
+        ) from e
+    return model
+
+def load_threshold(path=None):
+    """
+    Limiar de decisão registrado no manifesto do bundle (None para modelos .joblib).
+    O bundle vem do cache do processo, então chamar após load_model não recarrega o modelo.
+    """
+    path = resolve_model_path(path)
+    if not os.path.isdir(path):
+        return None
+    from src.models.model_bundle import carregar_bundle
+    return carregar_bundle(path).threshold
+
+def load_fraud_types(path=None):
+    """
+    Tipos de transação com fraude no treino, registrados no manifesto do bundle;
+    para modelos .joblib (ou bundles antigos) usa TIPOS_COM_FRAUDE.
+    """
+    from src.data.loader import TIPOS_COM_FRAUDE
+
+    path = resolve_model_path(path)
+    if os.path.isdir(path):
+        from src.models.model_bundle import carregar_bundle
+        fraud_types = carregar_bundle(path).manifest['metadata'].get('fraud_types')
+        if fraud_types is not None:
+            return fraud_types
+    return list(TIPOS_COM_FRAUDE)
 
-try:
-    print("Carregando o modelo...")
-    model = joblib.load(model_path)
-    print("Modelo carregado com sucesso.")
-except FileNotFoundError as e:
-    raise FileNotFoundError(
-        f"Erro: Arquivo do modelo não encontrado. Verifique se 'train_model.py' foi executado "
-        f"e salvou o modelo em {os.path.join(project_dir, 'models')}."
-    ) from e
+def load_encoder(path=None):
+    """
+    AccountEncoder com o dicionário de contas do treino, gravado no bundle, para
+    que as contas recebam na pontuação os mesmos IDs do treino. None para
+    modelos .joblib ou bundles sem dicionário (as contas começam do zero).
+    """
+    path = resolve_model_path(path)
+    if not os.path.isdir(path):
+        return None
+    from src.models.model_bundle import carregar_bundle
+    return carregar_bundle(path).encoder()
 
-def preprocess_for_prediction(df_new):
+def preprocess_for_prediction(df_new, pipeline=None):
     """
     Aplica o pipeline completo de pré-processamento e engenharia de features.
-    Não é necessário codificação, pois a feature 'type' foi removida.
-    """
-    df_processed = df_new.copy()
-    
-    # Aplica as funções de feature engineering
-    df_processed = criando_novas_features(df_processed)
-    df_processed = removendo_features_redundantes_e_ineficientes(df_processed)
-    
-    return df_processed
-
-# Lógica Principal para Previsão e Avaliação em Dados
-print(f"Carregando e processando o dataset completo do caminho: {raw_data_path}")
-
-all_true_labels = []
-all_predictions = []
-all_probabilities = []
-
-try:
-    chunk_size = 500000 
-    
-    for chunk in pd.read_csv(raw_data_path, chunksize=chunk_size):
-        if 'isFraud' not in chunk.columns:
-            print("Aviso: A coluna 'isFraud' não foi encontrada no dataset. A avaliação de métricas não será possível.")
-            break
-
-        true_labels = chunk['isFraud']
-        chunk_to_predict = chunk.drop('isFraud', axis=1)
-
-        processed_chunk = preprocess_for_prediction(chunk_to_predict)
-        
-        predictions = model.predict(processed_chunk)
-        probabilities = model.predict_proba(processed_chunk)[:, 1]
-
-        all_true_labels.extend(true_labels)
-        all_predictions.extend(predictions)
-        all_probabilities.extend(probabilities)
-
-    print("\nPrevisão e acumulação de resultados concluídas em todo o dataset.")
-
-    y_true = np.array(all_true_labels)
-    y_pred = np.array(all_predictions)
-    y_proba = np.array(all_probabilities)
-    
-    feature_names = processed_chunk.columns.tolist()
+    'type' segue como categórico com categorias fixas, sem one-hot.
+    O FeaturePipeline lê apenas as colunas de entrada, sem copiar o chunk.
+    Sem `pipeline`, o estado das features por conta começa vazio.
+    """
+    return (pipeline or FeaturePipeline()).transform(df_new)
+
+def score_chunk(model, features, threshold=None, target='isFraud', fraud_types=None):
+    """
+    Pontua um chunk já transformado pelo FeaturePipeline com uma única passada
+    de inferência, retornando rótulos, previsões, probabilidades e quantas linhas
+    passaram pelo modelo (com `fraud_types`, só as desses tipos).
+    """
+    with etapa('predict.score_chunk', rows=len(features)) as span:
+        predictions, probabilities, n_scored = prever_com_prefiltro(
+            model, features, list(FeaturePipeline.output_columns), threshold, fraud_types
+        )
+        span.contar('scored_rows', n_scored)
+    return features[target], predictions, probabilities, n_scored
+
+def modelo_para_workers(model, workers):
+    """
+    Divide as threads do XGBoost entre os workers para evitar oversubscription.
+    A inferência usa o nthread do booster (não o n_jobs do wrapper), então o
+    limite vai para uma cópia do booster; o modelo compartilhado pelo cache de
+    bundles não é alterado. Modelos sem booster são retornados como estão.
+    """
+    if workers <= 1 or not hasattr(model, 'get_booster'):
+        return model
+    import copy
+
+    n_threads = max(1, (os.cpu_count() or 1) // workers)
+    booster = model.get_booster().copy()
+    booster.set_param('nthread', n_threads)
+    model = copy.copy(model)
+    model._Booster = booster
+    model.n_jobs = n_threads
+    return model
+
+def criar_acumuladores(chunk_size):
+    """
+    Buffers opcionais com os resultados por linha, gravados em memmap no
+    PREDICT_SPILL_DIR (rótulos, previsões e probabilidades); None sem a variável.
+    """
+    spill_dir = os.environ.get('PREDICT_SPILL_DIR')
+    if not spill_dir:
+        return None
+    return (
+        ArrayAccumulator(np.int8, chunk_size, os.path.join(spill_dir, 'y_true.bin')),
+        ArrayAccumulator(np.int8, chunk_size, os.path.join(spill_dir, 'y_pred.bin')),
+        ArrayAccumulator(np.float32, chunk_size, os.path.join(spill_dir, 'y_proba.bin')),
+    )
 
+def imprimir_metricas(metrics):
     # Cálculo e Exibição das Métricas
     print("\nMétricas de Avaliação do Modelo no Dataset Completo")
-    
-    precision = precision_score(y_true, y_pred, average='macro', zero_division=0)
-    recall = recall_score(y_true, y_pred, average='macro', zero_division=0)
-    f1 = f1_score(y_true, y_pred, average='macro', zero_division=0)
-    
+
+    precision, recall, f1 = metrics.precision_recall_f1(average='macro')
+
     print(f"Precision (Macro): {precision:.4f}")
     print(f"Recall    (Macro): {recall:.4f}")
     print(f"F1-score  (Macro): {f1:.4f}")
-    
-    conf_matrix = confusion_matrix(y_true, y_pred)
+
+    conf_matrix = metrics.conf_matrix
     print("\nMatriz de Confusão:")
     print(conf_matrix)
     print("(A ordem das classes é: [Não Fraude, Fraude])")
 
+def gravar_relatorios(model, metrics):
+    """
+    Grava o resumo em results_path e desenha os gráficos em reports_dir.
+    """
     # Geração de Gráficos de Visualização para o  modelo
     print("\nGerando Gráficos de Visualização do Modelo")
-    
-    # Matriz de Confusão
-    plot_multiple_confusion_matrices(
-        {'XGBoost': (y_true, y_pred)},
-        class_names=['Não Fraude', 'Fraude'],
-        save_path=os.path.join(reports_dir, 'predict_confusion_matrix.png')
-    )
-    
+    # matplotlib/seaborn só são carregados na etapa de gráficos
+    from src.visualization.report_results import ReportResults, FIGURAS_PREDICAO
+
     # Importância de Features
     if hasattr(model, 'feature_importances_'):
         importances = model.feature_importances_
@@ -124,31 +184,100 @@ try:
         importances = np.abs(model.coef_)[0]
     else:
         importances = None
-    
-    plot_multiple_feature_importances(
-        {'XGBoost': importances},
-        feature_names=feature_names,
-        top_n=15,
-        save_path=os.path.join(reports_dir, 'predict_feature_importances.png')
-    )
-    
-    # Curva ROC
-    fpr, tpr, _ = roc_curve(y_true, y_proba)
-    roc_auc = auc(fpr, tpr)
-    plot_roc_comparison(
-        {'XGBoost': (fpr, tpr, roc_auc)},
-        save_path=os.path.join(reports_dir, 'predict_roc_curve.png')
-    )
-    
-    # Curva Precision-Recall
-    precision_vals, recall_vals, _ = precision_recall_curve(y_true, y_proba)
-    avg_precision = average_precision_score(y_true, y_proba)
-    plot_precision_recall_comparison(
-        {'XGBoost': (precision_vals, recall_vals, avg_precision)},
-        save_path=os.path.join(reports_dir, 'predict_precision_recall_curve.png')
-    )
 
-except FileNotFoundError:
-    print(f"Erro: Arquivo não encontrado em {raw_data_path}. Verifique o caminho.")
-except Exception as e:
-    print(f"Ocorreu um erro durante o processamento: {e}")
\ No newline at end of file
+    # Resumo a partir das contagens já acumuladas pelo StreamingMetrics: nenhum vetor
+    # por linha é necessário, e os relatórios podem ser refeitos sem repontuar
+    with etapa('predict.reports'):
+        report = ReportResults(feature_names=list(FeaturePipeline.output_columns),
+                               figures=FIGURAS_PREDICAO, top_n=15)
+        report.adicionar_metricas('XGBoost', metrics, importances=importances)
+        report.salvar(results_path)
+        report.renderizar(reports_dir)
+
+def transformar_chunks(pipeline, chunks):
+    """
+    FeaturePipeline.transform_batch com o tempo de cada chunk registrado no trace.
+    """
+    for chunk in chunks:
+        with etapa('predict.features', rows=len(chunk)):
+            features = pipeline.transform(chunk)
+        yield features
+
+
+@click.command()
+@click.option('--workers', default = 1, type = int, help = 'Número de threads de inferência')
+@click.option('--chunk-size', default = 500000, type = int, help = 'Linhas por chunk')
+@click.option('--prefetch', default = 2, type = int, help = 'Chunks pré-carregados pelo leitor')
+@click.option('--ordered/--unordered', default = True, help = 'Mantém a ordem original dos chunks')
+@click.option('--threshold', default = None, type = float, help = 'Limiar de decisão sobre P(fraude); padrão usa o do manifesto ou reproduz predict()')
+@click.option('--model', 'model_file', default = None, type = click.Path(exists=True), help = 'Bundle ou arquivo .joblib do modelo')
+@click.option('--prefilter/--no-prefilter', default = False, help = 'Pula a inferência de tipos de transação sem fraude no treino')
+def main(workers, chunk_size, prefetch, ordered, threshold, model_file, prefilter):
+    # Lógica Principal para Previsão e Avaliação em Dados
+    raw_data_path = caminho_dados_brutos(project_dir)
+    model = load_model(model_file)
+    if threshold is None:
+        threshold = load_threshold(model_file)
+    fraud_types = load_fraud_types(model_file) if prefilter else None
+    if fraud_types is not None:
+        print(f"Pré-filtro ativo: apenas transações {fraud_types} passam pelo modelo")
+
+    # Cria o diretório de relatórios se não existir
+    os.makedirs(reports_dir, exist_ok=True)
+
+    print(f"Carregando e processando o dataset completo do caminho: {raw_data_path}")
+
+    # Tempos, linhas e memória de cada fase vão para reports/traces/predict-<data>.json
+    with rastrear('predict'):
+        try:
+            # Métricas incrementais: 'hist' usa memória O(bins), 'exact' reproduz o sklearn
+            metrics = StreamingMetrics(
+                mode=os.environ.get('PREDICT_METRICS_MODE', 'hist'),
+                n_bins=int(os.environ.get('PREDICT_METRICS_BINS', 10000))
+            )
+
+            # Opcionalmente, os resultados por linha são gravados em memmap no PREDICT_SPILL_DIR
+            accumulators = criar_acumuladores(chunk_size)
+            # Apenas as colunas usadas pelo modelo e o rótulo são lidas
+            columns = [*FeaturePipeline.input_columns, 'isFraud']
+
+            start = time.perf_counter()
+            # As features por conta dependem das transações anteriores: o pipeline roda
+            # na thread leitora, em ordem, e só a inferência é paralelizada
+            pipeline = FeaturePipeline(target='isFraud', encoder=load_encoder(model_file))
+            chunks = transformar_chunks(pipeline, iterar_com_etapa(
+                'predict.read', iterar_transacoes(raw_data_path, columns=columns, chunksize=chunk_size)
+            ))
+            score_fn = partial(score_chunk, modelo_para_workers(model, workers),
+                               threshold=threshold, fraud_types=fraud_types)
+            scored = pontuar_em_pipeline(chunks, score_fn, workers=workers, prefetch=prefetch, ordered=ordered)
+
+            n_scored = 0
+            with etapa('predict.pipeline') as span:
+                for chunk, (true_labels, predictions, probabilities, chunk_scored) in scored:
+                    n_scored += chunk_scored
+                    metrics.update(true_labels, predictions, probabilities)
+                    if accumulators:
+                        for accumulator, values in zip(accumulators, (true_labels, predictions, probabilities)):
+                            accumulator.extend(values)
+                span.rows = metrics.n_samples
+
+            elapsed = time.perf_counter() - start
+            print("\nPrevisão e acumulação de resultados concluídas em todo o dataset.")
+            print(f"{metrics.n_samples} linhas pontuadas em {elapsed:.2f}s "
+                  f"({metrics.n_samples / elapsed:,.0f} linhas/s, {workers} worker(s))")
+            if fraud_types is not None:
+                print(f"Pré-filtro: {n_scored} de {metrics.n_samples} linhas "
+                      f"({n_scored / max(metrics.n_samples, 1):.1%}) passaram pelo modelo")
+
+            imprimir_metricas(metrics)
+            # Os gráficos são desenhados sem janela
+            gravar_relatorios(model, metrics)
+
+        except FileNotFoundError:
+            print(f"Erro: Arquivo não encontrado em {raw_data_path}. Verifique o caminho.")
+        except Exception as e:
+            print(f"Ocorreu um erro durante o processamento: {e}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+_FIM = object()
+
+
+def _colocar(fila, item, parar):
+    """
+    Coloca `item` na fila limitada, desistindo quando `parar` é sinalizado.
+    Retorna False se o consumidor parou antes.
+    """
+    while not parar.is_set():
+        try:
+            fila.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _ler_chunks(chunks, fila, parar):
+    """
+    Estágio leitor: consome o iterador de chunks e os coloca na fila limitada.
+    Exceções da leitura são repassadas pela fila para o consumidor.
+    """
+    try:
+        for chunk in chunks:
+            if not _colocar(fila, chunk, parar):
+                return
+        item = _FIM
+    except BaseException as e:
+        item = e
+    _colocar(fila, item, parar)
+
+
+def pontuar_em_pipeline(chunks, score_fn, workers=1, prefetch=2, ordered=True):
+    """
+    Pontua chunks em pipeline: uma thread leitora pré-carrega até `prefetch`
+    chunks em uma fila limitada enquanto um pool de `workers` threads executa
+    `score_fn` (a inferência do XGBoost libera o GIL).
+
+    Gera pares (chunk, resultado). Com ordered=True a saída segue a ordem de
+    leitura; caso contrário os resultados saem assim que ficam prontos.
+    No máximo prefetch + workers chunks ficam em memória ao mesmo tempo.
+    """
+    fila = queue.Queue(maxsize=prefetch)
+    parar = threading.Event()
+    leitor = threading.Thread(target=_ler_chunks, args=(chunks, fila, parar), daemon=True)
+    leitor.start()
+
+    pending = deque()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                item = fila.get()
+                if item is _FIM:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                pending.append((item, pool.submit(score_fn, item)))
+
+                # Mantém no máximo `workers` chunks em inferência
+                while len(pending) >= workers:
+                    yield from _drenar(pending, ordered)
+
+            while pending:
+                yield from _drenar(pending, ordered)
+    finally:
+        parar.set()
+        leitor.join()
+
+
+def _drenar(pending, ordered):
+    """
+    Remove de `pending` e gera os resultados prontos: o mais antigo no modo
+    ordenado ou o(s) primeiro(s) a terminar no modo não ordenado.
+    """
+    return _drenar_ordenado(pending) if ordered else _drenar_nao_ordenado(pending)
+
+
+def _drenar_ordenado(pending):
+    chunk, future = pending.popleft()
+    yield chunk, future.result()
+
+
+def _drenar_nao_ordenado(pending):
+    done, _ = wait([future for _, future in pending], return_when=FIRST_COMPLETED)
+    for entry in [entry for entry in pending if entry[1] in done]:
+        pending.remove(entry)
+        yield entry[0], entry[1].result()
+
+
+def prever_com_limiar(model, X, threshold=None):
+    """
+    Executa a inferência uma única vez e deriva os rótulos das probabilidades.
+
+    Com threshold=None os rótulos reproduzem model.predict() (classe de maior
+    probabilidade, empates para a classe 0). Com um threshold numérico, uma linha é
+    classificada como fraude quando P(fraude) > threshold.
+    Retorna (y_pred, y_proba); y_proba é None para modelos sem predict_proba.
+    """
+    try:
+        proba = model.predict_proba(X)
+    except AttributeError:
+        return model.predict(X), None
+
+    if threshold is None:
+        y_pred = model.classes_.take(np.argmax(proba, axis=1))
+    else:
+        y_pred = model.classes_.take((proba[:, 1] > threshold).astype(np.intp))
+    return y_pred, proba[:, 1]
+
+
+def prever_com_prefiltro(model, features, columns, threshold=None, fraud_types=None):
+    """
+    Como prever_com_limiar sobre features[columns], mas com `fraud_types` apenas
+    as linhas cujo 'type' está na lista passam pelo modelo; as demais recebem
+    P(fraude) = 0 e a classe 0 sem custo de inferência.
+    Retorna (y_pred, y_proba, linhas pontuadas pelo modelo).
+    """
+    X = features[columns]
+    if fraud_types is None:
+        return (*prever_com_limiar(model, X, threshold), len(X))
+
+    rows = np.flatnonzero(features['type'].isin(fraud_types).to_numpy())
+    y_pred = np.zeros(len(X), dtype=model.classes_.dtype)
+    y_proba = np.zeros(len(X), dtype=np.float32)
+    if len(rows):
+        pred, proba = prever_com_limiar(model, X.iloc[rows], threshold)
+        y_pred[rows] = pred
+        if proba is None:
+            y_proba = None
+        else:
+            y_proba[rows] = proba
+    return y_pred, y_proba, len(rows)
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import logging
+import time
+
+import click
+import numpy as np
+
+from src.features import FeaturePipeline
+from src.models.predict_model import load_encoder, load_fraud_types, load_model, load_threshold
+from src.models.scoring import prever_com_prefiltro
+
+# Identificadores de conta e tipo chegam como texto; step é inteiro e o restante, numérico
+_DTYPES = {'type': object, 'nameOrig': object, 'nameDest': object, 'step': np.int64}
+
+_STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+
+class MicroBatchScorer:
+    """
+    Agrupa as transações que chegam dentro de uma janela de `window_ms` (até
+    `max_batch` itens) em uma única chamada ao modelo. A inferência roda em uma
+    thread para não bloquear o event loop.
+
+    Os lotes são processados um de cada vez e na ordem de chegada, então o
+    estado das features por conta do FeaturePipeline avança como no lote.
+    Com o `encoder` do bundle, as contas têm os mesmos IDs do treino.
+    """
+
+    def __init__(self, model, threshold=None, window_ms=2.0, max_batch=256, fraud_types=None, encoder=None):
+        self.model = model
+        self.threshold = threshold
+        # Com fraud_types, transações de outros tipos recebem P(fraude) = 0 sem passar pelo modelo
+        self.fraud_types = fraud_types
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.pipeline = FeaturePipeline(encoder=encoder)
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def score(self, transactions):
+        """
+        Enfileira uma lista de transações (dicts) e aguarda suas probabilidades.
+        """
+        columns = {
+            name: np.array([t[name] for t in transactions], dtype=_DTYPES.get(name, np.float64))
+            for name in self.pipeline.input_columns
+        }
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((columns, len(transactions), future))
+        return await future
+
+    def _transformar(self, batch):
+        columns = {
+            name: np.concatenate([cols[name] for cols, _, _ in batch])
+            for name in self.pipeline.input_columns
+        }
+        return self.pipeline.transform(columns)
+
+    def _predict(self, features):
+        y_pred, y_proba, _ = prever_com_prefiltro(
+            self.model, features, list(self.pipeline.output_columns), self.threshold, self.fraud_types
+        )
+        return y_pred, y_proba
+
+    def _pontuar(self, batch):
+        """
+        Pontua o lote em uma única chamada ao modelo e retorna, para cada
+        requisição, o resultado ou a exceção. Se o lote falhar, cada requisição é
+        repetida sozinha para que o erro chegue só ao cliente que o causou.
+        Quando a transformação do lote já passou, só a inferência é repetida:
+        transformar de novo contaria as transações duas vezes no estado por conta.
+        """
+        try:
+            features = self._transformar(batch)
+        except Exception:
+            features = None
+        if features is not None:
+            try:
+                y_pred, y_proba = self._predict(features)
+            except Exception:
+                pass
+            else:
+                results, start = [], 0
+                for _, n, _ in batch:
+                    results.append((y_pred[start:start + n], y_proba[start:start + n]))
+                    start += n
+                return results
+
+        results, start = [], 0
+        for item in batch:
+            n = item[1]
+            try:
+                item_features = self._transformar([item]) if features is None else features.iloc[start:start + n]
+                results.append(self._predict(item_features))
+            except Exception as e:
+                results.append(e)
+            start += n
+        return results
+
+    async def _coletar(self, loop):
+        """
+        Aguarda a primeira requisição e junta as que chegarem dentro da janela,
+        até `max_batch` transações.
+        """
+        batch = [await self._queue.get()]
+        size = batch[0][1]
+        deadline = loop.time() + self.window
+        while size < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            size += item[1]
+        return batch
+
+    @staticmethod
+    def _responder(batch, results):
+        # Cada requisição recebe o próprio resultado ou a própria exceção
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._coletar(loop)
+            try:
+                results = await loop.run_in_executor(None, self._pontuar, batch)
+            except Exception as e:
+                results = [e] * len(batch)
+            self._responder(batch, results)
+
+
+async def _ler_requisicao(reader):
+    """
+    Lê uma requisição HTTP/1.1 e retorna (método, caminho, headers, corpo),
+    ou None quando o cliente fecha a conexão.
+    """
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get('content-length', 0))
+    body = await reader.readexactly(length) if length else b''
+    return method, path, headers, body
+
+
+def _resposta(status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    head = (
+        f'HTTP/1.1 {status} {_STATUS[status]}\r\n'
+        f'Content-Type: application/json\r\n'
+        f'Content-Length: {len(body)}\r\n'
+        f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'
+    )
+    return head.encode('latin-1') + body
+
+
+async def _tratar_score(scorer, body):
+    try:
+        payload = json.loads(body)
+    except json.JSONDecodeError as e:
+        return 400, {'error': f'JSON inválido: {e}'}
+
+    single = isinstance(payload, dict)
+    transactions = [payload] if single else payload
+    if not isinstance(transactions, list) or not transactions:
+        return 400, {'error': 'Envie uma transação (objeto) ou uma lista de transações.'}
+
+    missing = [c for c in scorer.pipeline.input_columns
+               if any(not isinstance(t, dict) or c not in t for t in transactions)]
+    if missing:
+        return 400, {'error': f'Campos ausentes: {missing}'}
+
+    try:
+        y_pred, y_proba = await scorer.score(transactions)
+    except (TypeError, ValueError) as e:
+        return 400, {'error': f'Valores inválidos: {e}'}
+    except Exception as e:
+        logging.getLogger(__name__).exception('Falha ao pontuar a requisição')
+        return 500, {'error': f'Erro interno ao pontuar: {type(e).__name__}: {e}'}
+
+    results = [{'probability': float(p), 'isFraud': int(d)} for d, p in zip(y_pred, y_proba)]
+    return 200, results[0] if single else results
+
+
+def criar_handler(scorer):
+    async def handler(reader, writer):
+        try:
+            while True:
+                request = await _ler_requisicao(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+
+                if path == '/health':
+                    status, payload = 200, {'status': 'ok'}
+                elif path != '/score':
+                    status, payload = 404, {'error': f'Rota desconhecida: {path}'}
+                elif method != 'POST':
+                    status, payload = 405, {'error': 'Use POST em /score'}
+                else:
+                    status, payload = await _tratar_score(scorer, body)
+
+                writer.write(_resposta(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+    return handler
+
+
+async def servir(model, host, port, threshold=None, window_ms=2.0, max_batch=256, fraud_types=None,
+                 encoder=None):
+    scorer = MicroBatchScorer(model, threshold, window_ms, max_batch, fraud_types, encoder)
+    scorer.start()
+    server = await asyncio.start_server(criar_handler(scorer), host, port)
+    logging.getLogger(__name__).info(
+        f'Servidor de scoring em http://{host}:{port}/score '
+        f'(janela {window_ms} ms, lote máximo {max_batch})'
+    )
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await scorer.stop()
+
+
+@click.command()
+@click.option('--host', default = '127.0.0.1', help = 'Endereço de escuta')
+@click.option('--port', default = 8000, type = int, help = 'Porta de escuta')
+@click.option('--model', 'model_file', default = None, type = click.Path(exists=True), help = 'Bundle ou arquivo .joblib do modelo')
+@click.option('--threshold', default = None, type = float, help = 'Limiar de decisão sobre P(fraude); padrão usa o do manifesto ou reproduz predict()')
+@click.option('--window-ms', default = 2.0, type = float, help = 'Janela de micro-batching em milissegundos')
+@click.option('--max-batch', default = 256, type = int, help = 'Máximo de transações por chamada ao modelo')
+@click.option('--prefilter/--no-prefilter', default = False, help = 'Responde P(fraude) = 0 sem inferência para tipos sem fraude no treino')
+def main(host, port, model_file, threshold, window_ms, max_batch, prefilter):
+    """ Serves single-transaction fraud scores over HTTP (POST /score). """
+    start = time.perf_counter()
+    model = load_model(model_file)
+    if threshold is None:
+        threshold = load_threshold(model_file)
+    fraud_types = load_fraud_types(model_file) if prefilter else None
+    encoder = load_encoder(model_file)
+    logging.getLogger(__name__).info(f'Modelo carregado em {time.perf_counter() - start:.2f}s')
+    try:
+        asyncio.run(servir(model, host, port, threshold, window_ms, max_batch, fraud_types, encoder))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    main()
@@ -1,150 +1,324 @@
-import joblib
-import pandas as pd
 import os
-import numpy as np
-from sklearn.model_selection import StratifiedKFold
-from sklearn.metrics import precision_score, recall_score, f1_score, confusion_matrix, roc_curve, auc, precision_recall_curve, average_precision_score
-from sklearn.linear_model import LogisticRegression
-from sklearn.ensemble import RandomForestClassifier, AdaBoostClassifier
-from sklearn.tree import DecisionTreeClassifier
-from xgboost import XGBClassifier
-from lightgbm import LGBMClassifier
+import time
 import warnings
 warnings.filterwarnings("ignore")
-from src.visualization import plot_multiple_confusion_matrices, plot_multiple_feature_importances, plot_roc_comparison, plot_precision_recall_comparison
+import joblib
+import numpy as np
+import pandas as pd
+from src.features import AccountEncoder, FeaturePipeline
+from src.features.account_encoder import accounts_path
+from src.utils import etapa, peak_rss_mb, rastrear, registrar
 
 project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
-data_path = os.path.join(project_dir, 'data', 'processed', 'fraud_features.csv')
+data_path = os.path.join(project_dir, 'data', 'processed', 'fraud_features.arrow')
+plots_dir = os.path.join(project_dir, 'reports', 'figures')
+results_path = os.path.join(project_dir, 'reports', 'train_results.json')
+model_path = os.path.join(project_dir, 'models', 'xgboost_fraud_model.joblib')
 
-if not os.path.exists(data_path):
-    raise FileNotFoundError(f"O arquivo não foi encontrado: {data_path}")
+def env_flag(name):
+    """
+    Lê uma variável de ambiente booleana ('1', 'true', 'yes').
+    """
+    return os.environ.get(name, '').strip().lower() in ('1', 'true', 'yes')
 
-df = pd.read_csv(data_path)
+def build_models(scale_pos_weight, tuned=None):
+    """
+    Instancia os modelos comparados na validação cruzada.
+    As bibliotecas de estimadores só são importadas aqui, quando o treino é executado.
+    `tuned` ({nome: resultado de executar_busca}) substitui os padrões do XGBoost/LightGBM.
+    """
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.ensemble import RandomForestClassifier, AdaBoostClassifier
+    from sklearn.tree import DecisionTreeClassifier
+    from xgboost import XGBClassifier
+    from lightgbm import LGBMClassifier
 
-X = df.drop(columns=['isFraud'])
-y = df['isFraud']
+    models = {
+        "Random Forest": RandomForestClassifier(class_weight='balanced', random_state=42),
+        "Decision Tree": DecisionTreeClassifier(class_weight='balanced', random_state=42),
+        "AdaBoost": AdaBoostClassifier(
+            estimator=DecisionTreeClassifier(class_weight='balanced', random_state=42),
+            random_state=42
+        ),
+        # 'type' entra como categoria nativa no XGBoost/LightGBM; os demais modelos veem o código
+        "XGBoost": XGBClassifier(scale_pos_weight=scale_pos_weight, use_label_encoder=False, eval_metric='logloss', random_state=42,
+                                 enable_categorical=True, feature_types=FeaturePipeline.feature_types()),
+        "LightGBM": LGBMClassifier(class_weight='balanced', random_state=42,
+                                   categorical_column=FeaturePipeline.categorical_indices()),
+        "Regressão Logística": LogisticRegression(class_weight='balanced', random_state=42, solver='liblinear')
+    }
+    if tuned:
+        from src.models.hyperparameter_search import construir_estimador
+    for name, result in (tuned or {}).items():
+        models[name] = construir_estimador(name, result['params'], scale_pos_weight,
+                                           n_estimators=result['n_estimators'])
+    return models
 
-# Cria a pasta para salvar os gráficos, se não existir
-plots_dir = os.path.join(project_dir, 'reports', 'figures')
-os.makedirs(plots_dir, exist_ok=True)
-
-# Função de Validação Cruzada Unificada
-def cross_validate_model(model, X, y, model_name, n_splits=5):
-    """
-    Executa a validação cruzada e coleta os dados para plotagem.
-    Retorna os dados necessários para os gráficos.
-    """
-    skf = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
-    precisions_macro, recalls_macro, f1s_macro = [], [], []
-    precisions_weighted, recalls_weighted, f1s_weighted = [], [], []
-    
-    all_y_true = []
-    all_y_pred = []
-    all_y_proba = []
-
-    for train_idx, test_idx in skf.split(X, y):
-        X_tr, X_te = X.iloc[train_idx], X.iloc[test_idx]
-        y_tr, y_te = y.iloc[train_idx], y.iloc[test_idx]
-
-        model.fit(X_tr, y_tr)
-        y_pred = model.predict(X_te)
-        
-        try:
-            y_proba = model.predict_proba(X_te)[:, 1]
-        except AttributeError:
-            y_proba = None
-        
-        all_y_true.extend(y_te)
-        all_y_pred.extend(y_pred)
-        if y_proba is not None:
-            all_y_proba.extend(y_proba)
-
-        precisions_macro.append(precision_score(y_te, y_pred, average='macro', zero_division=0))
-        recalls_macro.append(recall_score(y_te, y_pred, average='macro', zero_division=0))
-        f1s_macro.append(f1_score(y_te, y_pred, average='macro', zero_division=0))
-        
-        precisions_weighted.append(precision_score(y_te, y_pred, average='weighted'))
-        recalls_weighted.append(recall_score(y_te, y_pred, average='weighted'))
-        f1s_weighted.append(f1_score(y_te, y_pred, average='weighted'))
-
-    print(f"Precision macro: {np.mean(precisions_macro):.4f}")
-    print(f"Recall macro   : {np.mean(recalls_macro):.4f}")
-    print(f"F1-score macro : {np.mean(f1s_macro):.4f}")
-    print(f"Precision weighted: {np.mean(precisions_weighted):.4f}")
-    print(f"Recall weighted   : {np.mean(recalls_weighted):.4f}")
-    print(f"F1-score weighted : {np.mean(f1s_weighted):.4f}")
+def build_best_model(scale_pos_weight, tuned=None):
+    """
+    Instancia o modelo final (XGBoost) treinado em todo o conjunto de treino,
+    com os hiperparâmetros da busca quando `tuned` é informado.
+    """
+    from xgboost import XGBClassifier
+
+    if tuned is not None:
+        from src.models.hyperparameter_search import construir_estimador
+        return construir_estimador('XGBoost', tuned['params'], scale_pos_weight,
+                                   n_estimators=tuned['n_estimators'])
+
+    return XGBClassifier(
+        scale_pos_weight=scale_pos_weight,
+        use_label_encoder=False,
+        eval_metric='logloss',
+        random_state=42,
+        enable_categorical=True,
+        feature_types=FeaturePipeline.feature_types()
+    )
+
+def tipos_com_fraude(X_matrix, y_vector):
+    """
+    Tipos de transação ('type', em códigos) com ao menos um positivo no treino.
+    """
+    from src.data.loader import TIPOS_TRANSACAO
+
+    codes = np.asarray(X_matrix[:, FeaturePipeline.output_columns.index('type')])[np.asarray(y_vector) == 1]
+    return [TIPOS_TRANSACAO[int(c)] for c in np.unique(codes[~np.isnan(codes)])]
+
+def print_cv_metrics(fold_metrics):
+    """
+    Exibe a média das métricas por fold retornadas pelo motor de validação cruzada.
+    """
+    print(f"Precision macro: {np.mean([m['precision_macro'] for m in fold_metrics]):.4f}")
+    print(f"Recall macro   : {np.mean([m['recall_macro'] for m in fold_metrics]):.4f}")
+    print(f"F1-score macro : {np.mean([m['f1_macro'] for m in fold_metrics]):.4f}")
+    print(f"Precision weighted: {np.mean([m['precision_weighted'] for m in fold_metrics]):.4f}")
+    print(f"Recall weighted   : {np.mean([m['recall_weighted'] for m in fold_metrics]):.4f}")
+    print(f"F1-score weighted : {np.mean([m['f1_weighted'] for m in fold_metrics]):.4f}")
     print("\n" + "-"*50 + "\n")
-    
-    # Retorna todos os dados para plotagem
-    return np.array(all_y_true), np.array(all_y_pred), np.array(all_y_proba)
-
-# Dicionários para armazenar os resultados para os gráficos de comparação
-all_roc_results = {}
-all_pr_results = {}
-all_cm_results = {}
-all_fi_results = {}
-
-# Executando modelos
-print("\nAvaliando e Gerando Gráficos para os Modelos")
-models = {
-    "Random Forest": RandomForestClassifier(class_weight='balanced', random_state=42),
-    "Decision Tree": DecisionTreeClassifier(class_weight='balanced', random_state=42),
-    "AdaBoost": AdaBoostClassifier(
-        estimator=DecisionTreeClassifier(class_weight='balanced', random_state=42),
-        random_state=42
-    ),
-    "XGBoost": XGBClassifier(scale_pos_weight=(y==0).sum()/(y==1).sum(), use_label_encoder=False, eval_metric='logloss', random_state=42),
-    "LightGBM": LGBMClassifier(class_weight='balanced', random_state=42),
-    "Regressão Logística": LogisticRegression(class_weight='balanced', random_state=42, solver='liblinear')
-}
-
-for name, model in models.items():
-    print(f"### {name} ###")
-    y_true, y_pred, y_proba = cross_validate_model(model, X, y, name)
-    
-    all_cm_results[name] = (y_true, y_pred)
-    
-    if y_proba.size > 0:
-        fpr, tpr, _ = roc_curve(y_true, y_proba)
-        roc_auc = auc(fpr, tpr)
-        all_roc_results[name] = (fpr, tpr, roc_auc)
-
-        precision, recall, _ = precision_recall_curve(y_true, y_proba)
-        avg_precision = average_precision_score(y_true, y_proba)
-        all_pr_results[name] = (precision, recall, avg_precision)
-    
-    # Lógica para coletar a importância das features para diferentes tipos de modelos
-    if hasattr(model, 'feature_importances_'):
-        all_fi_results[name] = model.feature_importances_
-    elif hasattr(model, 'coef_'):
-        all_fi_results[name] = np.abs(model.coef_)[0]
-    else:
-        all_fi_results[name] = None
-        
-print("Todos os modelos avaliados. Gerando gráficos finais.")
-
-plot_multiple_confusion_matrices(all_cm_results, class_names=['Não Fraude', 'Fraude'],
-                                 save_path=os.path.join(plots_dir, 'all_confusion_matrices.png'))
-
-plot_multiple_feature_importances(all_fi_results, X.columns, top_n=10,
-                                  save_path=os.path.join(plots_dir, 'all_feature_importances.png'))
-
-plot_roc_comparison(all_roc_results, save_path=os.path.join(plots_dir, 'roc_comparison.png'))
-
-plot_precision_recall_comparison(all_pr_results, save_path=os.path.join(plots_dir, 'pr_comparison.png'))
-
-# Salvando modelo com melhor performance
-print("\nTreinando e salvando o modelo de melhor desempenho (XGBoost)")
-best_model = XGBClassifier(
-    scale_pos_weight=(y==0).sum()/(y==1).sum(), 
-    use_label_encoder=False, 
-    eval_metric='logloss', 
-    random_state=42
-)
-print("Treinando o modelo final...")
-best_model.fit(X, y)
-print("Treinamento concluído.")
-model_path = os.path.join(project_dir, 'models', 'xgboost_fraud_model.joblib')
-print(f"Salvando o modelo em: {model_path}")
-joblib.dump(best_model, model_path)
-print("Modelo salvo com sucesso.")
\ No newline at end of file
+
+def print_fold_timings(fold_timings):
+    """
+    Exibe, por fold, os tempos de fit/predict e o pico de memória do processo.
+    """
+    for fold, t in enumerate(fold_timings):
+        print(f"Fold {fold}: fit {t['fit_time']:.2f}s | predict {t['predict_time']:.2f}s "
+              f"| pico de RSS {t['peak_rss_mb']:.1f} MB")
+
+def registrar_folds(name, fold_timings):
+    """
+    Registra no trace o fit e o predict de cada fold, medidos nos processos do pool.
+    """
+    for fold, t in enumerate(fold_timings):
+        registrar(f'train.cv.{name}.fit', t['fit_time'], cpu_s=t['fit_cpu_time'], rows=t['n_train'],
+                  model=name, fold=fold, peak_rss_mb=t['peak_rss_mb'])
+        registrar(f'train.cv.{name}.predict', t['predict_time'], cpu_s=t['predict_cpu_time'], rows=t['n_test'],
+                  model=name, fold=fold, peak_rss_mb=t['peak_rss_mb'])
+
+def run_training():
+    from sklearn.metrics import roc_curve, auc, precision_recall_curve, average_precision_score, confusion_matrix
+    from src.models.cv_engine import carregar_matriz_treino, executar_validacao_cruzada
+
+    # Matriz de treino float32 carregada uma única vez e compartilhada via memmap
+    feature_names = list(FeaturePipeline.output_columns)
+    with etapa('train.load_matrix') as span:
+        X_matrix, y_vector = carregar_matriz_treino(
+            data_path, feature_names, 'isFraud', cache_dir=os.path.dirname(data_path)
+        )
+        span.rows = len(y_vector)
+
+    X = pd.DataFrame(X_matrix, columns=feature_names, copy=False)
+    y = pd.Series(y_vector, name='isFraud', copy=False)
+    scale_pos_weight = (y==0).sum()/(y==1).sum()
+
+    # Cria a pasta para salvar os gráficos, se não existir
+    os.makedirs(plots_dir, exist_ok=True)
+
+    # Paralelismo da validação cruzada (configurável via variáveis de ambiente / .env)
+    n_workers = int(os.environ.get('TRAIN_WORKERS', 1))
+    threads_per_job = os.environ.get('TRAIN_THREADS_PER_JOB')
+    threads_per_job = int(threads_per_job) if threads_per_job else None
+    # Limiar de decisão opcional sobre P(fraude); sem valor, reproduz o predict() de cada modelo
+    threshold = os.environ.get('TRAIN_THRESHOLD')
+    threshold = float(threshold) if threshold else None
+
+    # Resumo dos resultados de cada modelo (matriz de confusão, curvas reduzidas e importâncias)
+    from src.visualization.report_results import ReportResults, FIGURAS_TREINO
+    report = ReportResults(feature_names=feature_names, figures=FIGURAS_TREINO, top_n=10)
+
+    # Busca de hiperparâmetros (successive halving) para XGBoost e LightGBM; retomável via SQLite.
+    # A busca usa só uma fatia das linhas e a validação cruzada compara os modelos no restante
+    tuned = {}
+    X_cv, y_cv = X_matrix, y_vector
+    if env_flag('TRAIN_SEARCH'):
+        from src.models.hyperparameter_search import FRACAO_BUSCA, executar_busca, separar_linhas_busca
+        search_idx, cv_idx = separar_linhas_busca(
+            y_vector, float(os.environ.get('TRAIN_SEARCH_FRACTION', FRACAO_BUSCA))
+        )
+        X_search, y_search = X_matrix[search_idx], y_vector[search_idx]
+        print(f"\nBuscando hiperparâmetros do XGBoost e do LightGBM em {len(search_idx)} linhas "
+              f"fora da validação cruzada")
+        for name in ('XGBoost', 'LightGBM'):
+            with etapa(f'train.search.{name}', rows=len(y_search)):
+                tuned[name] = executar_busca(
+                    name, X_search, y_search, n_configs=int(os.environ.get('TRAIN_SEARCH_CONFIGS', 27)),
+                    n_workers=n_workers, threads_per_job=threads_per_job
+                )
+            print(f"{name}: PR-AUC {tuned[name]['pr_auc']:.4f} com n_estimators={tuned[name]['n_estimators']} "
+                  f"e {tuned[name]['params']}")
+        del X_search, y_search
+        X_cv, y_cv = X_matrix[cv_idx], y_vector[cv_idx]
+
+    # Executando modelos
+    print("\nAvaliando e Gerando Gráficos para os Modelos")
+    models = build_models(scale_pos_weight, tuned)
+
+    print(f"Executando validação cruzada com {n_workers} worker(s) em {len(y_cv)} linhas...")
+    with etapa('train.cross_validation', rows=len(y_cv)):
+        cv_results = executar_validacao_cruzada(
+            models, X_cv, y_cv, n_splits=5, n_workers=n_workers,
+            threads_per_job=threads_per_job, threshold=threshold
+        )
+        for name, result in cv_results.items():
+            registrar_folds(name, result['timings'])
+    del X_cv, y_cv
+
+    for name, result in cv_results.items():
+        print(f"### {name} ###")
+        print_fold_timings(result['timings'])
+        print_cv_metrics(result['metrics'])
+        y_true, y_pred, y_proba = result['y_true'], result['y_pred'], result['y_proba']
+
+        roc, pr = None, None
+        if y_proba.size > 0:
+            fpr, tpr, _ = roc_curve(y_true, y_proba)
+            roc = (fpr, tpr, auc(fpr, tpr))
+
+            precision, recall, _ = precision_recall_curve(y_true, y_proba)
+            pr = (precision, recall, average_precision_score(y_true, y_proba))
+
+        # As importâncias são as do modelo ajustado no último fold
+        report.adicionar(name, confusion_matrix(y_true, y_pred), roc=roc, precision_recall=pr,
+                         importances=result['importances'])
+
+    print("Todos os modelos avaliados. Gerando gráficos finais.")
+
+    with etapa('train.reports'):
+        # O resumo é gravado para que os relatórios possam ser refeitos sem retreinar
+        report.salvar(results_path)
+        # Os quatro gráficos são desenhados sem janela (PNG/SVG + JSON com os dados)
+        report.renderizar(plots_dir)
+
+    # Salvando modelo com melhor performance
+    print("\nTreinando e salvando o modelo de melhor desempenho (XGBoost)")
+    from src.models.model_bundle import bundle_path, hash_dados, salvar_bundle
+    # Com TRAIN_FULL_DATA o modelo final é treinado out-of-core em todas as linhas do dataset bruto
+    full_data = env_flag('TRAIN_FULL_DATA')
+    with etapa('train.final_fit') as span:
+        start = time.perf_counter()
+        if full_data:
+            from src.data.loader import caminho_dados_brutos
+            from src.models.out_of_core import treinar_xgboost_out_of_core
+            full_data_path = caminho_dados_brutos(project_dir)
+            print(f"Treinando o modelo final out-of-core em: {full_data_path}")
+            best_model, data_info = treinar_xgboost_out_of_core(
+                full_data_path, tuned=tuned.get('XGBoost'),
+                chunksize=int(os.environ.get('TRAIN_CHUNK_SIZE', 500000)),
+                external_memory=env_flag('TRAIN_EXTERNAL_MEMORY')
+            )
+        else:
+            best_model = build_best_model(scale_pos_weight, tuned.get('XGBoost'))
+            print("Treinando o modelo final...")
+            best_model.fit(X, y)
+            data_info = {
+                'n_samples': int(len(y_vector)),
+                'n_positives': int(y_vector.sum()),
+                'scale_pos_weight': float(scale_pos_weight),
+                'data_hash': hash_dados(X_matrix, y_vector),
+                # Watermark do retreino incremental: último step visto no treino
+                'last_step': int(np.nanmax(X_matrix[:, feature_names.index('step')])),
+            }
+        span.rows = data_info['n_samples']
+    print(f"Treinamento concluído em {time.perf_counter() - start:.2f}s "
+          f"({data_info['n_samples']} linhas, pico de RSS do processo {peak_rss_mb():.1f} MB).")
+    with etapa('train.save'):
+        print(f"Salvando o modelo em: {model_path}")
+        joblib.dump(best_model, model_path)
+        print("Modelo salvo com sucesso.")
+
+        # Bundle versionado: booster nativo, árvores compiladas, dicionário de contas do
+        # build_features (mesmos IDs na pontuação) e manifesto com schema e hash dos dados
+        print(f"Salvando o bundle do modelo em: {bundle_path}")
+        salvar_bundle(
+            best_model, bundle_path, threshold=threshold,
+            data_hash=data_info.pop('data_hash'),
+            encoder=AccountEncoder.carregar(accounts_path) if os.path.exists(accounts_path) else None,
+            metadata={
+                **data_info,
+                'training_mode': 'full_out_of_core' if full_data else 'sample',
+                # Tipos com fraude no treino: lista usada pelo pré-filtro do predict/serve
+                'fraud_types': tipos_com_fraude(X_matrix, y_vector),
+                'hyperparameter_search': {
+                    key: tuned['XGBoost'][key] for key in ('search_id', 'params', 'n_estimators', 'pr_auc')
+                } if 'XGBoost' in tuned else None,
+                'feature_importances': dict(zip(feature_names, map(float, best_model.feature_importances_))),
+                'cv_metrics': {
+                    name: {key: float(np.mean([m[key] for m in result['metrics']])) for key in result['metrics'][0]}
+                    for name, result in cv_results.items()
+                },
+            }
+        )
+
+def training_inputs(cache):
+    """
+    Entradas que determinam os artefatos do treino, usadas como chave no cache de estágios:
+    features, código, configuração TRAIN_* que altera o resultado e versões das bibliotecas.
+    """
+    from importlib.metadata import version
+
+    full_data = env_flag('TRAIN_FULL_DATA')
+    inputs = {
+        'features': cache.impressao_digital(data_path),
+        'accounts': cache.impressao_digital(accounts_path) if os.path.exists(accounts_path) else None,
+        'code': cache.versao_codigo(
+            'src.models.train_model', 'src.models.cv_engine', 'src.models.scoring',
+            'src.models.hyperparameter_search', 'src.models.out_of_core',
+            'src.models.model_bundle', 'src.models.compiled_predictor',
+            'src.features.build_features', 'src.features.entity_features', 'src.features.account_encoder',
+            'src.features.feature_store', 'src.data.loader',
+            'src.visualization.visualize', 'src.visualization.report_results', 'src.visualization.curves'
+        ),
+        'env': {name: os.environ.get(name) for name in (
+            'TRAIN_THRESHOLD', 'TRAIN_SEARCH', 'TRAIN_SEARCH_CONFIGS', 'TRAIN_SEARCH_FRACTION',
+            'TRAIN_FULL_DATA', 'TRAIN_EXTERNAL_MEMORY', 'TRAIN_CHUNK_SIZE', 'REPORT_FORMATS', 'REPORT_CURVE_POINTS'
+        )},
+        'libraries': {lib: version(lib) for lib in ('xgboost', 'lightgbm', 'scikit-learn', 'numpy')},
+    }
+    if full_data:
+        from src.data.loader import caminho_dados_brutos
+        inputs['raw'] = cache.impressao_digital(caminho_dados_brutos(project_dir))
+    return inputs
+
+def main():
+    from src.models.model_bundle import bundle_path
+    from src.utils.stage_cache import StageCache, executar_com_cache
+    from src.visualization.curves import FORMATOS
+    from src.visualization.report_results import FIGURAS_TREINO
+
+    if not os.path.exists(data_path):
+        raise FileNotFoundError(f"O arquivo não foi encontrado: {data_path}")
+
+    # Com as mesmas entradas, modelo, bundle e gráficos são restaurados em vez de retreinados.
+    # Cada gráfico é gravado em cada formato de REPORT_FORMATS e com um JSON dos dados
+    cache = StageCache()
+    outputs = {'model': model_path, 'bundle': bundle_path, 'results': results_path}
+    for figure in FIGURAS_TREINO.values():
+        base = os.path.splitext(figure)[0]
+        for ext in (*FORMATOS, 'json'):
+            outputs[f'{base}.{ext}'] = os.path.join(plots_dir, f'{base}.{ext}')
+    # Tempos, linhas e memória de cada fase vão para reports/traces/train-<data>.json
+    with rastrear('train'):
+        if executar_com_cache('train', training_inputs(cache), outputs, run_training, cache):
+            print("Entradas do treino inalteradas: modelo, bundle e gráficos restaurados do cache de estágios.")
+
+if __name__ == '__main__':
+    main()
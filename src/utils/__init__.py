@@ -0,0 +1,8 @@
+from .accumulator import ArrayAccumulator
+from .instrumentation import contar, cronometrado, etapa, iterar_com_etapa, rastrear, registrar
+from .memory import peak_rss_mb
+
+__all__ = [
+    'ArrayAccumulator', 'contar', 'cronometrado', 'etapa', 'iterar_com_etapa', 'rastrear', 'registrar',
+    'peak_rss_mb',
+]
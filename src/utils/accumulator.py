@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+
+
+class ArrayAccumulator:
+    """
+    Acumula resultados (rótulos, previsões, probabilidades) em um array NumPy
+    tipado que cresce por duplicação, em vez de listas Python com `.extend`.
+    Com spill_path o buffer é um memmap em disco, útil para o dataset completo.
+    """
+
+    def __init__(self, dtype, capacity=1024, spill_path=None):
+        self.dtype = np.dtype(dtype)
+        self.spill_path = spill_path
+        self._size = 0
+        self._buffer = None
+        self._alocar(max(1, int(capacity)))
+
+    def _alocar(self, capacity):
+        if self.spill_path is not None:
+            if self._buffer is not None:
+                self._buffer.flush()
+                # O mapeamento antigo precisa ser liberado antes de redimensionar o arquivo
+                self._buffer = None
+            mode = 'r+b' if os.path.exists(self.spill_path) and self._size else 'w+b'
+            with open(self.spill_path, mode) as f:
+                f.truncate(capacity * self.dtype.itemsize)
+            self._buffer = np.memmap(self.spill_path, dtype=self.dtype, mode='r+',
+                                     shape=(capacity,))
+        else:
+            buffer = np.empty(capacity, dtype=self.dtype)
+            if self._buffer is not None:
+                buffer[:self._size] = self._buffer[:self._size]
+            self._buffer = buffer
+
+    def extend(self, values):
+        values = np.asarray(values)
+        end = self._size + len(values)
+        if end > len(self._buffer):
+            self._alocar(max(end, 2 * len(self._buffer)))
+        self._buffer[self._size:end] = values
+        self._size = end
+
+    def __len__(self):
+        return self._size
+
+    def to_numpy(self):
+        """
+        Retorna uma view (sem cópia) dos valores acumulados.
+        """
+        return self._buffer[:self._size]
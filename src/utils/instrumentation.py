@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from src.utils.memory import peak_rss_mb
+
+project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+trace_dir = os.environ.get('TRACE_DIR', os.path.join(project_dir, 'reports', 'traces'))
+
+
+def _env_flag(name):
+    return os.environ.get(name, '').strip().lower() in ('1', 'true', 'yes')
+
+
+class Span:
+    """
+    Uma etapa em andamento. `rows` pode ser definido dentro do bloco quando o
+    número de linhas só é conhecido no fim; contar() soma contadores da etapa.
+    """
+
+    __slots__ = ('name', 'parent', 'rows', 'counters', '_wall', '_cpu', '_traced_peak')
+
+    def __init__(self, name, parent, rows):
+        self.name = name
+        self.parent = parent
+        self.rows = rows
+        self.counters = {}
+        self._traced_peak = 0
+
+    def contar(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+
+class Tracer:
+    """
+    Registro das etapas de uma execução (make_dataset, build_features, train,
+    predict): tempo de parede, tempo de CPU do processo, linhas processadas,
+    pico de RSS do processo ao fim da etapa e contadores. Etapas podem ser
+    aninhadas; a pilha é por thread, então etapas abertas nas threads de
+    leitura/inferência do predict ficam com o nome da thread em vez de um pai.
+
+    Opcionalmente (TRACE_PROFILE=1) a execução roda sob cProfile (que só
+    observa a thread principal; o .prof é gravado ao lado do trace) e
+    (TRACE_MEMORY=1) sob tracemalloc, que acrescenta o pico de memória alocada
+    pelo Python em cada etapa e os maiores pontos de alocação.
+    """
+
+    def __init__(self, run, profile=False, memory=False):
+        self.run = run
+        self.profile = profile
+        self.memory = memory
+        self.started_at = datetime.now()
+        self.events = []
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiler = None
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+
+    def _pilha(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def iniciar(self):
+        if self.memory:
+            import tracemalloc
+            tracemalloc.start()
+        if self.profile:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    @contextmanager
+    def etapa(self, name, rows=None):
+        stack = self._pilha()
+        parent = stack[-1] if stack else None
+        span = Span(name, parent.name if parent else threading.current_thread().name, rows)
+        if self.memory:
+            import tracemalloc
+            # O pico do tracemalloc é global: o que foi medido até aqui pertence à etapa pai
+            if parent is not None:
+                parent._traced_peak = max(parent._traced_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        stack.append(span)
+        span._wall, span._cpu = time.perf_counter(), time.process_time()
+        try:
+            yield span
+        finally:
+            wall, cpu = time.perf_counter() - span._wall, time.process_time() - span._cpu
+            stack.pop()
+            event = {'stage': name, 'parent': span.parent, 'wall_s': wall, 'cpu_s': cpu,
+                     'rows': span.rows, 'peak_rss_mb': peak_rss_mb()}
+            if span.counters:
+                event['counters'] = span.counters
+            if self.memory:
+                import tracemalloc
+                peak = max(span._traced_peak, tracemalloc.get_traced_memory()[1])
+                event['traced_peak_mb'] = peak / 2 ** 20
+                if parent is not None:
+                    parent._traced_peak = max(parent._traced_peak, peak)
+                tracemalloc.reset_peak()
+            self.registrar(**event)
+
+    def registrar(self, stage, wall_s, cpu_s=None, rows=None, parent=None, **extra):
+        """
+        Registra uma etapa medida em outro lugar (ex.: os folds da validação
+        cruzada, que rodam em processos do pool e devolvem os próprios tempos).
+        Sem `parent`, o pai é a etapa aberta na thread atual.
+        """
+        if parent is None:
+            stack = self._pilha()
+            parent = stack[-1].name if stack else threading.current_thread().name
+        event = {'stage': stage, 'parent': parent, 'wall_s': wall_s, 'cpu_s': cpu_s, 'rows': rows, **extra}
+        with self._lock:
+            self.events.append(event)
+
+    def contar(self, name, n=1):
+        stack = self._pilha()
+        if stack:
+            stack[-1].contar(name, n)
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def resumo(self):
+        """
+        Agrega os eventos por etapa: chamadas, tempos somados, linhas e linhas/s.
+        """
+        summary = {}
+        for event in self.events:
+            s = summary.setdefault(event['stage'], {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'rows': 0})
+            s['calls'] += 1
+            s['wall_s'] += event['wall_s']
+            s['cpu_s'] += event['cpu_s'] or 0.0
+            s['rows'] += event['rows'] or 0
+            if event.get('peak_rss_mb') is not None:
+                s['peak_rss_mb'] = max(s.get('peak_rss_mb', 0.0), event['peak_rss_mb'])
+        for s in summary.values():
+            s['rows_per_sec'] = s['rows'] / s['wall_s'] if s['rows'] and s['wall_s'] > 0 else None
+        return summary
+
+    def finalizar(self, output_dir=None):
+        """
+        Encerra a captura e grava o trace JSON (e o .prof do cProfile, se ativo).
+        Retorna o caminho do trace.
+        """
+        output_dir = output_dir or trace_dir
+        os.makedirs(output_dir, exist_ok=True)
+        base = os.path.join(output_dir, f"{self.run}-{self.started_at.strftime('%Y%m%d-%H%M%S')}")
+        trace = {
+            'run': self.run,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'pid': os.getpid(),
+            'wall_s': time.perf_counter() - self._start_wall,
+            'cpu_s': time.process_time() - self._start_cpu,
+            'peak_rss_mb': peak_rss_mb(),
+            'counters': self.counters,
+            'summary': self.resumo(),
+            'events': self.events,
+        }
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(f'{base}.prof')
+            trace['profile'] = f'{base}.prof'
+        if self.memory:
+            import tracemalloc
+            top = tracemalloc.take_snapshot().statistics('lineno')[:10]
+            trace['top_allocations'] = [{'where': str(stat.traceback), 'size_mb': stat.size / 2 ** 20,
+                                         'count': stat.count} for stat in top]
+            tracemalloc.stop()
+
+        tmp_path = f'{base}.json.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(trace, f, indent=2, ensure_ascii=False, default=str)
+        os.replace(tmp_path, f'{base}.json')
+        return f'{base}.json'
+
+
+# Tracer ativo do processo; sem ele etapa/contar/cronometrado não fazem nada
+_tracer = None
+
+
+@contextmanager
+def rastrear(run, output_dir=None):
+    """
+    Ativa o tracer durante o bloco e grava o trace ao sair, mesmo em caso de erro.
+    TRACE=0 desliga a gravação; TRACE_PROFILE e TRACE_MEMORY ligam cProfile e tracemalloc.
+    """
+    global _tracer
+    if os.environ.get('TRACE', '1').strip().lower() in ('0', 'off', 'false', 'no') or _tracer is not None:
+        yield _tracer
+        return
+    _tracer = Tracer(run, profile=_env_flag('TRACE_PROFILE'), memory=_env_flag('TRACE_MEMORY')).iniciar()
+    try:
+        with _tracer.etapa(run):
+            yield _tracer
+    finally:
+        tracer, _tracer = _tracer, None
+        path = tracer.finalizar(output_dir)
+        print(f'Trace de {run} gravado em {path}')
+
+
+@contextmanager
+def _nulo():
+    yield Span(None, None, None)
+
+
+def etapa(name, rows=None):
+    """
+    Context manager que mede uma etapa no tracer ativo:
+        with etapa('features.transform', rows=len(df)) as span: ...
+    """
+    return _tracer.etapa(name, rows) if _tracer is not None else _nulo()
+
+
+def registrar(stage, wall_s, **kwargs):
+    if _tracer is not None:
+        _tracer.registrar(stage, wall_s, **kwargs)
+
+
+def contar(name, n=1):
+    if _tracer is not None:
+        _tracer.contar(name, n)
+
+
+def cronometrado(name=None):
+    """
+    Decorador que mede cada chamada da função como uma etapa.
+    """
+    def decorador(fn):
+        stage = name or f'{fn.__module__}.{fn.__qualname__}'
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with etapa(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorador
+
+
+def iterar_com_etapa(name, iterable):
+    """
+    Mede o tempo de produzir cada item de um iterador (ex.: leitura de chunks),
+    com as linhas do item quando ele tem len().
+    """
+    if _tracer is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        registrar(name, time.perf_counter() - wall, cpu_s=time.process_time() - cpu,
+                  rows=len(item) if hasattr(item, '__len__') else None, peak_rss_mb=peak_rss_mb())
+        yield item
@@ -0,0 +1,23 @@
+import sys
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    """
+    Retorna o pico de memória residente (RSS) do processo atual em MB.
+    Usa `resource` quando disponível e recorre ao psutil no Windows.
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # No macOS o valor vem em bytes; no Linux, em KB
+        if sys.platform == 'darwin':
+            return peak / (1024 ** 2)
+        return peak / 1024
+
+    import psutil
+    info = psutil.Process().memory_info()
+    return getattr(info, 'peak_wset', info.rss) / (1024 ** 2)
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+
+import click
+
+from src.utils.instrumentation import contar
+
+project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+cache_dir = os.environ.get('STAGE_CACHE_DIR', os.path.join(project_dir, '.cache', 'stages'))
+ENTRY_NAME = 'entry.json'
+ARTIFACTS_DIR = 'artifacts'
+
+
+def cache_habilitado():
+    """
+    O cache de estágios pode ser desligado com STAGE_CACHE=0 (ou off/false).
+    """
+    return os.environ.get('STAGE_CACHE', '1').strip().lower() not in ('0', 'off', 'false', 'no')
+
+
+def _sha256_arquivo(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _arquivos(path):
+    if os.path.isfile(path):
+        return [path]
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def _tamanho(path):
+    return sum(os.path.getsize(f) for f in _arquivos(path))
+
+
+def _copiar(src, dst):
+    # shutil.copy (sem copy2): o artefato restaurado recebe um mtime novo, então quem
+    # compara datas com ele (e o memo de impressões digitais) o vê como alterado
+    if os.path.isdir(dst):
+        shutil.rmtree(dst)
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    if os.path.isdir(src):
+        shutil.copytree(src, dst, copy_function=shutil.copy)
+    else:
+        shutil.copy(src, dst)
+
+
+class StageCache:
+    """
+    Cache endereçado por conteúdo para os estágios do pipeline
+    (amostra → features → modelos). A chave de um estágio é o hash das suas
+    entradas: impressões digitais dos arquivos lidos, parâmetros e versão do
+    código. Os artefatos ficam em <root>/<estágio>/<chave>/ com um entry.json
+    descrevendo entradas, tamanho e datas de criação e de último uso.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or cache_dir
+        self._fingerprints_path = os.path.join(self.root, 'fingerprints.json')
+        self._fingerprints = None
+
+    def _memo(self):
+        if self._fingerprints is None:
+            try:
+                with open(self._fingerprints_path, encoding='utf-8') as f:
+                    self._fingerprints = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._fingerprints = {}
+        return self._fingerprints
+
+    def impressao_digital(self, path):
+        """
+        SHA-256 do conteúdo de um arquivo ou diretório (ex.: dataset parquet particionado).
+        O hash de cada arquivo é memorizado por (tamanho, mtime), então arquivos
+        inalterados não são relidos.
+        """
+        memo = self._memo()
+        digest = hashlib.sha256()
+        changed = False
+        for file_path in _arquivos(path):
+            stat = os.stat(file_path)
+            abs_path = os.path.abspath(file_path)
+            cached = memo.get(abs_path)
+            if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+                file_hash = cached[2]
+            else:
+                file_hash = _sha256_arquivo(file_path)
+                memo[abs_path] = [stat.st_size, stat.st_mtime_ns, file_hash]
+                changed = True
+            digest.update(os.path.relpath(file_path, path).encode())
+            digest.update(file_hash.encode())
+        if changed:
+            os.makedirs(self.root, exist_ok=True)
+            with open(self._fingerprints_path, 'w', encoding='utf-8') as f:
+                json.dump(memo, f)
+        return digest.hexdigest()
+
+    @staticmethod
+    def versao_codigo(*modules):
+        """
+        Hash do código-fonte dos módulos do projeto (ex.: 'src.features.build_features').
+        Os arquivos são lidos diretamente, sem importar os módulos nem seus pacotes.
+        """
+        digest = hashlib.sha256()
+        for name in modules:
+            with open(os.path.join(project_dir, *name.split('.')) + '.py', 'rb') as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    @staticmethod
+    def chave(stage, inputs):
+        payload = json.dumps({'stage': stage, 'inputs': inputs}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _entrada(self, stage, key):
+        return os.path.join(self.root, stage, key)
+
+    def restaurar(self, stage, key, outputs):
+        """
+        Copia os artefatos da entrada (stage, key) para os caminhos de `outputs`
+        ({nome: caminho}). Retorna False se a entrada não existe ou está incompleta.
+        """
+        entry_dir = self._entrada(stage, key)
+        entry_path = os.path.join(entry_dir, ENTRY_NAME)
+        if not os.path.exists(entry_path):
+            return False
+        with open(entry_path, encoding='utf-8') as f:
+            entry = json.load(f)
+        if set(entry['outputs']) != set(outputs):
+            return False
+
+        for name, path in outputs.items():
+            _copiar(os.path.join(entry_dir, ARTIFACTS_DIR, name), path)
+        entry['last_used'] = time.time()
+        entry['hits'] = entry.get('hits', 0) + 1
+        with open(entry_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, indent=2)
+        return True
+
+    def salvar(self, stage, key, outputs, inputs):
+        """
+        Guarda cópias dos artefatos de `outputs` sob (stage, key). A entrada só
+        passa a existir quando o entry.json é gravado, ao final da cópia.
+        """
+        entry_dir = self._entrada(stage, key)
+        tmp_dir = f'{entry_dir}.tmp-{os.getpid()}'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        for name, path in outputs.items():
+            _copiar(path, os.path.join(tmp_dir, ARTIFACTS_DIR, name))
+
+        now = time.time()
+        entry = {
+            'stage': stage,
+            'key': key,
+            'inputs': inputs,
+            'outputs': {name: os.path.relpath(os.path.abspath(path), project_dir) for name, path in outputs.items()},
+            'size_bytes': _tamanho(tmp_dir),
+            'created': now,
+            'last_used': now,
+            'hits': 0,
+        }
+        with open(os.path.join(tmp_dir, ENTRY_NAME), 'w', encoding='utf-8') as f:
+            json.dump(entry, f, indent=2, default=str)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+        return entry
+
+    def listar(self, stage=None):
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for stage_name in sorted(os.listdir(self.root)):
+            stage_dir = os.path.join(self.root, stage_name)
+            if not os.path.isdir(stage_dir) or (stage and stage_name != stage):
+                continue
+            for key in os.listdir(stage_dir):
+                entry_path = os.path.join(stage_dir, key, ENTRY_NAME)
+                if os.path.exists(entry_path):
+                    with open(entry_path, encoding='utf-8') as f:
+                        entries.append(json.load(f))
+        return sorted(entries, key=lambda e: e['last_used'], reverse=True)
+
+    def remover(self, stage, key):
+        shutil.rmtree(self._entrada(stage, key), ignore_errors=True)
+
+    def evict(self, max_bytes=None, max_age_s=None, stage=None):
+        """
+        Remove entradas sem uso há mais de max_age_s segundos e, depois, as menos
+        recentemente usadas até o total ficar abaixo de max_bytes.
+        Retorna a lista de entradas removidas.
+        """
+        entries = self.listar(stage)
+        removed = []
+        now = time.time()
+        if max_age_s is not None:
+            for entry in [e for e in entries if now - e['last_used'] > max_age_s]:
+                self.remover(entry['stage'], entry['key'])
+                entries.remove(entry)
+                removed.append(entry)
+        if max_bytes is not None:
+            total = sum(e['size_bytes'] for e in entries)
+            while entries and total > max_bytes:
+                entry = entries.pop()
+                self.remover(entry['stage'], entry['key'])
+                total -= entry['size_bytes']
+                removed.append(entry)
+        return removed
+
+
+def executar_com_cache(stage, inputs, outputs, compute, cache=None):
+    """
+    Executa um estágio com cache: se a chave das entradas já existe, restaura os
+    artefatos em `outputs` e não chama `compute`; senão executa `compute()` e
+    guarda os artefatos. Retorna True quando o resultado veio do cache.
+    """
+    if not cache_habilitado():
+        compute()
+        return False
+    cache = cache or StageCache()
+    key = cache.chave(stage, inputs)
+    if cache.restaurar(stage, key, outputs):
+        contar(f'stage_cache.{stage}.hit')
+        return True
+    contar(f'stage_cache.{stage}.miss')
+    compute()
+    cache.salvar(stage, key, outputs, inputs)
+    return False
+
+
+_UNIDADES = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+_DURACOES = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def _bytes(value):
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMG]?)B?\s*', value.upper())
+    if not match:
+        raise click.BadParameter(f'Tamanho inválido: {value} (use, por exemplo, 500M ou 2G)')
+    return int(float(match.group(1)) * _UNIDADES[match.group(2)])
+
+
+def _segundos(value):
+    match = re.fullmatch(r'\s*([\d.]+)\s*([smhd])\s*', value.lower())
+    if not match:
+        raise click.BadParameter(f'Duração inválida: {value} (use, por exemplo, 12h ou 7d)')
+    return float(match.group(1)) * _DURACOES[match.group(2)]
+
+
+def _formatar_tamanho(n):
+    for unit in ('B', 'KB', 'MB'):
+        if n < 1024:
+            return f'{n:.1f} {unit}'
+        n /= 1024
+    return f'{n:.1f} GB'
+
+
+def _data(ts):
+    return time.strftime('%Y-%m-%d %H:%M', time.localtime(ts))
+
+
+@click.group()
+def main():
+    """ Lists, inspects and evicts pipeline stage cache entries. """
+
+
+@main.command('list')
+@click.option('--stage', default = None, help = 'Filtra por estágio')
+def listar_entradas(stage):
+    entries = StageCache().listar(stage)
+    if not entries:
+        print('Cache de estágios vazio.')
+        return
+    print(f"{'estágio':<10} {'chave':<14} {'tamanho':>10} {'criado':>17} {'último uso':>17} {'hits':>5}")
+    for e in entries:
+        print(f"{e['stage']:<10} {e['key'][:12]:<14} {_formatar_tamanho(e['size_bytes']):>10} "
+              f"{_data(e['created']):>17} {_data(e['last_used']):>17} {e['hits']:>5}")
+    print(f"Total: {len(entries)} entrada(s), {_formatar_tamanho(sum(e['size_bytes'] for e in entries))}")
+
+
+@main.command('inspect')
+@click.argument('key_prefix')
+def inspecionar(key_prefix):
+    matches = [e for e in StageCache().listar() if e['key'].startswith(key_prefix)]
+    if len(matches) != 1:
+        raise click.ClickException(f'{len(matches)} entradas com o prefixo {key_prefix}.')
+    print(json.dumps(matches[0], indent=2, ensure_ascii=False))
+
+
+@main.command('evict')
+@click.option('--max-size', default = None, help = 'Tamanho máximo do cache após a limpeza (ex.: 2G)')
+@click.option('--older-than', default = None, help = 'Remove entradas sem uso há mais que (ex.: 7d, 12h)')
+@click.option('--stage', default = None, help = 'Restringe a limpeza a um estágio')
+@click.option('--key', 'key_prefix', default = None, help = 'Remove a entrada com este prefixo de chave')
+def remover_entradas(max_size, older_than, stage, key_prefix):
+    cache = StageCache()
+    if key_prefix:
+        removed = [e for e in cache.listar(stage) if e['key'].startswith(key_prefix)]
+        for e in removed:
+            cache.remover(e['stage'], e['key'])
+    elif max_size is None and older_than is None:
+        raise click.UsageError('Informe --max-size, --older-than ou --key.')
+    else:
+        removed = cache.evict(
+            max_bytes=_bytes(max_size) if max_size else None,
+            max_age_s=_segundos(older_than) if older_than else None,
+            stage=stage,
+        )
+    for e in removed:
+        print(f"Removido: {e['stage']} {e['key'][:12]} ({_formatar_tamanho(e['size_bytes'])})")
+    print(f'{len(removed)} entrada(s) removida(s).')
+
+
+if __name__ == '__main__':
+    main()
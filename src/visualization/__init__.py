@@ -1 +1,18 @@
-from .visualize import plot_multiple_confusion_matrices, plot_precision_recall_comparison, plot_multiple_feature_importances, plot_roc_comparison
\ No newline at end of file
+from .curves import MAX_PONTOS_CURVA, reduzir_curva
+from .report_results import FIGURAS_PREDICAO, FIGURAS_TREINO, ReportResults
+
+# Funções de plot carregadas sob demanda: importar o pacote (ex.: para ler um
+# ReportResults) não carrega matplotlib/seaborn
+_VISUALIZE = (
+    'plot_multiple_confusion_matrices', 'plot_precision_recall_comparison',
+    'plot_multiple_feature_importances', 'plot_roc_comparison', 'renderizar_graficos'
+)
+
+__all__ = ['MAX_PONTOS_CURVA', 'reduzir_curva', 'FIGURAS_PREDICAO', 'FIGURAS_TREINO', 'ReportResults', *_VISUALIZE]
+
+
+def __getattr__(name):
+    if name in _VISUALIZE:
+        from . import visualize
+        return getattr(visualize, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
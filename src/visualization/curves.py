@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+
+# Pontos máximos por curva ROC/PR nos gráficos e no JSON
+MAX_PONTOS_CURVA = int(os.environ.get('REPORT_CURVE_POINTS', 1000))
+# Formatos de imagem gravados (png e/ou svg); o JSON com os dados é sempre gravado
+FORMATOS = tuple(f.strip() for f in os.environ.get('REPORT_FORMATS', 'png').split(',') if f.strip())
+
+
+def reduzir_curva(x, y, max_points=MAX_PONTOS_CURVA):
+    """
+    Reduz uma curva a no máximo `max_points` pontos preservando o formato
+    (Largest-Triangle-Three-Buckets): os pontos interiores são divididos em
+    baldes e de cada balde fica o ponto que forma o maior triângulo com o ponto
+    escolhido no balde anterior e a média do balde seguinte. O primeiro e o
+    último ponto são sempre mantidos.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if max_points is None or n <= max_points or max_points < 3:
+        return x, y
+
+    n_buckets = max_points - 2
+    edges = np.linspace(1, n - 1, n_buckets + 1).astype(np.int64)
+    keep = np.empty(max_points, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_buckets):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i + 1 < n_buckets:
+            next_start, next_end = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+            avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return x[keep], y[keep]
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+import click
+import numpy as np
+
+from src.visualization.curves import MAX_PONTOS_CURVA, reduzir_curva
+
+project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+train_results_path = os.path.join(project_dir, 'reports', 'train_results.json')
+predict_results_path = os.path.join(project_dir, 'reports', 'predict_results.json')
+figures_dir = os.path.join(project_dir, 'reports', 'figures')
+
+# Nome do arquivo de cada gráfico gerado pelo treino e pela previsão
+FIGURAS_TREINO = {
+    'confusion_matrix': 'all_confusion_matrices.png',
+    'feature_importances': 'all_feature_importances.png',
+    'roc': 'roc_comparison.png',
+    'precision_recall': 'pr_comparison.png',
+}
+FIGURAS_PREDICAO = {
+    'confusion_matrix': 'predict_confusion_matrix.png',
+    'feature_importances': 'predict_feature_importances.png',
+    'roc': 'predict_roc_curve.png',
+    'precision_recall': 'predict_precision_recall_curve.png',
+}
+VERSAO = 1
+
+
+class ReportResults:
+    """
+    Resumo serializável dos resultados de avaliação, com tudo o que os
+    gráficos precisam e nada proporcional ao número de linhas: matriz de
+    confusão 2x2, curvas ROC e Precision-Recall reduzidas a no máximo
+    `max_points` pontos, áreas calculadas sobre as curvas completas e
+    importâncias das features por modelo.
+
+    O treino e a previsão gravam o resumo em JSON ao lado dos gráficos, e os
+    relatórios podem ser refeitos a partir dele sem retreinar nem repontuar.
+    """
+
+    def __init__(self, class_names=('Não Fraude', 'Fraude'), feature_names=(), figures=None,
+                 top_n=10, max_points=None):
+        self.class_names = list(class_names)
+        self.feature_names = list(feature_names)
+        self.figures = dict(figures or FIGURAS_TREINO)
+        self.top_n = top_n
+        self.max_points = max_points or MAX_PONTOS_CURVA
+        self.models = {}
+
+    def adicionar(self, name, conf_matrix, roc=None, precision_recall=None, importances=None):
+        """
+        Registra os resultados de um modelo. `roc` é (fpr, tpr, auc) e
+        `precision_recall` é (precision, recall, average_precision), como
+        retornados pelo sklearn ou pelo StreamingMetrics; as curvas são
+        reduzidas aqui e só o resumo é guardado.
+        """
+        result = {'confusion_matrix': np.asarray(conf_matrix).astype(int).tolist()}
+        if roc is not None:
+            fpr, tpr, roc_auc = roc
+            fpr, tpr = reduzir_curva(fpr, tpr, self.max_points)
+            result['roc'] = {'fpr': fpr.tolist(), 'tpr': tpr.tolist(), 'auc': float(roc_auc)}
+        if precision_recall is not None:
+            precision, recall, avg_precision = precision_recall
+            recall, precision = reduzir_curva(recall, precision, self.max_points)
+            result['precision_recall'] = {'precision': precision.tolist(), 'recall': recall.tolist(),
+                                          'average_precision': float(avg_precision)}
+        result['importances'] = None if importances is None else np.asarray(importances, dtype=float).tolist()
+        self.models[name] = result
+        return self
+
+    def adicionar_metricas(self, name, metrics, importances=None):
+        """
+        Registra os resultados de um StreamingMetrics já acumulado.
+        """
+        fpr, tpr, _ = metrics.roc_curve()
+        precision, recall, _ = metrics.precision_recall_curve()
+        return self.adicionar(name, metrics.conf_matrix, roc=(fpr, tpr, metrics.roc_auc()),
+                              precision_recall=(precision, recall, metrics.average_precision()),
+                              importances=importances)
+
+    def to_dict(self):
+        return {
+            'version': VERSAO,
+            'class_names': self.class_names,
+            'feature_names': self.feature_names,
+            'figures': self.figures,
+            'top_n': self.top_n,
+            'max_points': self.max_points,
+            'models': self.models,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != VERSAO:
+            raise ValueError(f"Versão de resultados não suportada: {data.get('version')} (esperada {VERSAO})")
+        results = cls(data['class_names'], data['feature_names'], data['figures'],
+                      data['top_n'], data['max_points'])
+        results.models = data['models']
+        return results
+
+    def salvar(self, path):
+        """
+        Grava o resumo em JSON com gravação atômica (arquivo temporário + os.replace).
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def carregar(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def tarefas(self, output_dir=figures_dir):
+        """
+        Lista de gráficos [(função de plot, kwargs), ...] para renderizar_graficos.
+        Curvas ausentes (modelos sem probabilidades) não entram nos gráficos de curva.
+        """
+        from src.visualization.visualize import (
+            plot_multiple_confusion_matrices,
+            plot_multiple_feature_importances,
+            plot_roc_comparison,
+            plot_precision_recall_comparison
+        )
+
+        def path(kind):
+            return os.path.join(output_dir, self.figures[kind])
+
+        roc = {name: (r['roc']['fpr'], r['roc']['tpr'], r['roc']['auc'])
+               for name, r in self.models.items() if 'roc' in r}
+        pr = {name: (r['precision_recall']['precision'], r['precision_recall']['recall'],
+                     r['precision_recall']['average_precision'])
+              for name, r in self.models.items() if 'precision_recall' in r}
+        tasks = [
+            (plot_multiple_confusion_matrices, dict(
+                model_results={name: np.asarray(r['confusion_matrix']) for name, r in self.models.items()},
+                class_names=self.class_names, save_path=path('confusion_matrix'))),
+            (plot_multiple_feature_importances, dict(
+                model_importances={name: r['importances'] for name, r in self.models.items()},
+                feature_names=self.feature_names, top_n=self.top_n, save_path=path('feature_importances'))),
+        ]
+        if roc:
+            tasks.append((plot_roc_comparison, dict(model_results=roc, save_path=path('roc'))))
+        if pr:
+            tasks.append((plot_precision_recall_comparison, dict(model_results=pr, save_path=path('precision_recall'))))
+        return tasks
+
+    def renderizar(self, output_dir=figures_dir, workers=None):
+        """
+        Desenha os gráficos do resumo e retorna os caminhos gravados.
+        """
+        from src.visualization.visualize import renderizar_graficos
+
+        return renderizar_graficos(self.tarefas(output_dir), workers=workers)
+
+
+@click.command()
+@click.argument('results_files', nargs=-1, type=click.Path(exists=True))
+@click.option('--output-dir', default = figures_dir, type = click.Path(), help = 'Pasta onde os gráficos são gravados')
+@click.option('--workers', default = None, type = int, help = 'Processos de renderização (padrão: REPORT_WORKERS)')
+def main(results_files, output_dir, workers):
+    """ Regenerates the report figures from saved results files, without retraining or rescoring. """
+    results_files = results_files or [p for p in (train_results_path, predict_results_path) if os.path.exists(p)]
+    if not results_files:
+        raise click.UsageError('Nenhum arquivo de resultados encontrado; rode o train ou o predict primeiro.')
+    for results_file in results_files:
+        paths = ReportResults.carregar(results_file).renderizar(output_dir, workers=workers)
+        print(f'{results_file}: {len(paths)} arquivos gravados')
+
+
+if __name__ == '__main__':
+    main()
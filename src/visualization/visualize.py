@@ -1,34 +1,63 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+# Backend não interativo: os gráficos só são gravados em arquivo, sem janela (servidores headless)
+if not os.environ.get('MPLBACKEND'):
+    matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
-from sklearn.metrics import confusion_matrix
 
-def plot_multiple_confusion_matrices(model_results, class_names, save_path=None):
-    """
-    Plota as matrizes de confusão de múltiplos modelos em um único grid.
-    O número de colunas é ajustado automaticamente.
-    model_results é um dicionário no formato {'Nome do Modelo': (y_true, y_pred)}
-    """
-    n_models = len(model_results)
-    
-    # Define o número de colunas baseado na quantidade de modelos
-    if n_models <= 3:
-        n_cols = n_models
-    else:
-        n_cols = 3  # Mantém no máximo 3 colunas para gráficos maiores
+from src.visualization.curves import FORMATOS, MAX_PONTOS_CURVA, reduzir_curva
 
-    n_rows = (n_models + n_cols - 1) // n_cols
 
+def _grid(n_models):
+    # Define o número de colunas baseado na quantidade de modelos (no máximo 3)
+    n_cols = n_models if n_models <= 3 else 3
+    n_rows = (n_models + n_cols - 1) // n_cols
     fig, axes = plt.subplots(n_rows, n_cols, figsize=(5 * n_cols, 4 * n_rows))
-
     # Aumenta a legibilidade em caso de um único modelo
-    if n_models == 1:
-        axes = np.array([axes])
-    else:
-        axes = axes.flatten()
+    axes = np.array([axes]) if n_models == 1 else axes.flatten()
+    return fig, axes
+
+
+def _salvar(fig, save_path, data, formats=None):
+    """
+    Grava a figura em cada formato pedido e os dados do gráfico em JSON com o
+    mesmo nome base, e fecha a figura. Retorna os caminhos gravados.
+    """
+    if not save_path:
+        plt.close(fig)
+        return []
+    base = os.path.splitext(save_path)[0]
+    os.makedirs(os.path.dirname(os.path.abspath(base)), exist_ok=True)
+    paths = []
+    for fmt in formats or FORMATOS:
+        path = f'{base}.{fmt}'
+        fig.savefig(path)
+        paths.append(path)
+    plt.close(fig)
+
+    with open(f'{base}.json', 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    paths.append(f'{base}.json')
+    return paths
+
+
+def plot_multiple_confusion_matrices(model_results, class_names, save_path=None, formats=None):
+    """
+    Plota as matrizes de confusão de múltiplos modelos em um único grid.
+    O número de colunas é ajustado automaticamente.
+    model_results é um dicionário no formato {'Nome do Modelo': matriz_de_confusao},
+    com as contagens já calculadas (ex.: StreamingMetrics.conf_matrix).
+    """
+    matrices = {name: np.asarray(cm, dtype=np.int64) for name, cm in model_results.items()}
 
-    for i, (model_name, (y_true, y_pred)) in enumerate(model_results.items()):
-        cm = confusion_matrix(y_true, y_pred)
+    fig, axes = _grid(len(matrices))
+    for i, (model_name, cm) in enumerate(matrices.items()):
         sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', ax=axes[i],
                     xticklabels=class_names, yticklabels=class_names)
         axes[i].set_title(f'Matriz de Confusão: {model_name}')
@@ -36,110 +65,138 @@ def plot_multiple_confusion_matrices(model_results, class_names, save_path=None)
         axes[i].set_ylabel('Verdadeiro')
 
     # Desativa os subplots não utilizados
-    for j in range(i + 1, len(axes)):
+    for j in range(len(matrices), len(axes)):
         fig.delaxes(axes[j])
-        
-    plt.tight_layout()
-    if save_path:
-        plt.savefig(save_path)
-    plt.show()
 
+    fig.tight_layout()
+    data = {'class_names': list(class_names),
+            'models': {name: np.asarray(cm).astype(int).tolist() for name, cm in matrices.items()}}
+    return _salvar(fig, save_path, data, formats)
 
-def plot_multiple_feature_importances(model_importances, feature_names, top_n=10, save_path=None):
+
+def plot_multiple_feature_importances(model_importances, feature_names, top_n=10, save_path=None, formats=None):
     """
     Plota a importância das features de múltiplos modelos em um único grid.
     O número de colunas é ajustado automaticamente.
     model_importances é um dicionário no formato {'Nome do Modelo': importances}
     """
-    n_models = len(model_importances)
-    
-    if n_models <= 3:
-        n_cols = n_models
-    else:
-        n_cols = 3
-
-    n_rows = (n_models + n_cols - 1) // n_cols
-
-    fig, axes = plt.subplots(n_rows, n_cols, figsize=(5 * n_cols, 4 * n_rows))
-    
-    if n_models == 1:
-        axes = np.array([axes])
-    else:
-        axes = axes.flatten()
-
+    feature_names = np.asarray(feature_names)
+    fig, axes = _grid(len(model_importances))
+    normalized = {}
     for i, (model_name, importances) in enumerate(model_importances.items()):
         if importances is None:
+            normalized[model_name] = None
             axes[i].axis('off')
             continue
 
+        importances = np.asarray(importances, dtype=np.float64)
         if importances.sum() > 0:
             importances = importances / importances.sum()
-        
-        sorted_indices = np.argsort(importances)[::-1]
-        top_indices = sorted_indices[:top_n]
-        
-        sns.barplot(x=importances[top_indices], y=np.array(feature_names)[top_indices],
-                    ax=axes[i], palette='viridis')
-        
+        normalized[model_name] = importances.tolist()
+
+        top_indices = np.argsort(importances)[::-1][:top_n]
+        sns.barplot(x=importances[top_indices], y=feature_names[top_indices],
+                    hue=feature_names[top_indices], legend=False, ax=axes[i], palette='viridis')
+
         axes[i].set_title(f'Importância: {model_name}')
         axes[i].set_xlabel('Importância')
         axes[i].set_ylabel('Features')
 
-    for j in range(i + 1, len(axes)):
+    for j in range(len(model_importances), len(axes)):
         fig.delaxes(axes[j])
 
-    plt.tight_layout()
-    if save_path:
-        plt.savefig(save_path)
-    plt.show()
+    fig.tight_layout()
+    data = {'feature_names': feature_names.tolist(), 'top_n': top_n, 'models': normalized}
+    return _salvar(fig, save_path, data, formats)
+
 
-def plot_roc_comparison(model_results, save_path=None):
+def plot_roc_comparison(model_results, save_path=None, formats=None, max_points=MAX_PONTOS_CURVA):
     """
     Plota as curvas ROC de múltiplos modelos em um único gráfico.
     model_results é um dicionário no formato {'Nome do Modelo': (fpr, tpr, roc_auc)}
+    Cada curva é reduzida a no máximo `max_points` pontos.
     """
-    plt.figure(figsize=(10, 8))
+    fig = plt.figure(figsize=(10, 8))
     plt.plot([0, 1], [0, 1], 'k--')
-    
+
+    data = {}
     for model_name, (fpr, tpr, roc_auc) in model_results.items():
+        fpr, tpr = reduzir_curva(fpr, tpr, max_points)
         plt.plot(fpr, tpr, label=f'{model_name} (Área = {roc_auc:.2f})')
-        
+        data[model_name] = {'fpr': fpr.tolist(), 'tpr': tpr.tolist(), 'auc': float(roc_auc)}
+
     plt.xlabel('Taxa de Falsos Positivos (FPR)')
     plt.ylabel('Taxa de Verdadeiros Positivos (TPR)')
-    
+
     if len(model_results) == 1:
         plt.title(f'Curva ROC: {list(model_results.keys())[0]}')
     else:
         plt.title('Comparação de Curvas ROC de Múltiplos Modelos')
-    
+
     plt.legend(loc="lower right")
     plt.grid(True)
-    
-    if save_path:
-        plt.savefig(save_path)
-    plt.show()
+    return _salvar(fig, save_path, data, formats)
+
 
-def plot_precision_recall_comparison(model_results, save_path=None):
+def plot_precision_recall_comparison(model_results, save_path=None, formats=None, max_points=MAX_PONTOS_CURVA):
     """
     Plota as curvas Precision-Recall de múltiplos modelos em um único gráfico.
     model_results é um dicionário no formato {'Nome do Modelo': (precision, recall, avg_precision)}
+    Cada curva é reduzida a no máximo `max_points` pontos.
     """
-    plt.figure(figsize=(10, 8))
-    
+    fig = plt.figure(figsize=(10, 8))
+
+    data = {}
     for model_name, (precision, recall, avg_precision) in model_results.items():
+        recall, precision = reduzir_curva(recall, precision, max_points)
         plt.plot(recall, precision, label=f'{model_name} (Área = {avg_precision:.2f})')
-        
+        data[model_name] = {'precision': precision.tolist(), 'recall': recall.tolist(),
+                            'average_precision': float(avg_precision)}
+
     plt.xlabel('Recall')
     plt.ylabel('Precision')
-    
+
     if len(model_results) == 1:
         plt.title(f'Curva Precision-Recall: {list(model_results.keys())[0]}')
     else:
         plt.title('Comparação de Curvas Precision-Recall de Múltiplos Modelos')
-    
+
     plt.legend(loc="lower left")
     plt.grid(True)
-    
-    if save_path:
-        plt.savefig(save_path)
-    plt.show()
\ No newline at end of file
+    return _salvar(fig, save_path, data, formats)
+
+
+def _reduzir_argumentos(fn, kwargs):
+    # Reduz as curvas antes de enviá-las aos processos, para não serializar milhões de pontos
+    if fn in (plot_roc_comparison, plot_precision_recall_comparison):
+        max_points = kwargs.get('max_points', MAX_PONTOS_CURVA)
+        reduced = {}
+        for name, (a, b, area) in kwargs['model_results'].items():
+            if fn is plot_roc_comparison:
+                a, b = reduzir_curva(a, b, max_points)
+            else:
+                b, a = reduzir_curva(b, a, max_points)
+            reduced[name] = (a, b, area)
+        kwargs = {**kwargs, 'model_results': reduced}
+    return kwargs
+
+
+def renderizar_graficos(tarefas, workers=None):
+    """
+    Renderiza uma lista de gráficos [(função de plot, kwargs), ...] e retorna os
+    caminhos gravados. Por padrão desenha no próprio processo: para os quatro
+    gráficos de um relatório, subir um pool spawn (interpretador e matplotlib
+    por worker) custa mais do que economiza. Com workers > 1 (ou REPORT_WORKERS)
+    os gráficos são distribuídos em um pool de processos.
+    """
+    if workers is None:
+        workers = int(os.environ.get('REPORT_WORKERS', 1))
+    tarefas = [(fn, _reduzir_argumentos(fn, kwargs)) for fn, kwargs in tarefas]
+    if workers <= 1 or len(tarefas) <= 1:
+        return [path for fn, kwargs in tarefas for path in fn(**kwargs)]
+
+    # spawn: os workers não herdam os pools de threads (OpenMP) do processo de treino
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(workers, len(tarefas)), mp_context=context) as pool:
+        futures = [pool.submit(fn, **kwargs) for fn, kwargs in tarefas]
+        return [path for future in futures for path in future.result()]